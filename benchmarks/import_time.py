@@ -0,0 +1,61 @@
+"""
+Measures how long the CLI and the script modules take to start, each in a fresh interpreter.
+
+Usage: python benchmarks/import_time.py [--runs 10] [--module challenge01 ...]
+
+Each command is run --runs times and the fastest and median wall clock times are reported. The bare interpreter is
+timed too, so its startup cost can be subtracted. A command that exits with an error is reported as failed.
+"""
+from __future__ import with_statement
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+__author__ = 'Bruce Stringer'
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+DEFAULT_MODULES = ["cli", "common", "clients", "dns_batch", "hostnames", "public_suffix", "challenge01",
+                   "challenge03", "challenge04", "challenge10"]
+
+
+def time_command(command, runs):
+    """
+    Runs a command repeatedly from the repository root.
+    :return: A list of wall clock times in seconds, or None if the command failed
+    """
+    times = []
+    with open(os.devnull, "w") as devnull:
+        for run in range(runs):
+            start = time.time()
+            status = subprocess.call(command, cwd=ROOT, stdout=devnull, stderr=devnull)
+            times.append(time.time() - start)
+            if status != 0:
+                return None
+    return sorted(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time interpreter startup for the CLI and script modules.")
+    parser.add_argument("--runs", type=int, default=10, help="Runs of each command")
+    parser.add_argument("--module", action="append", dest="modules", help="Module to time importing. Repeatable")
+    args = parser.parse_args()
+
+    commands = [("python (no imports)", [sys.executable, "-c", "pass"]),
+                ("cli.py --help", [sys.executable, "cli.py", "--help"]),
+                ("cli.py dns-batch --help", [sys.executable, "cli.py", "dns-batch", "--help"])]
+    for module in args.modules or DEFAULT_MODULES:
+        commands.append(("import " + module, [sys.executable, "-c", "import " + module]))
+
+    print "%-28s %10s %10s" % ("command", "min ms", "median ms")
+    for label, command in commands:
+        times = time_command(command, args.runs)
+        if times is None:
+            print "%-28s %21s" % (label, "failed")
+        else:
+            print "%-28s %10.1f %10.1f" % (label, times[0] * 1000, times[len(times) // 2] * 1000)
+
+
+if __name__ == "__main__":
+    main()
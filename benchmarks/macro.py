@@ -0,0 +1,173 @@
+"""
+Macro benchmarks: every challenge's main() run end to end against the simulated cloud in simcloud.py.
+
+Usage: python benchmarks/macro.py [--runs 3] [--time-scale 0.01] [--only challenge01 ...] [-o results.json]
+
+Each scenario runs in a fresh interpreter with its own cache directory, its command line arguments and its answers to
+the script's prompts on stdin. The child installs a SimCloud as the clients backend, and the waiters shrink their
+polling intervals by the backend's time_scale like the simulated build times. It reports the API calls made by name, the wall time of main()
+and the peak resident memory. The median wall time of --runs runs is kept. The simulation is seeded, so every run
+makes the same calls and sees the same build times, and differences between commits come from the code.
+"""
+from __future__ import with_statement
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import results
+
+__author__ = 'Bruce Stringer'
+
+#Name, module, arguments, lines typed at the prompts and simulation settings. {workdir} is the scenario's scratch
+#directory, which holds the upload folder and ssh key.
+SCENARIOS = [
+    ("challenge01", "challenge01", ["-n", "10"], [], {}),
+    ("challenge02", "challenge02", ["--server", "web0", "-k", "3"], [], {'servers': ["web0"]}),
+    ("challenge03", "challenge03", [], ["c", "bench", "{workdir}/upload"], {}),
+    ("challenge03-sync", "challenge03", ["--sync"], ["c", "bench", "{workdir}/upload"], {}),
+    ("challenge04", "challenge04", [], ["0", "192.0.2.10", "www.example.com"], {}),
+    ("challenge05", "challenge05", [], ["0", "bench", "db", "user", "secret", "5"], {}),
+    ("challenge06", "challenge06", [], ["c", "cdn", "900"], {}),
+    ("challenge07", "challenge07", [], ["bench-lb"], {}),
+    ("challenge08", "challenge08", [], ["site", "900", "hello", "0", "www"], {}),
+    ("challenge09", "challenge09", ["www.example.com"], [], {}),
+    ("challenge09-early-dns", "challenge09", ["www.example.com", "--early-dns"], [], {}),
+    ("challenge10", "challenge10", [], ["www.example.com", "{workdir}/key.pub", "Sorry", "backup"], {}),
+    ("challenge10-pipelined", "challenge10", ["-n", "6", "--pipelined"],
+     ["www.example.com", "{workdir}/key.pub", "Sorry", "backup"], {}),
+]
+UPLOAD_FILES = 50
+
+
+def prepare(workdir):
+    upload = os.path.join(workdir, "upload")
+    os.makedirs(upload)
+    for index in range(UPLOAD_FILES):
+        with open(os.path.join(upload, "file%03d.txt" % index), "w") as upload_file:
+            upload_file.write("benchmark file %d\n" % index * (index + 1))
+    with open(os.path.join(workdir, "key.pub"), "w") as key_file:
+        key_file.write("ssh-rsa AAAAB3NzaC1yc2E benchmark\n")
+
+
+def run_child(module_name, arguments, config, result_path):
+    """
+    Runs one scenario in this process. Called in the child interpreter started by run_scenario.
+    """
+    import clients
+    import simcloud
+
+    cloud = simcloud.SimCloud(config)
+    clients.set_backend(cloud)
+    module = __import__(module_name)
+    sys.argv = [module_name + ".py"] + arguments
+
+    exit_code = 0
+    start = time.time()
+    try:
+        module.main()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    wall = time.time() - start
+
+    calls = cloud.report()
+    with open(result_path, "w") as result_file:
+        json.dump({'wall_s': wall, 'api_calls': calls.pop('total'), 'calls': calls, 'exit_code': exit_code,
+                   'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}, result_file)
+
+
+def run_scenario(scenario, config, timeout):
+    """
+    Runs a scenario in a fresh interpreter with its own cache and scratch directories.
+    :return: The child's measurements, or None if it crashed or timed out
+    """
+    name, module_name, arguments, answers, settings = scenario
+    workdir = tempfile.mkdtemp(prefix="macro-bench-")
+    try:
+        prepare(workdir)
+        result_path = os.path.join(workdir, "result.json")
+        config = dict(config, **settings)
+        command = [sys.executable, os.path.abspath(__file__), "--child", module_name, "--config", json.dumps(config),
+                   "--result", result_path, "--"] + [argument.format(workdir=workdir) for argument in arguments]
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(workdir, "cache"))
+        stdin = "".join(answer.format(workdir=workdir) + "\n" for answer in answers)
+        with open(os.path.join(workdir, "output.txt"), "w") as output:
+            child = subprocess.Popen(command, cwd=results.ROOT, env=env, stdin=subprocess.PIPE, stdout=output,
+                                     stderr=subprocess.STDOUT)
+            child.stdin.write(stdin)
+            child.stdin.close()
+            deadline = time.time() + timeout
+            while child.poll() is None and time.time() < deadline:
+                time.sleep(0.05)
+            if child.poll() is None:
+                child.kill()
+                child.wait()
+                print >> sys.stderr, "%s timed out after %ds" % (name, timeout)
+                return None
+        if not os.path.exists(result_path):
+            with open(os.path.join(workdir, "output.txt")) as output:
+                print >> sys.stderr, "%s crashed:\n%s" % (name, output.read()[-2000:])
+            return None
+        with open(result_path) as result_file:
+            return json.load(result_file)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the challenges end to end against the simulated cloud.")
+    parser.add_argument("--runs", type=int, default=3, help="Runs of each scenario, the median is kept. Default 3")
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="Simulated build times and polling intervals are multiplied by this. Default 0.01")
+    parser.add_argument("--seed", type=int, default=0, help="Simulation seed. Default 0")
+    parser.add_argument("--config", help="JSON simulation settings, merged over the defaults")
+    parser.add_argument("--only", action="append", help="Only run the named scenario. Repeatable")
+    parser.add_argument("--timeout", type=int, default=120, help="Seconds before a run is abandoned. Default 120")
+    parser.add_argument("-o", "--output", help="Result file. Default benchmarks/results/macro-<revision>.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("arguments", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    config = json.loads(args.config) if args.config else {}
+    if args.child:
+        return run_child(args.child, args.arguments, config, args.result)
+    config = dict(config, seed=args.seed, time_scale=args.time_scale)
+
+    measured = {}
+    failed = []
+    print "%-24s %9s %9s %12s %5s" % ("scenario", "wall s", "calls", "peak rss kb", "exit")
+    for scenario in SCENARIOS:
+        name = scenario[0]
+        if args.only and name not in args.only:
+            continue
+        runs = [run_scenario(scenario, config, args.timeout) for _ in range(args.runs)]
+        runs = sorted((run for run in runs if run is not None), key=lambda run: run['wall_s'])
+        if not runs:
+            failed.append(name)
+            print "%-24s %9s" % (name, "failed")
+            continue
+        median = runs[len(runs) // 2]
+        measured[name] = {'wall_s': median['wall_s'], 'api_calls': median['api_calls'],
+                          'peak_rss_kb': max(run['peak_rss_kb'] for run in runs)}
+        for call, count in median['calls'].iteritems():
+            measured[name]['calls.' + call] = count
+        if median['exit_code']:
+            failed.append(name)
+        print "%-24s %9.2f %9d %12d %5d" % (name, median['wall_s'], median['api_calls'],
+                                             measured[name]['peak_rss_kb'], median['exit_code'])
+
+    print "Results written to " + results.write("macro", measured, args.output, runs=args.runs, config=config)
+    if failed:
+        print "Failed: " + ", ".join(failed)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Micro benchmarks of the hot code paths: hostname parsing and validation, DNS record validation and loading tlds.txt.
+
+Usage: python benchmarks/micro.py [--repeat 5] [--quick] [--only get_domain_parts ...] [-o results.json]
+
+Each benchmark runs its call in a loop sized so one repeat takes a useful amount of time. The fastest and median
+repeats are reported in microseconds per call and written with results.write, so two commits can be compared with
+benchmarks/results.py. The inputs are generated from a fixed seed, so every run times the same work.
+"""
+from __future__ import with_statement
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import dns_batch
+import public_suffix
+import results
+from hostnames import get_domain_parts, isValidHostname
+from suffix_lookup import generate_hostnames
+
+__author__ = 'Bruce Stringer'
+
+TLDS = os.path.join(results.ROOT, "tlds.txt")
+INPUTS = 1000
+
+
+def time_call(func, repeat, number):
+    """
+    :return: The sorted seconds per call of each repeat
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        for _ in xrange(number):
+            func()
+        timings.append((time.time() - start) / number)
+    return sorted(timings)
+
+
+def cycle(func, inputs):
+    """
+    :return: A callable applying func to the next input on each call, so a loop of calls covers every input
+    """
+    state = [0]
+
+    def call():
+        func(inputs[state[0]])
+        state[0] = (state[0] + 1) % len(inputs)
+    return call
+
+
+def build_records(rng):
+    records = []
+    for index in range(INPUTS):
+        kind = rng.choice(["A", "CNAME", "MX", "TXT", "BAD"])
+        ttl = rng.choice([300, 3600, 86400, 60])
+        records.append(("host%d.example.com" % index, kind, "192.0.2.%d" % (index % 250), rng.randint(-5, 70000),
+                        ttl))
+    return records
+
+
+def validate(record):
+    try:
+        dns_batch.build_record(*record)
+    except ValueError:
+        pass
+
+
+def split_url(tlds):
+    def split(url):
+        try:
+            get_domain_parts(url, tlds)
+        except ValueError:
+            pass
+    return split
+
+
+def benchmarks(workdir):
+    """
+    :param workdir: A scratch directory holding a copy of tlds.txt, so compiling it leaves the repository alone
+    :return: A list of (name, callable, calls per repeat)
+    """
+    rng = random.Random(0)
+    rules = public_suffix.read_rules(TLDS)
+    hostnames = [".".join(labels) for labels in generate_hostnames(rules, INPUTS)]
+    urls = ["http://%s/index.html" % hostname for hostname in hostnames]
+    invalid = [hostname.replace(".", "-.", 1) for hostname in hostnames[:INPUTS // 10]]
+    scratch_tlds = os.path.join(workdir, "tlds.txt")
+    shutil.copy(TLDS, scratch_tlds)
+    public_suffix.compile_rules(scratch_tlds)
+    index = public_suffix.load(scratch_tlds, check_interval=None)
+
+    return [
+        ("get_domain_parts", cycle(split_url(index), urls), 20000),
+        ("isValidHostname", cycle(isValidHostname, hostnames + invalid), 20000),
+        ("add_record_validation", cycle(validate, build_records(rng)), 50000),
+        ("tlds_read_rules", lambda: public_suffix.read_rules(scratch_tlds), 20),
+        ("tlds_trie_build", lambda: public_suffix.SuffixTrie(rules), 10),
+        ("tlds_compile", lambda: public_suffix.compile_rules(scratch_tlds), 10),
+        ("tlds_load_compiled", lambda: public_suffix.load(scratch_tlds, check_interval=None).close(), 200),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the hot code paths.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repeats of each benchmark. Default 5")
+    parser.add_argument("--quick", action="store_true", help="Run a tenth of the calls per repeat")
+    parser.add_argument("--only", action="append", help="Only run the named benchmark. Repeatable")
+    parser.add_argument("-o", "--output", help="Result file. Default benchmarks/results/micro-<revision>.json")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="micro-bench-")
+    measured = {}
+    try:
+        print "%-24s %12s %12s %10s" % ("benchmark", "min us", "median us", "calls")
+        for name, func, number in benchmarks(workdir):
+            if args.only and name not in args.only:
+                continue
+            number = max(1, number // 10) if args.quick else number
+            func()
+            timings = time_call(func, args.repeat, number)
+            measured[name] = {'min_us': timings[0] * 1e6, 'median_us': timings[len(timings) // 2] * 1e6}
+            print "%-24s %12.2f %12.2f %10d" % (name, measured[name]['min_us'], measured[name]['median_us'], number)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print "Results written to " + results.write("micro", measured, args.output, repeat=args.repeat, quick=args.quick)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Stores benchmark results as JSON and compares two result files.
+
+Usage: python benchmarks/results.py OLD.json NEW.json [--threshold 10]
+
+micro.py and macro.py write one file per run, by default benchmarks/results/<kind>-<revision>.json, holding the git
+revision, the interpreter and a dict of benchmark name to metrics. Comparing two of them prints every metric's change
+and exits non-zero if any got worse by more than --threshold percent, so a regression between commits shows up by
+running the suites on each and comparing.
+"""
+from __future__ import with_statement
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+__author__ = 'Bruce Stringer'
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def revision():
+    """
+    :return: The short git revision of the repository, with a + if the tree has uncommitted changes, or "unknown"
+    """
+    try:
+        with open(os.devnull, "w") as devnull:
+            commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=devnull).strip()
+            dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=ROOT, stdout=devnull, stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("+" if dirty else "")
+
+
+def write(kind, results, output=None, **details):
+    """
+    Writes a result file.
+    :param kind: The suite, Ex. micro or macro
+    :param results: A dict of benchmark name to a dict of metric name to number
+    :param output: The file to write. Default benchmarks/results/<kind>-<revision>.json
+    :param details: Anything else worth recording with the results, Ex. the settings used
+    :return: The location written
+    """
+    current = revision()
+    if output is None:
+        if not os.path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        output = os.path.join(RESULTS_DIR, "%s-%s.json" % (kind, current))
+    document = dict(details, kind=kind, revision=current, timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    python=platform.python_version(), platform=platform.platform(), results=results)
+    with open(output, "w") as result_file:
+        json.dump(document, result_file, indent=2, sort_keys=True)
+    return output
+
+
+def load(path):
+    with open(path) as result_file:
+        return json.load(result_file)
+
+
+def compare(old, new, threshold=10.0):
+    """
+    Compares every metric present in both result documents. All metrics are lower is better.
+    :param threshold: The percentage increase counted as a regression
+    :return: A list of (benchmark, metric, old value, new value, percent change, regressed)
+    """
+    changes = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        old_metrics, new_metrics = old['results'][name], new['results'][name]
+        for metric in sorted(set(old_metrics) & set(new_metrics)):
+            before, after = old_metrics[metric], new_metrics[metric]
+            if not isinstance(before, (int, float)) or not isinstance(after, (int, float)):
+                continue
+            change = (after - before) * 100.0 / before if before else (0.0 if after == before else float("inf"))
+            changes.append((name, metric, before, after, change, change > threshold))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("old", help="The baseline result file")
+    parser.add_argument("new", help="The result file to check")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Percent increase in any metric counted as a regression. Default 10")
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    print "%s (%s) -> %s (%s)" % (args.old, old['revision'], args.new, new['revision'])
+    changes = compare(old, new, args.threshold)
+    print "%-28s %-16s %14s %14s %9s" % ("benchmark", "metric", "old", "new", "change")
+    for name, metric, before, after, change, regressed in changes:
+        print "%-28s %-16s %14.4g %14.4g %+8.1f%%%s" % (name, metric, before, after, change,
+                                                         "  REGRESSION" if regressed else "")
+    regressions = len([change for change in changes if change[5]])
+    print "%d metrics compared, %d regressed by more than %g%%" % (len(changes), regressions, args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Compares public suffix lookups through the SuffixTrie and the compiled, memory mapped index against the original
+linear scan of the tlds list.
+
+Usage: python benchmarks/suffix_lookup.py [--count 1000000] [--scan-count 20000]
+
+The list scan costs hundreds of microseconds per hostname, so by default it is timed on the first --scan-count hostnames and
+extrapolated to --count. Pass --scan-count equal to --count to time the full scan.
+"""
+from __future__ import with_statement
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from public_suffix import SuffixTrie, CompiledSuffixIndex, compile_rules
+
+__author__ = 'Bruce Stringer'
+
+
+def list_scan(labels, tlds):
+    """
+    The lookup get_domain_parts performed before the trie, kept as the baseline.
+    :return: A tuple of the matched suffix length and whether it was an exception rule.
+    """
+    for i in range(-len(labels), 0):
+        lastIElements = labels[i:]
+        candidate = ".".join(lastIElements)
+        wildcardCandidate = ".".join(["*"] + lastIElements[1:])
+        exceptionCandidate = "!" + candidate
+        if exceptionCandidate in tlds:
+            return -i, True
+        if candidate in tlds or wildcardCandidate in tlds:
+            return -i, False
+    return 0, False
+
+
+def generate_hostnames(rules, count, seed=0):
+    """
+    Builds a reproducible list of hostname labels ending in suffixes drawn from the rules.
+    """
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789"
+    hostnames = []
+    for _ in xrange(count):
+        suffix = rng.choice(rules).lstrip("!").replace("*", "wild")
+        prefix = ["".join(rng.choice(alphabet) for _ in range(rng.randint(3, 10)))
+                  for _ in range(rng.randint(1, 3))]
+        hostnames.append(prefix + suffix.split("."))
+    return hostnames
+
+
+#Wildcard and exception rules, including a wildcard with a deeper rule beneath it, which no implementation may walk
+#through, and the hostnames that exercise them.
+CROSS_CHECK_RULES = ["ck", "*.ck", "!www.ck", "jp", "kobe.jp", "*.kobe.jp", "!city.kobe.jp", "sub.*.kobe.jp",
+                     "uk", "co.uk", "*.sch.uk", "!school.sch.uk", "*.*.deep.uk"]
+CROSS_CHECK_HOSTNAMES = ["www.ck", "a.www.ck", "x.y.ck", "y.ck", "ck", "a.b.kobe.jp", "kobe.jp", "city.kobe.jp",
+                         "a.city.kobe.jp", "x.sub.any.kobe.jp", "sub.any.kobe.jp", "a.b.co.uk", "x.y.sch.uk",
+                         "school.sch.uk", "a.school.sch.uk", "sch.uk", "a.b.c.deep.uk", "b.deep.uk", "example.com"]
+
+
+def cross_check():
+    """
+    Checks the trie and the compiled index against the list scan on CROSS_CHECK_RULES.
+    :return: A list of (hostname, trie match, compiled match, list scan match) for every disagreement
+    """
+    workdir = tempfile.mkdtemp(prefix="suffix-check-")
+    try:
+        source = os.path.join(workdir, "tlds.txt")
+        with open(source, "w") as tldFile:
+            tldFile.write("\n".join(CROSS_CHECK_RULES) + "\n")
+        trie = SuffixTrie(CROSS_CHECK_RULES)
+        mismatches = []
+        with CompiledSuffixIndex(source, check_interval=None) as compiled:
+            for hostname in CROSS_CHECK_HOSTNAMES:
+                labels = hostname.split(".")
+                expected = list_scan(labels, CROSS_CHECK_RULES)
+                if trie.match(labels) != expected or compiled.match(labels) != expected:
+                    mismatches.append((hostname, trie.match(labels), compiled.match(labels), expected))
+        return mismatches
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def time_lookups(lookup, hostnames):
+    start = time.time()
+    for labels in hostnames:
+        lookup(labels)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark public suffix lookups.")
+    parser.add_argument("--tlds", default="tlds.txt", help="Location of the public suffix list")
+    parser.add_argument("--count", type=int, default=1000000, help="Number of hostnames to look up")
+    parser.add_argument("--scan-count", type=int, default=20000, help="Hostnames timed with the list scan")
+    args = parser.parse_args()
+
+    with open(args.tlds) as tldFile:
+        tlds = [line.strip() for line in tldFile if line[0] not in "/\n"]
+
+    hostnames = generate_hostnames(tlds, args.count)
+    scan_count = min(args.scan_count, args.count)
+
+    start = time.time()
+    trie = SuffixTrie(tlds)
+    build_time = time.time() - start
+
+    start = time.time()
+    compile_rules(args.tlds)
+    compile_time = time.time() - start
+
+    start = time.time()
+    compiled = CompiledSuffixIndex(args.tlds, check_interval=None)
+    load_time = time.time() - start
+
+    #All implementations have to agree before their timings mean anything.
+    mismatches = cross_check()
+    for hostname, trie_match, compiled_match, expected in mismatches:
+        print "Mismatch for %s: trie %r, compiled %r, list %r" % (hostname, trie_match, compiled_match, expected)
+    if mismatches:
+        sys.exit(1)
+    for labels in hostnames[:scan_count]:
+        expected = list_scan(labels, tlds)
+        if trie.match(labels) != expected or compiled.match(labels) != expected:
+            print "Mismatch for %s: trie %r, compiled %r, list %r" % (".".join(labels), trie.match(labels),
+                                                                      compiled.match(labels), expected)
+            sys.exit(1)
+
+    trie_time = time_lookups(trie.match, hostnames)
+    compiled_time = time_lookups(compiled.match, hostnames)
+    compiled.close()
+    scan_time = time_lookups(lambda labels: list_scan(labels, tlds), hostnames[:scan_count])
+    scan_total = scan_time * args.count / scan_count
+
+    print "Rules: %d  Hostnames: %d" % (len(trie), args.count)
+    print "Trie build:       %10.4f s" % build_time
+    print "Trie lookups:     %10.4f s  (%.2f us/hostname)" % (trie_time, trie_time * 1e6 / args.count)
+    print "Index compile:    %10.4f s" % compile_time
+    print "Index load:       %10.4f s" % load_time
+    print "Index lookups:    %10.4f s  (%.2f us/hostname)" % (compiled_time, compiled_time * 1e6 / args.count)
+    print "List scan:        %10.4f s  (%.2f us/hostname%s)" % (
+        scan_total, scan_time * 1e6 / scan_count, "" if scan_count == args.count else ", extrapolated")
+    print "Speedup:          %10.1fx" % (scan_total / trie_time)
+
+
+if __name__ == "__main__":
+    main()
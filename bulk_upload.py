@@ -0,0 +1,166 @@
+"""
+Bulk upload of many small files through the Cloud Files extract-archive endpoint.
+
+The tree is walked with scandir and streamed into a tar archive on the fly, which is sent as the chunked body of a
+PUT ?extract-archive=tar request. Nothing is written to a temp file. Files are split into archives bounded by size and
+file count, and the per-file errors in each extract response are mapped back to local paths.
+"""
+from __future__ import with_statement
+from urllib import quote, unquote
+from urlparse import urlparse
+import httplib
+import json
+import os
+import stat
+import tarfile
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+__author__ = 'Bruce Stringer'
+
+MAX_BATCH_BYTES = 1024 * 1024 * 1024
+MAX_BATCH_FILES = 10000
+STREAM_BUFFER = 64 * 1024
+
+
+def iter_files(folder, prefix=""):
+    """
+    Walks a folder depth first, using scandir when it is available so file sizes come from the directory scan.
+    :param folder: The local folder to walk
+    :param prefix: The object name prefix of folder. Used when recursing
+    :return: A generator of (local path, object name, size) for every regular file below folder
+    """
+    if scandir is not None:
+        for entry in scandir(folder):
+            name = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                for item in iter_files(entry.path, name + "/"):
+                    yield item
+            elif entry.is_file():
+                yield entry.path, name, entry.stat().st_size
+        return
+
+    for entry in os.listdir(folder):
+        path = os.path.join(folder, entry)
+        if stat.S_ISDIR(os.lstat(path).st_mode):
+            for item in iter_files(path, prefix + entry + "/"):
+                yield item
+        elif os.path.isfile(path):
+            yield path, prefix + entry, os.path.getsize(path)
+
+
+def iter_batches(files, max_bytes=MAX_BATCH_BYTES, max_files=MAX_BATCH_FILES):
+    """
+    Groups files into batches of at most max_files files and, unless a single file is larger, max_bytes bytes.
+    :param files: An iterable of (local path, object name, size)
+    :return: A generator of lists of (local path, object name, size)
+    """
+    batch = []
+    batch_bytes = 0
+    for item in files:
+        if batch and (batch_bytes + item[2] > max_bytes or len(batch) >= max_files):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(item)
+        batch_bytes += item[2]
+    if batch:
+        yield batch
+
+
+class _ChunkedWriter(object):
+    """
+    File-like object that sends everything written to it as HTTP chunked transfer encoding.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, data):
+        if data:
+            self.connection.send("%x\r\n%s\r\n" % (len(data), data))
+
+    def close(self):
+        self.connection.send("0\r\n\r\n")
+
+
+def extract_archive(storage_url, token, container_name, batch):
+    """
+    Streams one batch of files as a tar archive to the extract-archive endpoint.
+    :param storage_url: The account's Cloud Files endpoint
+    :param token: An auth token for the account
+    :param container_name: The container the files are extracted into
+    :param batch: A list of (local path, object name, size)
+    :return: The number of objects created and a list of (local path, error status) for files that failed
+    """
+    url = urlparse(storage_url)
+    connection_class = httplib.HTTPSConnection if url.scheme == "https" else httplib.HTTPConnection
+    connection = connection_class(url.netloc)
+    try:
+        connection.putrequest("PUT", "%s/%s?extract-archive=tar" % (url.path.rstrip("/"), quote(container_name)))
+        connection.putheader("X-Auth-Token", token)
+        connection.putheader("Accept", "application/json")
+        connection.putheader("Content-Type", "application/x-tar")
+        connection.putheader("Transfer-Encoding", "chunked")
+        connection.endheaders()
+
+        writer = _ChunkedWriter(connection)
+        archive = tarfile.open(mode="w|", fileobj=writer, bufsize=STREAM_BUFFER)
+        for path, obj_name, size in batch:
+            archive.add(path, arcname=obj_name, recursive=False)
+        archive.close()
+        writer.close()
+
+        response = connection.getresponse()
+        body = response.read()
+    finally:
+        connection.close()
+
+    if response.status >= 300:
+        return 0, [(path, "%d %s" % (response.status, response.reason)) for path, obj_name, size in batch]
+
+    result = json.loads(body)
+    if not result.get("Response Status", "201").startswith("2") and not result.get("Errors"):
+        return 0, [(path, result["Response Status"]) for path, obj_name, size in batch]
+
+    #Errors name the object as /<container>/<object name>, so they are mapped back through the object names.
+    paths = dict((obj_name, path) for path, obj_name, size in batch)
+    failures = []
+    for name, status in result.get("Errors", []):
+        obj_name = unquote(name).lstrip("/")
+        if obj_name.startswith(container_name + "/"):
+            obj_name = obj_name[len(container_name) + 1:]
+        failures.append((paths.get(obj_name, obj_name), status))
+    return result.get("Number Files Created", 0), failures
+
+
+def bulk_upload(client, container_name, folder, max_bytes=MAX_BATCH_BYTES, max_files=MAX_BATCH_FILES):
+    """
+    Uploads every file below a folder through extract-archive requests, one bounded tar stream at a time.
+    :param client: A pyrax cloudfiles client object with its auth already initialized.
+    :param container_name: The container to upload to
+    :param folder: The local folder to upload
+    :param max_bytes: The most file bytes sent in one archive
+    :param max_files: The most files sent in one archive
+    :return: The number of objects created and a list of (local path, error) for files that failed
+    """
+    if not os.path.isdir(folder):
+        raise ValueError(folder + " is not a valid directory")
+
+    created = 0
+    failures = []
+    for batch in iter_batches(iter_files(folder), max_bytes, max_files):
+        try:
+            batch_created, batch_failures = extract_archive(client.connection.url, client.connection.token,
+                                                            container_name, batch)
+        except (httplib.HTTPException, IOError, ValueError) as e:
+            batch_created, batch_failures = 0, [(path, str(e)) for path, obj_name, size in batch]
+        created += batch_created
+        failures.extend(batch_failures)
+    return created, failures
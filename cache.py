@@ -0,0 +1,93 @@
+"""
+Small on-disk JSON cache shared by the scripts. Files live under $XDG_CACHE_HOME/api-challenge (~/.cache by default).
+"""
+from __future__ import with_statement
+import calendar
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+__author__ = 'Bruce Stringer'
+
+_TIMESTAMP = re.compile(r"(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.\d+)?(Z|([+-])(\d\d):?(\d\d))?$")
+
+
+def cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "api-challenge")
+
+
+def cache_key(*parts):
+    """
+    :return: A filesystem safe key built from the given strings
+    """
+    return hashlib.sha1("\0".join(str(part) for part in parts)).hexdigest()
+
+
+def cache_path(*parts):
+    """
+    Returns the location of a cache file, creating its directory if needed.
+    :param parts: Path components below the cache directory. Ex. "sync", "abc.json"
+    """
+    path = os.path.join(cache_dir(), *parts)
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory, 0700)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    return path
+
+
+def load_json(path, max_age=None):
+    """
+    Loads a cached JSON document.
+    :param path: The cache file location
+    :param max_age: The age in seconds after which the file is ignored. Default never expires
+    :return: The cached document, or None if it is missing, expired or unreadable
+    """
+    try:
+        if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+            return None
+        with open(path) as cache_file:
+            return json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def store_json(path, data):
+    """
+    Atomically replaces a cached JSON document so concurrent readers never see a partial file.
+    :param path: The cache file location
+    :param data: A JSON serialisable document
+    """
+    #A unique temp file per write, so threads of one process storing the same key never share one. mkstemp makes it
+    #readable by this user only.
+    descriptor, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                             dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(descriptor, "w") as cache_file:
+            json.dump(data, cache_file)
+        os.rename(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def parse_timestamp(timestamp):
+    """
+    :param timestamp: An ISO 8601 timestamp as returned by the API. Ex. 2013-03-01T12:00:00.000-06:00
+    :return: The timestamp as seconds since the epoch
+    """
+    match = _TIMESTAMP.match(timestamp)
+    if match is None:
+        raise ValueError("Unrecognised timestamp: " + timestamp)
+    seconds = calendar.timegm([int(part) for part in match.group(1, 2, 3, 4, 5, 6)])
+    if match.group(8):
+        offset = int(match.group(9)) * 3600 + int(match.group(10)) * 60
+        seconds -= offset if match.group(8) == "+" else -offset
+    return seconds
@@ -0,0 +1,162 @@
+"""
+Cached, indexed catalog of Cloud Servers flavors and images.
+
+Flavors and images are listed once and kept on disk per account, flavors for a day and images for an hour, so warm
+runs answer lookups without a network call. Flavors are indexed by id, name, RAM, vCPUs and disk and images by id and
+name. A lookup that misses a catalog loaded from disk refreshes it once before giving up, so newly added images are
+still found.
+"""
+import bisect
+import cache
+
+__author__ = 'Bruce Stringer'
+
+FLAVOR_TTL = 86400
+IMAGE_TTL = 3600
+DEFAULT_RAM = 512
+DEFAULT_IMAGE = "CentOS 6.3"
+
+
+def _flavor_info(flavor):
+    return {'id': str(flavor.id), 'name': flavor.name, 'ram': int(flavor.ram), 'vcpus': int(flavor.vcpus),
+            'disk': int(flavor.disk)}
+
+
+def _image_info(image):
+    return {'id': str(image.id), 'name': image.name, 'status': getattr(image, 'status', None),
+            'minRam': getattr(image, 'minRam', 0), 'minDisk': getattr(image, 'minDisk', 0),
+            'created': getattr(image, 'created', "")}
+
+
+class Catalog(object):
+    """
+    The flavors and images of one account. Entries are dicts, flavors with id, name, ram, vcpus and disk and images
+    with id, name, status, minRam, minDisk and created.
+    """
+
+    def __init__(self, cs, flavor_ttl=FLAVOR_TTL, image_ttl=IMAGE_TTL):
+        """
+        :param cs: A pyrax cloudserver client object with its auth already initialized.
+        :param flavor_ttl: Seconds the cached flavor list stays fresh
+        :param image_ttl: Seconds the cached image list stays fresh
+        """
+        self.cs = cs
+        self.flavor_ttl = flavor_ttl
+        self.image_ttl = image_ttl
+        account = cache.cache_key(getattr(getattr(cs, "client", None), "management_url", ""))
+        self.flavor_path = cache.cache_path("catalog", account, "flavors.json")
+        self.image_path = cache.cache_path("catalog", account, "images.json")
+        self.flavors = None
+        self.images = None
+        #Whether each list came from the API during this run, in which case a miss is not worth a refresh.
+        self.flavors_fresh = False
+        self.images_fresh = False
+
+    def _load_flavors(self, refresh=False):
+        flavors = None if refresh else cache.load_json(self.flavor_path, max_age=self.flavor_ttl)
+        self.flavors_fresh = flavors is None
+        if flavors is None:
+            flavors = [_flavor_info(flavor) for flavor in self.cs.flavors.list()]
+            cache.store_json(self.flavor_path, flavors)
+
+        #Sorted by size so the smallest flavor meeting a minimum is found with a bisect on RAM.
+        self.flavors = sorted(flavors, key=lambda flavor: (flavor['ram'], flavor['vcpus'], flavor['disk']))
+        self._flavor_rams = [flavor['ram'] for flavor in self.flavors]
+        self.flavor_index = {}
+        for flavor in self.flavors:
+            for attribute in ('id', 'name', 'ram', 'vcpus', 'disk'):
+                value = flavor[attribute]
+                if attribute == 'name':
+                    value = value.lower()
+                self.flavor_index.setdefault((attribute, value), []).append(flavor)
+
+    def _load_images(self, refresh=False):
+        images = None if refresh else cache.load_json(self.image_path, max_age=self.image_ttl)
+        self.images_fresh = images is None
+        if images is None:
+            images = [_image_info(image) for image in self.cs.images.list(detailed=True)]
+            cache.store_json(self.image_path, images)
+
+        #Newest first, so a name shared by several snapshots resolves to the latest one.
+        self.images = sorted(images, key=lambda image: image['created'], reverse=True)
+        self.image_index = {}
+        for image in self.images:
+            self.image_index.setdefault(image['id'], []).append(image)
+            self.image_index.setdefault(image['name'].lower(), []).append(image)
+
+    def refresh(self):
+        """
+        Relists flavors and images from the API and rewrites the cache.
+        """
+        self._load_flavors(refresh=True)
+        self._load_images(refresh=True)
+
+    def find_flavors(self, **criteria):
+        """
+        Finds flavors through the index. Ex. find_flavors(ram=2048, vcpus=2)
+        :param criteria: Exact values for any of id, name, ram, vcpus and disk
+        :return: A list of matching flavors, smallest first
+        """
+        if self.flavors is None:
+            self._load_flavors()
+        matches = self._find_flavors(criteria)
+        if not matches and not self.flavors_fresh:
+            self._load_flavors(refresh=True)
+            matches = self._find_flavors(criteria)
+        return matches
+
+    def _find_flavors(self, criteria):
+        matches = None
+        for attribute, value in criteria.iteritems():
+            if attribute == 'name':
+                value = value.lower()
+            elif attribute == 'id':
+                value = str(value)
+            found = self.flavor_index.get((attribute, value), [])
+            matches = found if matches is None else [flavor for flavor in matches if flavor in found]
+        return list(self.flavors if matches is None else matches)
+
+    def flavor(self, key):
+        """
+        :param key: A flavor id or name
+        :return: The matching flavor. :raise: ValueError if there is none
+        """
+        matches = self.find_flavors(id=key) or self.find_flavors(name=str(key))
+        if not matches:
+            raise ValueError("No flavor found with the id or name: " + str(key))
+        return matches[0]
+
+    def smallest_flavor(self, ram=0, vcpus=0, disk=0):
+        """
+        Finds the smallest flavor meeting minimum sizes. Ex. smallest_flavor(ram=2048) for the smallest with 2 GB
+        :param ram: The minimum RAM in MB
+        :param vcpus: The minimum number of vCPUs
+        :param disk: The minimum disk in GB
+        :return: The flavor with the least RAM meeting every minimum. :raise: ValueError if there is none
+        """
+        if self.flavors is None:
+            self._load_flavors()
+        for attempt in (0, 1):
+            start = bisect.bisect_left(self._flavor_rams, ram)
+            for flavor in self.flavors[start:]:
+                if flavor['vcpus'] >= vcpus and flavor['disk'] >= disk:
+                    return flavor
+            if self.flavors_fresh:
+                break
+            self._load_flavors(refresh=True)
+        raise ValueError("No flavor found with at least %d MB RAM, %d vCPUs and %d GB disk" % (ram, vcpus, disk))
+
+    def image(self, key):
+        """
+        :param key: An image id or name
+        :return: The matching image, the newest if several share the name. :raise: ValueError if there is none
+        """
+        if self.images is None:
+            self._load_images()
+        matches = self.image_index.get(key) or self.image_index.get(key.lower())
+        if not matches and not self.images_fresh:
+            self._load_images(refresh=True)
+            matches = self.image_index.get(key) or self.image_index.get(key.lower())
+        if not matches:
+            raise ValueError("No image found with the id or name: " + key)
+        return matches[0]
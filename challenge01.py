@@ -1,22 +1,17 @@
 """
 Write a script that builds three 512 MB Cloud Servers that following a similar naming convention.
 (ie., web1, web2, web3) and returns the IP and login credentials for each server.
+
+Also builds fleets of hundreds or thousands of servers, Ex. --count 500 --name-template web{index:04d} --jsonl
 """
 __author__ = 'Bruce Stringer'
-import pyrax
-import os
-import novaclient.v1_1.client as cs_client
-import time
-
-
-#Loading credentials from ini file
-def auth(credential_location="~/.rackspace_cloud_credentials"):
-    """
-    Loads the pyrax credentials from ~/.rackspace_cloud_credentials
-    :param credential_location: The location containing the credential ini
-    """
-    credentials = os.path.expanduser(credential_location)
-    pyrax.set_credential_file(credentials)
+import argparse
+import json
+import sys
+import catalog
+import clients
+import fleet
+import workers
 
 
 def get_flavor_by_ram(cs, ram_size):
@@ -24,68 +19,15 @@ def get_flavor_by_ram(cs, ram_size):
     Grabs a flavor based on a specific pyrax cloud server account and the image ram.
     :param cs: A pyrax cloudserver client object with its auth already initialized.
     :param ram_size: An int of the flavor's ram limit counted in MB. Ex. 512
-    :return: Returns the first flavor found based on the flavor_size
+    :return: Returns the first flavor found based on the flavor_size, as a dict of its id, name, ram, vcpus and disk
     :raise: If no flavor is found a ValueError exception is raised.
     """
+    flavors = catalog.Catalog(cs).find_flavors(ram=ram_size)
 
-    #Checking to see if an appropriate Cloud server object was passed.
-    if not isinstance(cs, cs_client):
-        raise TypeError(cs, "Not a valid pyrax cloudserver client object")
-
-    flavor = [flavor for flavor in cs.flavors.list() if flavor.ram == ram_size][0]
-
-    if len(flavor) <= 0:
+    if len(flavors) <= 0:
         raise ValueError("No valid flavor found with the size of : " + str(ram_size))
 
-    return flavor
-
-
-def create_servers(cloud_account, image_uuid="c195ef3b-9195-4474-b6f7-16e5bd86acd0", flavor_id="2", num_servers=0,
-                   server_base_name="server"):
-
-    """
-    Creates a list of servers based on the given parameters.
-    :param cloud_account: A pyrax client object with authentication configured.
-    :param image_uuid: The uuid of the image to be provisioned from. Default Centos 6.3
-    :param flavor_id: The resource flavor of the server to be provisioned. Default 512
-    :param num_servers: The number of servers to provisions. Default 0
-    :param server_base_name: The base name of all servers to be provisioned. Default  server
-    :return: a list of server objects created and a dictionry of their admin passwords keyed by the server uuid.
-    """
-    servers = []
-    passwords = {}
-
-    #Iterating over the desired number of servers.
-    for count in range(0, num_servers):
-        server_name = server_base_name + str(count)
-        server = cloud_account.servers.create(server_name, image_uuid, flavor_id)
-        print "Creating server " + server_name
-
-        #Adding the server object to the list of servers created
-        servers.append(server)
-
-        #Registering passwords in password dict. Storing the password with the UUID as the key.
-        passwords[server.id] = server.adminPass
-    return servers, passwords
-
-
-def get_network_status(cs, server_list, polling_time=3):
-    """
-    Polls servers from the list
-    :param cs: client object with authentication set
-    :param server_list: List of server objects to check for network
-    :param polling_time: The time in seconds to sleep between polling attempts
-    :return: A list of server objects with complete network configuration
-    """
-    #Looping while the populated list is less than the list given.
-    servers = []
-    while len(servers) < len(server_list):
-        #populating a list of servers that have their networks provisioned.
-        servers = [cs.servers.get(server.id) for server in server_list if len(cs.servers.get(server.id).networks) > 0]
-        time.sleep(polling_time)
-        print "waiting"
-
-    return servers
+    return flavors[0]
 
 
 def print_server_info_list(server_list, passwords):
@@ -104,27 +46,93 @@ def print_server_info_list(server_list, passwords):
         print('===========================')
 
 
-def main():
-    #Setting Defaults
-    servers_to_create = 3
-    server_name = "apiserver"
-    flavor_id = "2"
-    image_uuid = "c195ef3b-9195-4474-b6f7-16e5bd86acd0"
-
-    #Authorizing with cloud servers
-    auth()
-    cs = pyrax.cloudservers
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build Cloud Servers that follow a naming convention and print their "
+                                                 "IPs and root passwords as each one comes up.")
+    parser.add_argument("-n", "--count", type=int, default=3, help="Number of servers to build. Default 3")
+    parser.add_argument("--name-template", default="apiserver{index}",
+                        help="str.format template for server names, Ex. web{index:04d}. Default apiserver{index}")
+    parser.add_argument("--start", type=int, default=0, help="The first {index} in the names. Default 0")
+    parser.add_argument("--ram", type=int, default=catalog.DEFAULT_RAM, help="Flavor RAM in MB. Default 512")
+    parser.add_argument("--image", default=catalog.DEFAULT_IMAGE, help="Image name or id. Default CentOS 6.3")
+    parser.add_argument("--batch-size", type=int, default=fleet.DEFAULT_BATCH_SIZE,
+                        help="Most servers created per batch. Lowered further to fit the create rate limit")
+    parser.add_argument("--max-workers", type=int, default=workers.DEFAULT_MAX_WORKERS,
+                        help="Most create calls in flight at once")
+    parser.add_argument("--timeout", type=int, help="Seconds to wait for each server to come up. Default no timeout")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="Write each server to stdout as a JSON line once it is up. Progress goes to stderr")
+    args = parser.parse_args()
+
+    if args.count < 1:
+        parser.error("--count must be at least 1")
+    try:
+        args.names = fleet.server_names(args.name_template, args.count, args.start)
+    except (KeyError, IndexError, ValueError) as e:
+        parser.error("Invalid --name-template: %s" % e)
+    if len(set(args.names)) != len(args.names):
+        parser.error("--name-template must include {index} when building more than one server")
+    return args
+
+
+def server_json(server, passwords):
+    return json.dumps({'name': server.name, 'id': server.id, 'password': passwords.get(server.id),
+                       'networks': server.networks})
 
-    #Creating server based on Defaults
-    servers, passwords = create_servers(cs, num_servers=servers_to_create, server_base_name=server_name,
-                                        image_uuid=image_uuid, flavor_id=flavor_id)
 
-    #collecting servers network information.
-    print "Waiting for networks to be configured."
-    servers = get_network_status(cs, servers)
+def main():
+    args = parse_args()
 
-    #display server information
-    print_server_info_list(servers, passwords)
+    #Authorizing with cloud servers
+    cs = clients.cloudservers()
+
+    #Looking up the flavor and image from the cached catalog
+    server_catalog = catalog.Catalog(cs)
+    flavor = server_catalog.smallest_flavor(ram=args.ram)
+    image_uuid = server_catalog.image(args.image)['id']
+
+    #Checking the account limits once and planning batches that fit them
+    try:
+        batches, interval = fleet.plan_batches(args.count, fleet.account_limits(cs), flavor['ram'], args.batch_size)
+    except ValueError as e:
+        print >> sys.stderr, e
+        sys.exit(2)
+    print >> sys.stderr, "Building %d %d MB servers in %d batches of up to %d, %.0fs apart" % (
+        args.count, flavor['ram'], len(batches), batches[0], interval)
+
+    #Servers are reported as soon as their networks are configured, while later batches are still being created.
+    builder = fleet.Fleet(cs, args.names, image_uuid, flavor['id'], batches, interval, max_workers=args.max_workers,
+                          timeout=args.timeout)
+    live = sys.stderr.isatty()
+    for event, name, server, error in builder:
+        if event == "ready":
+            if args.jsonl:
+                print server_json(server, builder.passwords)
+                sys.stdout.flush()
+            else:
+                if live:
+                    sys.stderr.write("\r\033[K")
+                print_server_info_list([server], builder.passwords)
+        elif event == "create_failed":
+            if live:
+                sys.stderr.write("\r\033[K")
+            print >> sys.stderr, "Failed to create server %s: %s" % (name, error)
+        elif event == "build_failed":
+            if live:
+                sys.stderr.write("\r\033[K")
+            print >> sys.stderr, "Server failed to build: " + name
+
+        if live:
+            counts = builder.counts
+            sys.stderr.write("\rCreated %d/%d  Ready %d  Failed %d" % (
+                counts['created'], args.count, counts['ready'], counts['create_failed'] + counts['build_failed']))
+    if live:
+        sys.stderr.write("\n")
+
+    counts = builder.counts
+    print >> sys.stderr, "%d of %d servers ready" % (counts['ready'], args.count)
+    if counts['ready'] < args.count:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
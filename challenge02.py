@@ -1,37 +1,19 @@
 """
 Write a script that clones a server (takes an image and deploys the image as a new server).
+
+Also fans out to several clones at once, Ex. --server web0 --clones 5 --flavor-override 0=2GB
 """
 __author__ = 'Bruce Stringer'
-import pyrax
-import os
+import argparse
 import datetime
-from novaclient import exceptions
-import time
-
-
-def get_int_input(message="Enter an integer: "):
-    """
-    Gets a valid int input from the user. If a valid integer is not entered, get_int_input calls itself again.
-    :param message: The message to be displayed to the user when gathering input.
-    :return: A valid integer
-    """
-    try:
-        choice_str = input(message)
-        choice = int(choice_str)
-        return choice
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_int_input(message)
-
-
-#Loading credentials from ini file
-def auth(credential_location="~/.rackspace_cloud_credentials"):
-    """
-    Loads the pyrax credentials from ~/.rackspace_cloud_credentials
-    :param credential_location: The location containing the credential ini
-    """
-    credentials = os.path.expanduser(credential_location)
-    pyrax.set_credential_file(credentials)
+import json
+import sys
+import catalog
+import fleet
+import snapshots
+import waiters
+import clients
+from common import get_int_input
 
 
 def select_server_from_list(cs):
@@ -61,6 +43,7 @@ def create_image(server, image_name=""):
     :param image_name: The desired name for the image.
     :return: The uuid of the generated image. :raise: Any exceptions generated from the client
     """
+    exceptions = clients.server_exc()
     if image_name == "":
         image_name = str(server.name) + " " + str(datetime.datetime.now())
 
@@ -73,47 +56,154 @@ def create_image(server, image_name=""):
     return image_uuid
 
 
-def clone_server(cs, image_uuid, name="clone", flavor_id=2):
-
-    new_image = cs.images.get(image_uuid)
-
-    if new_image._info['status'] == 'SAVING':
-        print "Image is currently " + str(new_image._info['progress']) + "% complete."
-        return None
-
-    return cs.servers.create(name, image_uuid, flavor_id)
+def find_or_create_image(cs, server, max_age=0):
+    """
+    Reuses a recent snapshot of the server, or joins one still being saved, before creating a new image.
+    :param cs: A pyrax cloudserver client object with its auth already initialized.
+    :param server: A valid Server object
+    :param max_age: The oldest snapshot, in seconds, that may be reused. Default 0, always create a new image
+    :return: The uuid of the image. :raise: Any exceptions generated from the client
+    """
+    index = snapshots.SnapshotIndex(cs)
+    if max_age > 0:
+        entry = index.find_reusable(server.id, max_age)
+        if entry is not None:
+            print "Reusing %s image: %s" % (entry['status'].lower(), entry['name'])
+            return entry['id']
+
+    image_uuid = create_image(server)
+    index.record(image_uuid, server.id, str(server.name))
+    return image_uuid
 
 
-def print_server_info(server):
+def print_server_info(server, password=None):
     print "Server Name: " + server.name
-    print "Root Password: " + server.adminPass
+    print "Root Password: " + (password or server.adminPass)
     for network_type, networks in server.networks.iteritems():
         if networks is not None:
             for address in networks:
                 print "Networks: " + network_type + " " + address
 
 
+def find_server(cs, key):
+    """
+    :param key: A server name or id
+    :return: The matching server. :raise: ValueError if there is not exactly one
+    """
+    matches = [server for server in cs.servers.list() if key in (server.id, server.name)]
+    if len(matches) != 1:
+        raise ValueError("%d servers match %s" % (len(matches), key))
+    return matches[0]
+
+
+def parse_flavor_overrides(values, server_catalog):
+    """
+    :param values: INDEX=FLAVOR strings, where FLAVOR is a flavor id or name. Ex. 0=4GB or 2=5
+    :return: A dict of clone index to flavor id
+    """
+    overrides = {}
+    for value in values:
+        index, separator, flavor = value.partition("=")
+        if not separator or not index.isdigit():
+            raise ValueError("Flavor overrides look like INDEX=FLAVOR, not " + value)
+        overrides[int(index)] = server_catalog.flavor(flavor)['id']
+    return overrides
+
+
+def clone_servers(cs, image_uuid, names, flavor_id, flavor_overrides=None, timeout=None):
+    """
+    Launches every clone at once and yields each one as it goes ACTIVE.
+    :param cs: A pyrax cloudserver client object with its auth already initialized.
+    :param image_uuid: The image to clone from. It must already be ACTIVE
+    :param names: The names of the clones
+    :param flavor_id: The flavor used for clones without an override
+    :param flavor_overrides: An optional dict of clone name to flavor id
+    :param timeout: Seconds to wait for each clone to go ACTIVE. Default no timeout
+    :return: A fleet.Fleet. Iterating it yields (event, name, server, error) as each clone is created, goes ACTIVE or
+    fails
+    """
+    return fleet.Fleet(cs, names, image_uuid, flavor_id, [len(names)], ready=waiters.is_active, timeout=timeout,
+                       flavor_overrides=flavor_overrides)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Image a server and launch one or more clones from the image.")
+    parser.add_argument("--server", help="Name or id of the server to clone. Default choose from a list")
+    parser.add_argument("-k", "--clones", type=int, default=1, help="Number of clones to launch. Default 1")
+    parser.add_argument("--name-template", help="str.format template for clone names, with {server} and {index}. "
+                                                "Default {server}-clone, or {server}-clone{index} for several")
+    parser.add_argument("--flavor", help="Flavor id or name for the clones. Default the source server's flavor")
+    parser.add_argument("--flavor-override", action="append", default=[], metavar="INDEX=FLAVOR",
+                        help="Flavor for one clone by its index. Repeatable")
+    parser.add_argument("--max-image-age", type=int, default=0,
+                        help="Reuse a snapshot of the server up to this many seconds old, Ex. %d. "
+                             "Default 0, always make a new image" % snapshots.MAX_AGE)
+    parser.add_argument("--timeout", type=int, help="Seconds to wait for the image and each clone. Default no limit")
+    parser.add_argument("--jsonl", action="store_true", help="Write each clone to stdout as a JSON line once ACTIVE")
+    args = parser.parse_args()
+    if args.clones < 1:
+        parser.error("--clones must be at least 1")
+    if args.name_template is None:
+        args.name_template = "{server}-clone" if args.clones == 1 else "{server}-clone{index}"
+    return args
+
+
 def main():
-    auth()
+    args = parse_args()
 
     #Creating cloudserver client
-    cs = pyrax.cloudservers
-
-    image_uuid = None
-    while image_uuid is None:
-        server = select_server_from_list(cs)
-        try:
-            image_uuid = create_image(server)
-        except exceptions.ClientException as e:
-            print "Unable to create image at this time: " + e.message
-
-    clone = None
-    while clone is None:
-        clone = clone_server(cs, image_uuid, name=server.name + "-clone", flavor_id=server._info['flavor']['id'])
-        if clone is None:
-            time.sleep(10)
-
-    print_server_info(clone)
+    cs = clients.cloudservers()
+    exceptions = clients.server_exc()
+
+    try:
+        server = find_server(cs, args.server) if args.server else select_server_from_list(cs)
+
+        #Names and flavors are settled before imaging so a bad override does not leave an unused image behind.
+        names = [args.name_template.format(server=server.name, index=index) for index in range(args.clones)]
+        if len(set(names)) != len(names):
+            print "--name-template must include {index} when launching more than one clone"
+            sys.exit(2)
+        server_catalog = catalog.Catalog(cs)
+        flavor_id = server_catalog.flavor(args.flavor)['id'] if args.flavor else server._info['flavor']['id']
+        overrides = parse_flavor_overrides(args.flavor_override, server_catalog)
+    except ValueError as e:
+        print e
+        sys.exit(1)
+    if any(index >= len(names) for index in overrides):
+        print "Flavor overrides must be for clone indexes 0 to %d" % (len(names) - 1)
+        sys.exit(2)
+    flavor_overrides = dict((names[index], flavor) for index, flavor in overrides.iteritems())
+
+    try:
+        image_uuid = find_or_create_image(cs, server, args.max_image_age)
+    except exceptions.ClientException as e:
+        print "Unable to create image at this time: " + e.message
+        sys.exit(1)
+
+    print "Waiting for the image to finish saving."
+    report = lambda progress: sys.stderr.write("\rImage is currently %s%% complete." % progress)
+    image = waiters.wait_for_progress(cs.images.get(image_uuid), timeout=args.timeout, report=report)
+    sys.stderr.write("\n")
+    if image is None:
+        print "Creating the image failed"
+        sys.exit(1)
+
+    clones = clone_servers(cs, image_uuid, names, flavor_id, flavor_overrides, timeout=args.timeout)
+    for event, name, clone, error in clones:
+        if event == "ready":
+            if args.jsonl:
+                print json.dumps({'name': clone.name, 'id': clone.id, 'password': clones.passwords.get(clone.id),
+                                  'networks': clone.networks})
+                sys.stdout.flush()
+            else:
+                print_server_info(clone, clones.passwords.get(clone.id))
+        elif event == "create_failed":
+            print >> sys.stderr, "Failed to create clone %s: %s" % (name, error)
+        elif event == "build_failed":
+            print >> sys.stderr, "Clone failed to build: " + name
+
+    if clones.counts['ready'] < len(names):
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
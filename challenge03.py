@@ -5,8 +5,14 @@ The script should handle errors appropriately. (Check for invalid paths, etc.)
 """
 __author__ = 'Bruce Stringer'
 
-import pyrax
+import argparse
 import os
+import container_browser
+import bulk_upload
+import folder_sync
+import uploads
+import clients
+from common import get_str_input
 
 
 def create_cloudfiles_container(cf, name):
@@ -15,37 +21,6 @@ def create_cloudfiles_container(cf, name):
     return container
 
 
-def get_str_input(message="Enter a string: "):
-    """
-   Gets a valid str input from the user. If a valid integer is not entered, get_int_input calls itself again.
-   :param message: The message to be displayed to the user when gathering input.
-   :return: A valid integer
-   """
-    try:
-        input_str = raw_input(message)
-        if input_str == "":
-            get_str_input(message)
-        return input_str
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_str_input(message)
-
-
-def get_int_input(message="Enter an integer: "):
-    """
-    Gets a valid int input from the user. If a valid integer is not entered, get_int_input calls itself again.
-    :param message: The message to be displayed to the user when gathering input.
-    :return: A valid integer
-    """
-    try:
-        choice_str = input(message)
-        choice = int(choice_str)
-        return choice
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_int_input(message)
-
-
 def select_folder():
     folder = get_str_input(message="Enter the location of the folder you would like to upload: ")
     if not os.path.isdir(folder):
@@ -54,62 +29,103 @@ def select_folder():
     return folder
 
 
-def upload_folder(container, folder):
+def upload_folder(container, folder, segment_threshold=uploads.SEGMENT_THRESHOLD, manifest="dynamic"):
+    """
+    Uploads the contents of a folder to a container. Files larger than segment_threshold are uploaded as parallel
+    segments with a large object manifest, and an interrupted upload resumes from the last completed segment.
+    :param container: A cloudfiles container object
+    :param folder: The local folder to upload
+    :param segment_threshold: Files larger than this many bytes are segmented
+    :param manifest: "dynamic" or "static" large object manifests
+    """
     try:
-        key, size = container.client.upload_folder(folder, container=container.name)
-        print 'Uploading %s to %s. File size is %d' % (folder, container.name, size)
+        uploaded, size, failures = uploads.upload_tree(container.client, container.name, folder,
+                                                       threshold=segment_threshold, manifest=manifest)
+        print 'Uploaded %d files from %s to %s. Total size is %d' % (uploaded, folder, container.name, size)
+        for path, error in failures:
+            print "Failed to upload %s: %s" % (path, error)
     except KeyboardInterrupt:
-        container.client.cancel_folder_upload(key)
-    except pyrax.exc.FolderNotFound:
+        print "Upload interrupted. Run it again to resume from the last completed segment."
+    except ValueError:
         print "Invalid Path"
 
 
 def select_container_from_list(cf, message="Please select a container by number: "):
     """
-    Offers the user a list of containers to select from based on the passed client
-    :param cf: A pyrax cloudserver client object with its auth already initialized.
+    Offers the user a paginated, searchable list of containers to select from based on the passed client
+    :param cf: A pyrax cloudfiles client object with its auth already initialized.
     :return: A cloudfiles object based on the selection
     """
-    containers = cf.get_all_containers()
-    for num in range(len(containers)):
-        print num, ") Server name:", containers[num].name, "  -- Object Count: ", containers[num].object_count
+    name = container_browser.browse(cf, message)
+    if name is not None:
+        return cf.get_container(name)
 
-    print str(len(containers)), ") Create new container"
-    choice = get_int_input(message)
     cont = None
-    if 0 <= choice <= len(containers) - 1:
-        cont = containers[choice]
-    elif choice == len(containers):
-        while cont is None:
-            name = get_str_input("Please enter the name for the new cloud files container: ")
-            cont = create_cloudfiles_container(cf, name)
-    else:
-        print choice
-        print "Invalid Choice."
-        select_container_from_list(cf)
-
+    while cont is None:
+        name = get_str_input("Please enter the name for the new cloud files container: ")
+        cont = create_cloudfiles_container(cf, name)
+    container_browser.invalidate(cf)
     return cont
 
 
-def auth(credential_location="~/.rackspace_cloud_credentials"):
+def sync_folder(container, folder, delete=False):
     """
-    Loads the pyrax credentials from ~/.rackspace_cloud_credentials
-    :param credential_location: The location containing the credential ini
-    :return:
+    Uploads only the files in a folder that are new or changed since the container was last synced.
+    :param container: A cloudfiles container object
+    :param folder: The local folder to sync
+    :param delete: Delete objects from the container that no longer exist in the folder
     """
-    credentials = os.path.expanduser(credential_location)
-    pyrax.set_credential_file(credentials)
+    try:
+        counts, failures = folder_sync.sync_folder(container.client, container.name, folder, delete=delete)
+        print "Synced %s to %s. Uploaded: %d  Unchanged: %d  Deleted: %d" % (
+            folder, container.name, counts['uploaded'], counts['unchanged'], counts['deleted'])
+        for name, error in failures:
+            print "Failed to sync %s: %s" % (name, error)
+    except KeyboardInterrupt:
+        print "Sync interrupted. Run it again to pick up where it stopped."
+    except ValueError:
+        print "Invalid Path"
+
+
+def archive_upload_folder(container, folder):
+    """
+    Uploads the contents of a folder as streamed tar archives extracted by Cloud Files.
+    Much faster than one request per object for folders holding large numbers of small files.
+    :param container: A cloudfiles container object
+    :param folder: The local folder to upload
+    """
+    try:
+        created, failures = bulk_upload.bulk_upload(container.client, container.name, folder)
+        print "Extracted %d files from %s into %s" % (created, folder, container.name)
+        for path, error in failures:
+            print "Failed to upload %s: %s" % (path, error)
+    except ValueError:
+        print "Invalid Path"
 
 
 def main():
-    auth()
-    cf = pyrax.cloudfiles
+    parser = argparse.ArgumentParser(description="Upload the contents of a directory to a Cloud Files container.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--sync", action="store_true",
+                      help="Only upload files that are new or changed since the last sync")
+    mode.add_argument("--archive", action="store_true",
+                      help="Upload as streamed tar archives. Best for large numbers of small files")
+    parser.add_argument("--delete", action="store_true",
+                        help="With --sync, delete objects that no longer exist locally")
+    args = parser.parse_args()
+
+    cf = clients.cloudfiles()
 
     container = select_container_from_list(cf, "Select which container would you upload your files to: ")
     print "You've selected: " + container.name
 
     folder = select_folder()
-    upload_folder(container, folder)
+    if args.sync:
+        sync_folder(container, folder, delete=args.delete)
+    elif args.archive:
+        archive_upload_folder(container, folder)
+    else:
+        upload_folder(container, folder)
     print "Upload Complete"
 
 if __name__ == "__main__":
@@ -4,49 +4,9 @@ and the database should have at least one user that can connect to it.
 """
 __author__ = 'Bruce Stringer'
 
-import pyrax
-import os
-
-
-def auth(credential_location="~/.rackspace_cloud_credentials"):
-    """
-    Loads the pyrax credentials from ~/.rackspace_cloud_credentials
-    :param credential_location: The location containing the credential ini
-    :return:
-    """
-    credentials = os.path.expanduser(credential_location)
-    pyrax.set_credential_file(credentials)
-
-
-def get_int_input(message="Enter an integer: "):
-    """
-    Gets a valid int input from the user. If a valid integer is not entered, get_int_input calls itself again.
-    :param message: The message to be displayed to the user when gathering input.
-    :return: A valid integer
-    """
-    try:
-        choice_str = input(message)
-        choice = int(choice_str)
-        return choice
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_int_input(message)
-
-
-def get_str_input(message="Enter a string: "):
-    """
-   Gets a valid str input from the user. If a valid integer is not entered, get_int_input calls itself again.
-   :param message: The message to be displayed to the user when gathering input.
-   :return: A valid integer
-   """
-    try:
-        input_str = raw_input(message)
-        if input_str == "":
-            get_str_input(message)
-        return input_str
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_str_input(message)
+import waiters
+import clients
+from common import get_int_input, get_str_input
 
 
 def get_storage_size():
@@ -101,9 +61,7 @@ def print_user_info(user):
 
 
 def main():
-    auth()
-
-    db_client = pyrax.cloud_databases
+    db_client = clients.cloud_databases()
 
     flavor = select_flavor_from_list(db_client, "Please select a database flavor: ")
     print "You have selected: " + flavor.name
@@ -117,7 +75,7 @@ def main():
 
     instance = create_instance(db_client, instance_name=db_instance, flavor=flavor, volume=size)
     print "Waiting for instance to be created."
-    if not pyrax.utils.wait_until(instance, 'status', 'ACTIVE', interval=30, verbose=True):
+    if not waiters.wait_for(instance, db_client.list):
         print "Creating the instance failed"
         quit()
     print instance.name, " instance created. ID: ", instance.id
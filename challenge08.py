@@ -5,52 +5,11 @@ upload the object to the container, and create a CNAME record pointing  to the C
 """
 __author__ = 'Bruce Stringer'
 
-import pyrax
-import os
+import clients
+from common import add_record, get_int_input, get_str_input
 from urlparse import urlparse
 
 
-def auth(credential_location="~/.rackspace_cloud_credentials"):
-    """
-    Loads the pyrax credentials from ~/.rackspace_cloud_credentials
-    :param credential_location: The location containing the credential ini
-    :return:
-    """
-    credentials = os.path.expanduser(credential_location)
-    pyrax.set_credential_file(credentials)
-
-
-def get_int_input(message="Enter an integer: "):
-    """
-    Gets a valid int input from the user. If a valid integer is not entered, get_int_input calls itself again.
-    :param message: The message to be displayed to the user when gathering input.
-    :return: A valid integer
-    """
-    try:
-        choice_str = input(message)
-        choice = int(choice_str)
-        return choice
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_int_input(message)
-
-
-def get_str_input(message="Enter a string: "):
-    """
-   Gets a valid str input from the user. If a valid integer is not entered, get_int_input calls itself again.
-   :param message: The message to be displayed to the user when gathering input.
-   :return: A valid integer
-   """
-    try:
-        input_str = raw_input(message)
-        if input_str == "":
-            get_str_input(message)
-        return input_str
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_str_input(message)
-
-
 def create_cloudfiles_container(cf_client, name):
     container = cf_client.create_container(name)
     print "Created container: " + name
@@ -84,39 +43,9 @@ def select_domain_from_list(dns_client, message="Please select a container by nu
     return domain
 
 
-def add_record(domain, fqdn, record_type, data, priority="", ttl=300):
-    record_types = ["A", "CNAME", "MX", "NS", "SRV", "TXT"]
-    record_type = str(record_type).upper()
-    if record_type not in record_types:
-        raise ValueError("Not a valid record type.")
-    elif ttl < 300 or ttl > 86400:
-        raise ValueError("Invalid TTYL. Should be between 300 and 86400")
-
-    record = {
-        'type': record_type,
-        'name': fqdn,
-        'data': data,
-        'ttl': ttl,
-        }
-
-    if record_type == "MX":
-        if priority < 0 or priority > 65535:
-            raise ValueError("Invalid priority. Should be between 0 and 65535")
-        record['priority'] = priority
-
-    try:
-        generated_record = domain.add_records(record)
-    except (pyrax.exc.BadRequest,  pyrax.exc.DomainRecordAdditionFailed) as e:
-        raise
-
-    return generated_record
-
-
 def main():
-    auth()
-
-    cf_client = pyrax.cloudfiles
-    dns_client = pyrax.cloud_dns
+    cf_client = clients.cloudfiles()
+    dns_client = clients.cloud_dns()
 
     #create new container
     container_name = get_str_input("Please enter the name for your new container: ")
@@ -4,98 +4,62 @@ and flavor it creates a server of the specified image and flavor with the same n
 and creates a DNS entry for the fqdn pointing to the server's public IP.
 """
 from __future__ import with_statement
-from urlparse import urlparse
-import pyrax
-import os
+import argparse
 import sys
+import catalog
+import dns_cache
+import waiters
+import public_suffix
+import clients
+from common import add_record
+from hostnames import get_domain_parts
 __author__ = 'Bruce Stringer'
 
 
-class DomainParts(object):
-    def __init__(self, domain_parts, tld):
-        self.domain = None
-        self.subdomains = None
-        self.tld = tld
-        if domain_parts:
-            self.domain = domain_parts[-1]
-            if len(domain_parts) > 1:
-                self.subdomains = domain_parts[:-1]
-
-
-def get_domain_parts(url, tlds):
-    urlElements = urlparse(url).hostname.split('.')
-    # urlElements = ["abcde","co","uk"]
-    for i in range(-len(urlElements),0):
-        lastIElements = urlElements[i:]
-        #    i=-3: ["abcde","co","uk"]
-        #    i=-2: ["co","uk"]
-        #    i=-1: ["uk"] etc
-
-        candidate = ".".join(lastIElements) # abcde.co.uk, co.uk, uk
-        wildcardCandidate = ".".join(["*"]+lastIElements[1:]) # *.co.uk, *.uk, *
-        exceptionCandidate = "!"+candidate
-
-        # match tlds:
-        if (exceptionCandidate in tlds):
-            return ".".join(urlElements[i:])
-        if (candidate in tlds or wildcardCandidate in tlds):
-            return DomainParts(urlElements[:i], '.'.join(urlElements[i:]))
-            # returns ["abcde"]
-
-    raise ValueError("Domain not in global list of TLDs")
-
-
-def auth(credential_location="~/.rackspace_cloud_credentials"):
-    """
-    Loads the pyrax credentials from ~/.rackspace_cloud_credentials
-    :param credential_location: The location containing the credential ini
-    :return:
-    """
-    credentials = os.path.expanduser(credential_location)
-    pyrax.set_credential_file(credentials)
-
-
-def add_record(domain, fqdn, record_type, data, priority="", ttl=300):
-    record_types = ["A", "CNAME", "MX", "NS", "SRV", "TXT"]
-    record_type = str(record_type).upper()
-    if record_type not in record_types:
-        raise ValueError("Not a valid record type.")
-    elif ttl < 300 or ttl > 86400:
-        raise ValueError("Invalid TTYL. Should be between 300 and 86400")
-
-    record = {
-        'type': record_type,
-        'name': fqdn,
-        'data': data,
-        'ttl': ttl,
-    }
-
-    if record_type == "MX":
-        if priority < 0 or priority > 65535:
-            raise ValueError("Invalid priority. Should be between 0 and 65535")
-        record['priority'] = priority
-
-    try:
-        generated_record = domain.add_records(record)
-    except (pyrax.exc.BadRequest, pyrax.exc.DomainRecordAdditionFailed) as e:
-        raise
-
-    return generated_record
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create a server named after an FQDN and an A record pointing at it.")
+    parser.add_argument("fqdn", nargs="?", default="testserver.brucestringer.com", help="The server name and record")
+    parser.add_argument("--image", default=catalog.DEFAULT_IMAGE, help="Image id or name. Default " +
+                                                                        catalog.DEFAULT_IMAGE)
+    parser.add_argument("--flavor", help="Flavor id or name. Default the smallest %d MB flavor" % catalog.DEFAULT_RAM)
+    parser.add_argument("--early-dns", action="store_true",
+                        help="Create the record as soon as a public IPv4 address is assigned rather than once ACTIVE")
+    parser.add_argument("--rollback", action="store_true",
+                        help="With --early-dns, delete the record again if the build ends in ERROR")
+    parser.add_argument("--timeout", type=int, help="Seconds to wait for the server. Default no limit")
+    return parser.parse_args()
+
+
+def publish_record(domain, fqdn, server, record_cache):
+    ip = waiters.public_ipv4(server)
+    records = add_record(domain, fqdn=fqdn, record_type="A", data=ip, record_cache=record_cache)
+    print "Created A record %s -> %s" % (fqdn, ip)
+    return records
+
+
+def rollback_record(domain, records, record_cache):
+    for record in records:
+        record.delete()
+    record_cache.record_removed(domain)
+    print "Deleted the A record again"
 
 
 def main():
-    #TODO: argparse these
-    FQDN = "testserver.brucestringer.com"
-    flavor_id = "2"
-    image_uuid = "c195ef3b-9195-4474-b6f7-16e5bd86acd0"
+    args = parse_args()
+    FQDN = args.fqdn
+
+    cs_client = clients.cloudservers()
+    dns_client = clients.cloud_dns()
 
-    auth()
-    cs_client = pyrax.cloudservers
-    dns_client = pyrax.cloud_dns
+    server_catalog = catalog.Catalog(cs_client)
+    if args.flavor:
+        flavor_id = server_catalog.flavor(args.flavor)['id']
+    else:
+        flavor_id = server_catalog.smallest_flavor(ram=catalog.DEFAULT_RAM)['id']
+    image_uuid = server_catalog.image(args.image)['id']
 
-    # load tlds, ignore comments and empty lines:
-    with open("tlds.txt") as tldFile:
-        tlds = [line.strip() for line in tldFile if line[0] not in "/\n"]
+    # load tlds through the compiled index, rebuilt automatically when tlds.txt changes:
+    tlds = public_suffix.load("tlds.txt")
 
     domain_parts = get_domain_parts("http://" + FQDN, tlds)
     print "Domain:", domain_parts.domain
@@ -104,38 +68,41 @@ def main():
 
     domain_name = domain_parts.domain + "." + domain_parts.tld
 
-    #Find domain
-    try:
-        domain = dns_client.find(name=domain_name)
-    except pyrax.exc.NotFound:
+    #Find domain, preferring a delegated subzone of it when the FQDN falls under one
+    domain = dns_cache.DomainResolver(dns_client).resolve(FQDN)
+    if domain is None:
         print "There is no DNS information for the domain '%s'." % domain_name
         sys.exit(1)
 
-    records = domain.list_records()
-    for record in records:
-        if record.name.lower() == FQDN.lower() and record.type in ['A', 'CNAME']:
-            print "Record for this FQDN %s already exists. Exiting" % FQDN
-            sys.exit(2)
+    record_cache = dns_cache.RecordCache()
+    if record_cache.exists(domain, FQDN, ['A', 'CNAME']):
+        print "Record for this FQDN %s already exists. Exiting" % FQDN
+        sys.exit(2)
 
     print "Creating server: ", FQDN
     server = cs_client.servers.create(FQDN, image_uuid, flavor_id)
 
-    if pyrax.utils.wait_until(server, 'status', 'ACTIVE', verbose_atts=['progress'], interval=30, verbose=True) is None:
+    records = None
+    if args.early_dns:
+        #Public addresses are assigned well before the build finishes, so DNS propagation overlaps with the build.
+        if waiters.wait_for(server, cs_client.servers.list, ready=waiters.has_public_ipv4,
+                            timeout=args.timeout) is None:
+            print "Server failed before a public address was assigned."
+            sys.exit(1)
+        records = publish_record(domain, FQDN, server, record_cache)
+
+    if waiters.wait_for(server, cs_client.servers.list, timeout=args.timeout) is None:
         print "Server failed to build in a timely manner."
-        quit()
+        if records is not None and args.rollback and server.status == "ERROR":
+            rollback_record(domain, records, record_cache)
+        sys.exit(1)
 
     #TODO format server info
 
-    #Grab network
-    server.get()
-    ips = server.addresses['public']
-
-    ip = [ip['addr'] for ip in ips if ip['version'] == 4][0]
-
-
-    #create DNS entry based on fqdn
-    record = add_record(domain, fqdn=FQDN, record_type="A", data=ip)
-    print record
+    if records is None:
+        #create DNS entry based on fqdn
+        records = publish_record(domain, FQDN, server, record_cache)
+    print records
 
 if __name__ == "__main__":
     main()
@@ -7,126 +7,23 @@
 - Write the error page html to a file in cloud files for backup.
 """
 from __future__ import with_statement
-from urlparse import urlparse
-import pyrax
-import os
-import re
-import time
+import Queue
+import argparse
 import sys
+import catalog
+import dns_cache
+import lb_nodes
+import public_suffix
+import waiters
+import workflow
+import clients
+from common import add_record, create_servers, get_str_input
+from hostnames import get_domain_parts, isValidHostname
 
 
 __author__ = 'Bruce Stringer'
 
 
-class DomainParts(object):
-    def __init__(self, domain_parts, tld):
-        self.domain = None
-        self.subdomains = None
-        self.tld = tld
-        if domain_parts:
-            self.domain = domain_parts[-1]
-            if len(domain_parts) > 1:
-                self.subdomains = domain_parts[:-1]
-
-    def base_domain(self):
-        return self.domain + "." + self.tld
-
-
-def get_domain_parts(url, tlds):
-    urlElements = urlparse(url).hostname.split('.')
-    # urlElements = ["abcde","co","uk"]
-    for i in range(-len(urlElements), 0):
-        lastIElements = urlElements[i:]
-        #    i=-3: ["abcde","co","uk"]
-        #    i=-2: ["co","uk"]
-        #    i=-1: ["uk"] etc
-
-        candidate = ".".join(lastIElements)  # abcde.co.uk, co.uk, uk
-        wildcardCandidate = ".".join(["*"] + lastIElements[1:])  # *.co.uk, *.uk, *
-        exceptionCandidate = "!" + candidate
-
-        # match tlds:
-        if (exceptionCandidate in tlds):
-            return ".".join(urlElements[i:])
-        if (candidate in tlds or wildcardCandidate in tlds):
-            return DomainParts(urlElements[:i], '.'.join(urlElements[i:]))
-            # returns ["abcde"]
-
-    raise ValueError("Domain not in global list of TLDs")
-
-
-def auth(credential_location="~/.rackspace_cloud_credentials"):
-    """
-    Loads the pyrax credentials from ~/.rackspace_cloud_credentials
-    :param credential_location: The location containing the credential ini
-    :return:
-    """
-    credentials = os.path.expanduser(credential_location)
-    pyrax.set_credential_file(credentials)
-
-
-def get_int_input(message="Enter an integer: "):
-    """
-    Gets a valid int input from the user. If a valid integer is not entered, get_int_input calls itself again.
-    :param message: The message to be displayed to the user when gathering input.
-    :return: A valid integer
-    """
-    try:
-        choice_str = input(message)
-        choice = int(choice_str)
-        return choice
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_int_input(message)
-
-
-def get_str_input(message="Enter a string: "):
-    """
-   Gets a valid str input from the user. If a valid integer is not entered, get_int_input calls itself again.
-   :param message: The message to be displayed to the user when gathering input.
-   :return: A valid integer
-   """
-    try:
-        input_str = raw_input(message)
-        if input_str == "":
-            get_str_input(message)
-        return input_str
-    except (ValueError, SyntaxError, NameError):
-        print "Invalid Input"
-        get_str_input(message)
-
-
-def create_servers(cloud_account, image_uuid="c195ef3b-9195-4474-b6f7-16e5bd86acd0", flavor_id="2", num_servers=0,
-                   server_base_name="server", files=None):
-    """
-    Creates a list of servers based on the given parameters.
-    :param cloud_account: A pyrax client object with authentication configured.
-    :param image_uuid: The uuid of the image to be provisioned from. Default Centos 6.3
-    :param flavor_id: The resource flavor of the server to be provisioned. Default 512
-    :param num_servers: The number of servers to provisions. Default 0
-    :param server_base_name: The base name of all servers to be provisioned. Default  server
-    :return: a list of server objects created and a dictionry of their admin passwords keyed by the server uuid.
-    """
-    servers = []
-    passwords = {}
-
-    #Iterating over the desired number of servers.
-    for count in range(0, num_servers):
-        server_name = server_base_name
-        if files is None:
-            server = cloud_account.servers.create(server_name, image_uuid, flavor_id)
-        else:
-            server = cloud_account.servers.create(server_name, image_uuid, flavor_id, files=files)
-        print "Creating server " + server_name
-
-        #Adding the server object to the list of servers created
-        servers.append(server)
-
-        #Registering passwords in password dict. Storing the password with the UUID as the key.
-        passwords[server.id] = server.adminPass
-    return servers
-
-
 def get_ssh_key():
     ssh_key_location = get_str_input("Please enter the location for the ssh key you would like to use: ")
     try:
@@ -139,17 +36,8 @@ def get_ssh_key():
     return None
 
 
-def isValidHostname(hostname):
-    if len(hostname) > 255:
-        return False
-    if hostname[-1:] == ".":
-        hostname = hostname[:-1] # strip exactly one dot from the right, if present
-    allowed = re.compile("(?!-)[A-Z\d-]{1,63}(?<!-)$", re.IGNORECASE)
-    return all(allowed.match(x) for x in hostname.split("."))
-
-
 def get_fqdn(tlds):
-    domain = get_str_input("Please enter the FQDN to be used for your 2 new servers: ").lower()
+    domain = get_str_input("Please enter the FQDN to be used for your new servers: ").lower()
     if not isValidHostname(domain):
         print "Invalid domain: %s" % domain
         get_fqdn(tlds)
@@ -183,34 +71,6 @@ def create_vip(lb_client):
     return lb_client.VirtualIP(type="PUBLIC")
 
 
-def add_record(domain, fqdn, record_type, data, priority="", ttl=300):
-    record_types = ["A", "CNAME", "MX", "NS", "SRV", "TXT"]
-    record_type = str(record_type).upper()
-    if record_type not in record_types:
-        raise ValueError("Not a valid record type.")
-    elif ttl < 300 or ttl > 86400:
-        raise ValueError("Invalid TTYL. Should be between 300 and 86400")
-
-    record = {
-        'type': record_type,
-        'name': fqdn,
-        'data': data,
-        'ttl': ttl,
-        }
-
-    if record_type == "MX":
-        if priority < 0 or priority > 65535:
-            raise ValueError("Invalid priority. Should be between 0 and 65535")
-        record['priority'] = priority
-
-    try:
-        generated_record = domain.add_records(record)
-    except (pyrax.exc.BadRequest,  pyrax.exc.DomainRecordAdditionFailed) as e:
-        raise
-
-    return generated_record
-
-
 def create_cloudfiles_container(cf_client, name):
     container = cf_client.create_container(name)
     print "Created container: " + name
@@ -222,98 +82,236 @@ def create_object(container, content, index_name="index.html", content_type='tex
     return index
 
 
-def main():
-    auth()
+class ServerArrivals(object):
+    """
+    Servers reporting in, in the order their private networks come up. remaining counts those not yet taken.
+    """
+
+    def __init__(self):
+        self.queue = Queue.Queue()
+        self.remaining = 0
+
+    def watch(self, cs_client, servers):
+        self.remaining += len(servers)
+        for server in servers:
+            waiters.default_waiter().wait_for(server, cs_client.servers.list, ready=waiters.has_private_network,
+                                              callback=self.queue.put)
+
+    def next(self):
+        """
+        Blocks for the next server, in slices so Ctrl-C still interrupts the wait.
+        :return: The server's WaitHandle. :raise: RuntimeError if the waiter stopped before every server reported in
+        """
+        while True:
+            try:
+                handle = self.queue.get(True, 1)
+            except Queue.Empty:
+                if not waiters.default_waiter().thread.is_alive():
+                    raise RuntimeError("The resource waiter stopped before every server reported in")
+                continue
+            self.remaining -= 1
+            return handle
+
+    def ready_now(self):
+        """
+        :return: The WaitHandles of the servers that have already reported in, without blocking
+        """
+        handles = []
+        while True:
+            try:
+                handles.append(self.queue.get_nowait())
+            except Queue.Empty:
+                return handles
+            self.remaining -= 1
+
+
+def build_workflow(cs_client, lb_client, cf_client, domain, fqdn, files, error_page, container_name,
+                   record_cache=None, num_servers=2, pipelined=False):
+    """
+    Declares the deployment as a workflow.Workflow. The servers, load balancer and DNS record form one chain while the
+    backup container is created and written alongside it. The DNS record only needs the VIP address, which the load
+    balancer has as soon as it is created, so it does not wait for the load balancer to go ACTIVE.
+
+    Pipelined, the load balancer is created with the first server whose private network comes up and every later
+    server is added as a node as soon as its network appears, so a slow server no longer holds back the rest.
+    :param num_servers: The number of servers behind the load balancer
+    :param pipelined: Attach servers as they become ready rather than once all of them are
+    :return: The workflow, ready to run
+    """
+    deployment = workflow.Workflow()
+
+    def lookup_image_and_flavor():
+        #Uses the 512 MB flavor and CentOS image from the cached catalog
+        server_catalog = catalog.Catalog(cs_client)
+        return (server_catalog.image(catalog.DEFAULT_IMAGE)['id'],
+                server_catalog.smallest_flavor(ram=catalog.DEFAULT_RAM)['id'])
+
+    def build_servers(image_and_flavor):
+        image_uuid, flavor_id = image_and_flavor
+        servers, passwords, failures = create_servers(cs_client, image_uuid=image_uuid, flavor_id=flavor_id,
+                                                      num_servers=num_servers, server_base_name=fqdn, files=files,
+                                                      numbered=False)
+        for name, error in failures:
+            print "Failed to create server: %s" % error
+        if not servers:
+            raise RuntimeError("No servers could be created")
+        return servers
+
+    def wait_for_networks(servers):
+        print "Waiting for servers networks to be provisioned."
+        servers, failed = waiters.wait_for_all(servers, cs_client.servers.list, ready=waiters.has_private_network)
+        if failed:
+            raise RuntimeError("Server failed to build")
+        return servers
+
+    def build_load_balancer(servers):
+        nodes = []
+        for server in servers:
+            print server.networks['private'][0]
+            nodes.append(create_node(lb_client, server.networks['private'][0]))
+        return create_load_balancer(lb_client, fqdn, nodes=nodes, virtaul_ips=[create_vip(lb_client)])
+
+    def wait_for_load_balancer(lb):
+        if not waiters.wait_for(lb, lb_client.list):
+            raise RuntimeError("Creating the lb failed")
+        return lb
+
+    def add_monitor(lb):
+        lb.add_health_monitor(type="CONNECT", delay=10, timeout=10, attemptsBeforeDeactivation=3)
+        #The load balancer is immutable until the monitor change is applied.
+        return wait_for_load_balancer(lb)
+
+    def add_dns_record(lb):
+        return add_record(domain, fqdn=fqdn, record_type="A", data=lb.virtual_ips[0].address,
+                          record_cache=record_cache)
+
+    #Pipelined, servers report in here as their networks come up and every load balancer change goes through the
+    #reconciler so the node, monitor and error page changes never collide while the load balancer is PENDING_UPDATE.
+    arrivals = ServerArrivals()
+    reconciler = lb_nodes.NodeReconciler(lb_client, None)
+
+    def build_load_balancer_from_first(servers):
+        arrivals.watch(cs_client, servers)
+        while arrivals.remaining:
+            handle = arrivals.next()
+            if handle.succeeded:
+                address = handle.resource.networks['private'][0]
+                print "First server ready, creating the load balancer with %s" % address
+                reconciler.lb = create_load_balancer(lb_client, fqdn, nodes=[create_node(lb_client, address)],
+                                                     virtaul_ips=[create_vip(lb_client)])
+                return reconciler.lb
+            print "Server failed to build: " + handle.resource.name
+        raise RuntimeError("No server finished building")
+
+    def attach_remaining(lb):
+        failed = []
+        while arrivals.remaining:
+            #Block for the next server, then take every other one that is already ready in the same request.
+            handles = [arrivals.next()] + arrivals.ready_now()
+            failed.extend(handle.resource.name for handle in handles if not handle.succeeded)
+            addresses = [handle.resource.networks['private'][0] for handle in handles if handle.succeeded]
+            if addresses:
+                reconciler.apply([(address, 80) for address in addresses], [])
+                print "Added %s to the load balancer" % ", ".join(addresses)
+        reconciler.wait_active()
+        if failed:
+            raise RuntimeError("Servers failed to build: " + ", ".join(failed))
+        return lb
+
+    def add_monitor_pipelined(lb):
+        reconciler.change(lb.add_health_monitor, type="CONNECT", delay=10, timeout=10, attemptsBeforeDeactivation=3)
+        return lb
+
+    def set_error_page_pipelined(lb):
+        reconciler.change(lb.set_error_page, error_page)
+        reconciler.wait_active()
+        return lb
+
+    deployment.add("catalog", lookup_image_and_flavor)
+    deployment.add("create_servers", build_servers, requires=["catalog"])
+    if pipelined:
+        deployment.add("create_lb", build_load_balancer_from_first, requires=["create_servers"])
+        deployment.add("wait_lb", wait_for_load_balancer, requires=["create_lb"])
+        deployment.add("attach_nodes", attach_remaining, requires=["wait_lb"])
+        deployment.add("health_monitor", add_monitor_pipelined, requires=["wait_lb"])
+        deployment.add("error_page", set_error_page_pipelined, requires=["health_monitor"])
+    else:
+        deployment.add("wait_networks", wait_for_networks, requires=["create_servers"])
+        deployment.add("create_lb", build_load_balancer, requires=["wait_networks"])
+        deployment.add("wait_lb", wait_for_load_balancer, requires=["create_lb"])
+        deployment.add("health_monitor", add_monitor, requires=["wait_lb"])
+        deployment.add("error_page", lambda lb: lb.set_error_page(error_page), requires=["health_monitor"])
+    deployment.add("dns_record", add_dns_record, requires=["create_lb"])
+    deployment.add("container", lambda: create_cloudfiles_container(cf_client, container_name))
+    deployment.add("backup", lambda container: create_object(container, error_page, index_name="error.html"),
+                   requires=["container"])
+    return deployment
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build load balanced servers with DNS, an error page and a backup.")
+    parser.add_argument("-n", "--servers", type=int, default=2, help="Servers behind the load balancer. Default 2")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Create the load balancer with the first ready server and add the rest as they come up")
+    args = parser.parse_args()
+    if args.servers < 1:
+        parser.error("--servers must be at least 1")
+    return args
 
-    cs_client = pyrax.cloudservers
-    dns_client = pyrax.cloud_dns
-    lb_client = pyrax.cloud_loadbalancers
-    cf_client = pyrax.cloudfiles
 
-    # load tlds, ignore comments and empty lines:
-    with open("tlds.txt") as tldFile:
-        tlds = [line.strip() for line in tldFile if line[0] not in "/\n"]
+def main():
+    args = parse_args()
+    cs_client = clients.cloudservers()
+    dns_client = clients.cloud_dns()
+    lb_client = clients.cloud_loadbalancers()
+    cf_client = clients.cloudfiles()
+
+    # load tlds through the compiled index, rebuilt automatically when tlds.txt changes:
+    tlds = public_suffix.load("tlds.txt")
 
+    domain_resolver = dns_cache.DomainResolver(dns_client)
+    record_cache = dns_cache.RecordCache()
     valid_domain = False
     while not valid_domain:
         #get domain
         domain_parts, fqdn = get_fqdn(tlds)
         base_domain = domain_parts.base_domain()
 
-        #Find domain
-        try:
-            domain = dns_client.find(name=base_domain)
-        except pyrax.exc.NotFound:
+        #Find domain, preferring a delegated subzone of it when the FQDN falls under one
+        domain = domain_resolver.resolve(fqdn)
+        if domain is None:
             #TODO allow creation of domain
             print "There is no DNS information for the domain '%s'." % base_domain
             continue
 
-        records = domain.list_records()
         valid_domain = True
-        for record in records:
-            if record.name.lower() == fqdn and record.type in ['A', 'CNAME']:
-                print "Record for this FQDN %s already exists." % fqdn
-                valid_domain = False
+        if record_cache.exists(domain, fqdn, ['A', 'CNAME']):
+            print "Record for this FQDN %s already exists." % fqdn
+            valid_domain = False
 
     print "\'%s\' selected." % fqdn
 
+    #Everything interactive is asked up front so the workflow can run without stopping for input.
     key_location, key_contents = get_ssh_key()
     files = {
         '/root/.ssh/authorized_keys': key_contents
     }
-    #create Servers with key
-    servers = create_servers(cs_client, server_base_name=fqdn, files=files, num_servers=2)
-
-    #Wait for servers' networks to be created
-    print "Waiting for servers networks to be provisioned."
-    network_configured = False
-    while not network_configured:
-        network_configured = True
-        for server in servers:
-            server.get()
-            if 'private' not in server.networks:
-                network_configured = False
-            if server.status == "ERROR":
-                print "Server failed to build, Exiting"
-                sys.exit(2)
-        if not network_configured:
-            sys.stdout.write('.')
-            time.sleep(30)
-
-    #create nodes
-    nodes = []
-    for server in servers:
-        print server.networks['private'][0]
-        nodes.append(create_node(lb_client, server.networks['private'][0]))
-
-    #create lb with nodes
-    vip = create_vip(lb_client)
-
-    lb = create_load_balancer(lb_client, fqdn, nodes=nodes, virtaul_ips=[vip])
-
-    if not pyrax.utils.wait_until(lb, 'status', 'ACTIVE', interval=30, verbose=True):
-        print "Creating the lb failed"
-        sys.exit(3)
-
-    print lb
-
-    #setup LB monitor with custom error page
-    lb.add_health_monitor(type="CONNECT", delay=10, timeout=10,
-                          attemptsBeforeDeactivation=3)
-
     error_page = get_str_input("Please enter the text to display on your customer error page: ")
+    container_name = get_str_input("Please enter the name for your new container: ")
 
-    lb.set_error_page(error_page)
-
-    #create dns record from lb VIP at FQDN
-    generate_record = add_record(domain, fqdn=fqdn, record_type="A", data=lb.virtual_ips[0].address)
-    print "Record created for %s at %s" % (fqdn, lb.virtual_ips[0].address)
-    #Write the error page html to a file in cloud files for backup.
+    deployment = build_workflow(cs_client, lb_client, cf_client, domain, fqdn, files, error_page, container_name,
+                                record_cache, num_servers=args.servers, pipelined=args.pipelined)
+    deployment.run()
+    deployment.report()
 
-    container_name = get_str_input("Please enter the name for your new container: ")
-    container = create_cloudfiles_container(cf_client, container_name)
-    create_object(container, error_page, index_name="error.html")
+    for name, error in sorted(deployment.failed.iteritems()):
+        print "Step %s failed: %s" % (name, error)
+    if deployment.skipped:
+        print "Skipped because a step they depend on failed: " + ", ".join(deployment.skipped)
+    if deployment.failed:
+        sys.exit(2)
 
+    print "Record created for %s at %s" % (fqdn, deployment.steps["create_lb"].result.virtual_ips[0].address)
     print "Container created and error page backed up."
 
 if __name__ == "__main__":
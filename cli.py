@@ -0,0 +1,64 @@
+"""
+Single entry point for the challenge scripts and tools.
+
+Usage: python cli.py <command> [arguments for that command]
+
+Commands are looked up in a static table and their module is imported only once the command is chosen, so --help
+and unknown commands never load pyrax or any service client. Everything after the command name is handed to that
+module's own main().
+"""
+import argparse
+import sys
+
+__author__ = 'Bruce Stringer'
+
+#Command name, module, help. Kept as plain strings so listing the commands imports nothing.
+COMMANDS = [
+    ("challenge01", "challenge01", "Build three 512 MB servers and print their IPs and root passwords"),
+    ("challenge02", "challenge02", "Clone a server through an image of it"),
+    ("challenge03", "challenge03", "Upload or sync a folder to a Cloud Files container"),
+    ("challenge04", "challenge04", "Create an A record for an FQDN and IP address"),
+    ("challenge05", "challenge05", "Create a Cloud Database instance, database and user"),
+    ("challenge06", "challenge06", "Create a CDN-enabled container"),
+    ("challenge07", "challenge07", "Create two servers behind a new load balancer"),
+    ("challenge08", "challenge08", "Serve a static page from Cloud Files with a CNAME to its CDN URL"),
+    ("challenge09", "challenge09", "Create a server and an A record named after an FQDN"),
+    ("challenge10", "challenge10", "Build a load balanced pair of servers with DNS, error page and backup"),
+    ("dns-batch", "dns_batch", "Create DNS records in bulk from a JSONL or CSV manifest"),
+    ("lb-nodes", "lb_nodes", "Add and remove load balancer nodes to match a list of address:port entries"),
+    ("hostnames", "hostnames", "Split a stream of hostnames into subdomains, domain and public suffix"),
+    ("suffix-index", "public_suffix", "Compile tlds.txt into the memory mapped suffix index"),
+]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Rackspace API challenge scripts and tools.")
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>")
+    for name, module, help_text in COMMANDS:
+        subparsers.add_parser(name, help=help_text)
+    return parser
+
+
+def run(module_name, arguments, prog=None):
+    """
+    Imports a command's module and runs its main() as though it had been started directly.
+    :param module_name: The module implementing the command
+    :param arguments: The command line arguments for the module
+    :param prog: The program name reported in the module's usage messages
+    """
+    module = __import__(module_name)
+    sys.argv = [prog or module_name + ".py"] + list(arguments)
+    return module.main()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    modules = dict((name, module) for name, module, help_text in COMMANDS)
+    #The command's arguments are passed through untouched, so -h and --help reach the command's own parser.
+    if argv and argv[0] in modules:
+        return run(modules[argv[0]], argv[1:], "cli.py " + argv[0])
+    build_parser().parse_args(argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Service clients built on first use. pyrax is imported and the account authenticated only when a script first asks for
+a client, so code paths that never touch the API never pay for either.
+
+The clients come from a backend, pyrax by default. Setting API_CHALLENGE_BACKEND=sim runs the scripts against the
+in-process simulated cloud in simcloud.py instead, configured from the JSON file named by API_CHALLENGE_SIM_CONFIG.
+A backend is any object with the five client attributes plus exc, server_exc and a swift_connection factory, and
+set_backend installs one directly. A backend whose clock runs faster than the wall clock, like the simulated cloud, says so with a time_scale
+attribute and the waiters shorten their polling intervals to match.
+"""
+import os
+import threading
+import common
+
+__author__ = 'Bruce Stringer'
+
+CREDENTIAL_LOCATION = "~/.rackspace_cloud_credentials"
+BACKEND_VARIABLE = "API_CHALLENGE_BACKEND"
+SIM_CONFIG_VARIABLE = "API_CHALLENGE_SIM_CONFIG"
+
+_lock = threading.Lock()
+#Held while a client is built, which may mean logging in. Separate from _lock so reading the backend, Ex. for
+#time_scale on every poll, never waits on a login.
+_client_lock = threading.Lock()
+_backend = []
+
+
+class PyraxBackend(object):
+    """
+    The real clients, from pyrax once the account is authenticated.
+    """
+    time_scale = 1.0
+
+    def __init__(self, credential_location=CREDENTIAL_LOCATION):
+        self.credential_location = credential_location
+        self.authenticated = False
+
+    def client(self, name):
+        if not self.authenticated:
+            common.auth(self.credential_location)
+            self.authenticated = True
+        import pyrax
+        return getattr(pyrax, name)
+
+    @property
+    def exc(self):
+        import pyrax
+        return pyrax.exc
+
+    @property
+    def server_exc(self):
+        from novaclient import exceptions
+        return exceptions
+
+    def swift_connection(self, url, token):
+        from swiftclient import client as swift_client
+        return swift_client.Connection(preauthurl=url, preauthtoken=token)
+
+
+def _default_backend():
+    if os.environ.get(BACKEND_VARIABLE, "pyrax") == "sim":
+        import simcloud
+        return simcloud.SimCloud.from_file(os.environ.get(SIM_CONFIG_VARIABLE))
+    return PyraxBackend()
+
+
+def backend():
+    """
+    :return: The backend the clients come from, created on first use
+    """
+    with _lock:
+        if not _backend:
+            _backend.append(_default_backend())
+        return _backend[0]
+
+
+def set_backend(new_backend):
+    """
+    Replaces the backend, Ex. with a simcloud.SimCloud. None goes back to the default on next use.
+    """
+    with _lock:
+        del _backend[:]
+        if new_backend is not None:
+            _backend.append(new_backend)
+
+
+def _client(name):
+    selected = backend()
+    #Authenticating is serialised so concurrent first calls log in once.
+    with _client_lock:
+        return selected.client(name)
+
+
+def cloudservers():
+    return _client("cloudservers")
+
+
+def cloudfiles():
+    return _client("cloudfiles")
+
+
+def cloud_dns():
+    return _client("cloud_dns")
+
+
+def cloud_loadbalancers():
+    return _client("cloud_loadbalancers")
+
+
+def cloud_databases():
+    return _client("cloud_databases")
+
+
+def exc():
+    """
+    :return: The pyrax.exc module, or the backend's equivalent, for except clauses in code that otherwise avoids
+    importing pyrax
+    """
+    return backend().exc
+
+
+def server_exc():
+    """
+    :return: The novaclient exceptions module, or the backend's equivalent, for errors raised by the cloudservers client
+    """
+    return backend().server_exc
+
+
+def swift_connection(url, token):
+    """
+    :param url: The storage url of the cloudfiles client's connection
+    :param token: The auth token of the cloudfiles client's connection
+    :return: A new swiftclient Connection from the backend, or the backend's equivalent
+    """
+    return backend().swift_connection(url, token)
+
+
+def time_scale():
+    """
+    :return: The backend's seconds per real second, less than 1 for a simulated cloud running faster than real time
+    """
+    return getattr(backend(), "time_scale", 1.0)
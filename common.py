@@ -0,0 +1,112 @@
+"""
+Helpers shared by the challenge scripts. Nothing here imports pyrax until it is called, so importing this module stays
+cheap for the CLI.
+"""
+import os
+import dns_batch
+import workers
+
+__author__ = 'Bruce Stringer'
+
+
+def auth(credential_location="~/.rackspace_cloud_credentials"):
+    """
+    Loads the pyrax credentials from ~/.rackspace_cloud_credentials
+    :param credential_location: The location containing the credential ini
+    """
+    import token_cache
+    credentials = os.path.expanduser(credential_location)
+    token_cache.authenticate(credentials)
+
+
+def get_int_input(message="Enter an integer: "):
+    """
+    Gets a valid int input from the user. If a valid integer is not entered, get_int_input calls itself again.
+    :param message: The message to be displayed to the user when gathering input.
+    :return: A valid integer
+    """
+    try:
+        choice_str = input(message)
+        choice = int(choice_str)
+        return choice
+    except (ValueError, SyntaxError, NameError):
+        print "Invalid Input"
+        return get_int_input(message)
+
+
+def get_str_input(message="Enter a string: "):
+    """
+    Gets a non empty str input from the user. If nothing is entered, get_str_input calls itself again.
+    :param message: The message to be displayed to the user when gathering input.
+    :return: A non empty string
+    """
+    try:
+        input_str = raw_input(message)
+        if input_str == "":
+            return get_str_input(message)
+        return input_str
+    except (ValueError, SyntaxError, NameError):
+        print "Invalid Input"
+        return get_str_input(message)
+
+
+def add_record(domain, fqdn, record_type, data, priority="", ttl=300, record_cache=None):
+    """
+    Validates and creates a single DNS record.
+    :param domain: The pyrax domain object to add the record to
+    :param record_cache: An optional dns_cache.RecordCache the new record is written through to
+    :return: The list of created records. :raise: ValueError for an invalid record, or the pyrax exception from the API
+    """
+    record = dns_batch.build_record(fqdn, record_type, data, priority, ttl)
+    generated_record = domain.add_records(record)
+
+    #Keeping the cached index in step saves relisting the zone on the next existence check.
+    if record_cache is not None:
+        record_cache.record_added(domain, generated_record)
+
+    return generated_record
+
+
+def create_servers(cloud_account, image_uuid="c195ef3b-9195-4474-b6f7-16e5bd86acd0", flavor_id="2", num_servers=0,
+                   server_base_name="server", files=None, numbered=True, max_workers=workers.DEFAULT_MAX_WORKERS):
+    """
+    Creates a list of servers based on the given parameters.
+    The create calls are issued concurrently from a bounded pool, a failed create does not stop the others.
+    :param cloud_account: A pyrax client object with authentication configured.
+    :param image_uuid: The uuid of the image to be provisioned from. Default Centos 6.3
+    :param flavor_id: The resource flavor of the server to be provisioned. Default 512
+    :param num_servers: The number of servers to provisions. Default 0
+    :param server_base_name: The base name of all servers to be provisioned. Default  server
+    :param files: An optional dict of file path to contents injected into every server
+    :param numbered: Append the server's number to the base name. False gives every server the base name
+    :param max_workers: The most create calls in flight at once. 1 creates the servers serially.
+    :return: a list of server objects created in name order, a dictionry of their admin passwords keyed by the server
+    uuid and a list of (server name, exception) for servers that failed to create.
+    """
+    servers = []
+    passwords = {}
+    failures = []
+
+    if numbered:
+        server_names = [server_base_name + str(count) for count in range(0, num_servers)]
+    else:
+        server_names = [server_base_name] * num_servers
+    for server_name in server_names:
+        print "Creating server " + server_name
+
+    def create(server_name):
+        if files is None:
+            return cloud_account.servers.create(server_name, image_uuid, flavor_id)
+        return cloud_account.servers.create(server_name, image_uuid, flavor_id, files=files)
+
+    for server_name, (server, error) in zip(server_names, workers.bounded_map(create, server_names, max_workers)):
+        if error is not None:
+            failures.append((server_name, error))
+            continue
+
+        #Adding the server object to the list of servers created
+        servers.append(server)
+
+        #Registering passwords in password dict. Storing the password with the UUID as the key.
+        passwords[server.id] = server.adminPass
+    return servers, passwords, failures
@@ -0,0 +1,96 @@
+"""
+Paginated, searchable container picker for Cloud Files.
+
+Containers are listed one page at a time with marker/limit requests, so the first page shows up immediately no
+matter how many containers the account holds. Pages are cached on disk for a short time so repeated runs start
+instantly.
+"""
+import os
+import cache
+import uploads
+
+__author__ = 'Bruce Stringer'
+
+PAGE_SIZE = 50
+CACHE_TTL = 60
+
+
+def _account_dir(client):
+    return cache.cache_path("containers", cache.cache_key(client.connection.url), "")
+
+
+def list_page(client, marker="", prefix="", limit=PAGE_SIZE, cache_ttl=CACHE_TTL):
+    """
+    Lists one page of containers, serving it from the listing cache when fresh.
+    :param client: A pyrax cloudfiles client object with its auth already initialized.
+    :param marker: List containers whose names sort after this one
+    :param prefix: Only list containers whose names start with this
+    :param limit: The most containers returned
+    :param cache_ttl: Seconds a cached page stays fresh. 0 bypasses the cache
+    :return: A list of dicts with the name, count and bytes of each container
+    """
+    path = os.path.join(_account_dir(client), cache.cache_key(marker, prefix, limit) + ".json")
+    if cache_ttl:
+        page = cache.load_json(path, max_age=cache_ttl)
+        if page is not None:
+            return page
+
+    headers, page = uploads.swift_connection(client).get_account(marker=marker, prefix=prefix, limit=limit)
+    page = [{'name': item['name'], 'count': item['count'], 'bytes': item['bytes']} for item in page]
+    if cache_ttl:
+        cache.store_json(path, page)
+    return page
+
+
+def invalidate(client):
+    """
+    Drops every cached listing page for the client's account. Call after creating or deleting a container.
+    """
+    directory = _account_dir(client)
+    for name in os.listdir(directory):
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def browse(client, message="Please select a container by number: ", page_size=PAGE_SIZE, cache_ttl=CACHE_TTL):
+    """
+    Lets the user page through and search the account's containers.
+    :param client: A pyrax cloudfiles client object with its auth already initialized.
+    :param message: The prompt displayed under each page
+    :param page_size: The number of containers shown per page
+    :param cache_ttl: Seconds a cached page stays fresh
+    :return: The name of the selected container, or None if the user chose to create a new one
+    """
+    prefix = ""
+    #Markers of the pages before the current one, so p can step back without refetching everything.
+    markers = [""]
+    while True:
+        page = list_page(client, markers[-1], prefix, page_size, cache_ttl)
+        for num, container in enumerate(page):
+            print num, ") Container name:", container['name'], "  -- Object Count: ", container['count']
+        if not page:
+            print "No containers found" + (" starting with '%s'" % prefix if prefix else "")
+
+        print "c ) Create new container"
+        if len(page) == page_size:
+            print "n ) Next page"
+        if len(markers) > 1:
+            print "p ) Previous page"
+        print "/<prefix> ) Search by name prefix, / alone clears the search"
+
+        choice = raw_input(message).strip()
+        if choice == "c":
+            return None
+        elif choice == "n" and len(page) == page_size:
+            markers.append(page[-1]['name'])
+        elif choice == "p" and len(markers) > 1:
+            markers.pop()
+        elif choice.startswith("/"):
+            prefix = choice[1:]
+            markers = [""]
+        elif choice.isdigit() and int(choice) < len(page):
+            return page[int(choice)]['name']
+        else:
+            print "Invalid Choice: ", choice
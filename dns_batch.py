@@ -0,0 +1,294 @@
+"""
+Batch creation of Cloud DNS records from a JSONL or CSV manifest.
+
+Usage: python dns_batch.py records.jsonl [--dry-run] [--skip-invalid] [-o results.jsonl]
+
+Each manifest row has a name, type and data, plus an optional ttl and priority. Every row is validated up front with
+the same checks add_record makes, the rows are grouped by the longest matching domain on the account and each domain's
+records are submitted in add_records calls of up to MAX_RECORDS_PER_REQUEST. Domains are processed in parallel and a
+result is written for every row. Each domain is listed once before anything is sent, so rows that already exist are
+reported rather than added again. After a request that may have gone through in part, Ex. a timeout, the domain is
+relisted before the rest is resent, so no record is added twice.
+"""
+from __future__ import with_statement
+import argparse
+import csv
+import json
+import sys
+import time
+import dns_cache
+import workers
+
+__author__ = 'Bruce Stringer'
+
+MAX_RECORDS_PER_REQUEST = 100
+#Times a chunk is resent after a rate limit, timeout, server error or dropped connection, and the first backoff in
+#seconds.
+TRANSIENT_RETRIES = 5
+RETRY_DELAY = 2
+RECORD_TYPES = ["A", "CNAME", "MX", "NS", "SRV", "TXT"]
+
+
+def build_record(fqdn, record_type, data, priority="", ttl=300):
+    """
+    Validates a record and builds the dict sent to add_records.
+    :return: The record dict. :raise: ValueError if the type, TTL or priority is invalid
+    """
+    record_type = str(record_type).upper()
+    if record_type not in RECORD_TYPES:
+        raise ValueError("Not a valid record type.")
+    elif ttl < 300 or ttl > 86400:
+        raise ValueError("Invalid TTYL. Should be between 300 and 86400")
+
+    record = {
+        'type': record_type,
+        'name': fqdn,
+        'data': data,
+        'ttl': ttl,
+    }
+
+    if record_type == "MX":
+        if priority < 0 or priority > 65535:
+            raise ValueError("Invalid priority. Should be between 0 and 65535")
+        record['priority'] = priority
+
+    return record
+
+
+def read_manifest(path, manifest_format=None):
+    """
+    Reads manifest rows from a JSONL or CSV file. The format defaults to the file extension.
+    :return: A list of row dicts
+    """
+    manifest_format = manifest_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path) as manifest:
+        if manifest_format == "csv":
+            return [row for row in csv.DictReader(manifest)]
+        return [json.loads(line) for line in manifest if line.strip()]
+
+
+def validate_rows(rows):
+    """
+    Runs the add_record checks against every row.
+    :return: A list of (row number, record dict) for valid rows and a list of (row number, error) for invalid ones
+    """
+    valid = []
+    invalid = []
+    for number, row in enumerate(rows, 1):
+        try:
+            #Only a missing TTL gets the default, an explicit 0 is checked and refused like any other.
+            ttl = row.get('ttl')
+            ttl = int(ttl) if ttl not in (None, "") else 300
+            priority = row.get('priority')
+            priority = int(priority) if priority not in (None, "") else ""
+            valid.append((number, build_record(row['name'], row['type'], row['data'], priority, ttl)))
+        except KeyError as e:
+            invalid.append((number, "Missing field %s" % e))
+        except ValueError as e:
+            invalid.append((number, str(e)))
+    return valid, invalid
+
+
+def group_by_domain(records, resolver):
+    """
+    :param resolver: A dns_cache.DomainResolver for the account
+    :return: A dict of domain name to (domain, list of (row number, record)) and a list of (row number, error) for
+    records with no matching domain
+    """
+    groups = {}
+    unmatched = []
+    for number, record in records:
+        domain = resolver.resolve(record['name'])
+        if domain is None:
+            unmatched.append((number, "No domain on the account matches %s" % record['name']))
+        else:
+            groups.setdefault(domain.name.lower(), (domain, []))[1].append((number, record))
+    return groups, unmatched
+
+
+def _failure(error):
+    """
+    :return: "limited" for a rate limit, which refuses the request before it is processed, "refused" for any other 4xx,
+    which rejects the whole request and adds none of its records, else "unknown", Ex. a timeout, server error or
+    dropped connection, after which some of the records may have been added
+    """
+    import clients
+    exc = clients.exc()
+    code = getattr(error, "code", None)
+    if isinstance(error, getattr(exc, "OverLimit", ())) or code == 413:
+        return "limited"
+    if isinstance(error, getattr(exc, "DNSCallTimedOut", ())):
+        return "unknown"
+    if isinstance(code, int) and 400 <= code < 500:
+        return "refused"
+    return "unknown"
+
+
+def _matching(index, record, ignore_ids=()):
+    for found in index.find(record['name'], record['type']):
+        if str(getattr(found, 'data', "")) == str(record['data']) and getattr(found, 'id', None) not in ignore_ids:
+            return found
+    return None
+
+
+def _list_records(domain):
+    index = dns_cache.RecordIndex(domain)
+    index.load()
+    return index
+
+
+def _submit_chunk(domain, chunk, record_cache=None, existing_ids=frozenset(), retries=TRANSIENT_RETRIES):
+    """
+    Adds a chunk of records in one request.
+    A refused request adds none of its records, so the chunk is split in half at once and each half sent on its own
+    to pin down the bad records. After a rate limit the chunk is resent after a backoff. After a timeout, server error
+    or dropped connection the request may have gone through in part, so the domain is relisted before the rest is
+    resent, and records found that are not among existing_ids are counted as created.
+    :param existing_ids: The ids of the domain's records from before the run
+    :return: A list of (row number, succeeded, record id or error)
+    """
+    import clients
+    results = []
+    attempts = 0
+    delay = RETRY_DELAY
+    while chunk:
+        try:
+            created = domain.add_records([record for number, record in chunk])
+        except Exception as e:
+            error = e
+        else:
+            if record_cache is not None:
+                record_cache.record_added(domain, created)
+            return results + [(number, True, getattr(item, 'id', None))
+                              for (number, record), item in zip(chunk, created)]
+
+        failure = _failure(error)
+        if failure == "refused":
+            if len(chunk) == 1:
+                return results + [(chunk[0][0], False, str(error))]
+            middle = len(chunk) // 2
+            return (results + _submit_chunk(domain, chunk[:middle], record_cache, existing_ids, retries) +
+                    _submit_chunk(domain, chunk[middle:], record_cache, existing_ids, retries))
+
+        if attempts == retries:
+            return results + [(number, False, str(error)) for number, record in chunk]
+        attempts += 1
+        time.sleep(delay * clients.time_scale())
+        delay *= 2
+        if failure == "limited":
+            continue
+
+        try:
+            index = _list_records(domain)
+        except Exception as e:
+            #Resending without knowing what the failed request added could duplicate records.
+            return results + [(number, False, "%s, and relisting the domain failed: %s" % (error, e))
+                              for number, record in chunk]
+        remaining = []
+        for number, record in chunk:
+            found = _matching(index, record, existing_ids)
+            if found is None:
+                remaining.append((number, record))
+            else:
+                results.append((number, True, getattr(found, 'id', None)))
+        if len(remaining) < len(chunk) and record_cache is not None:
+            #The cached index missed these records, so it is dropped and relisted on next use.
+            record_cache.record_removed(domain)
+        chunk = remaining
+    return results
+
+
+def submit_domain(domain, records, chunk_size=MAX_RECORDS_PER_REQUEST, record_cache=None):
+    """
+    Adds a domain's records in chunks of at most chunk_size. The domain is listed once first. Rows matching a record
+    it already has are not sent and are reported as failed with the existing record's id.
+    :return: A list of (row number, succeeded, record id or error)
+    """
+    before = _list_records(domain)
+    existing_ids = frozenset(getattr(found, 'id', None) for found_records in before.records.itervalues()
+                             for found in found_records)
+    results = []
+    pending = []
+    for number, record in records:
+        found = _matching(before, record)
+        if found is None:
+            pending.append((number, record))
+        else:
+            results.append((number, False, "Record already exists with id %s" % getattr(found, 'id', None)))
+    for start in range(0, len(pending), chunk_size):
+        results.extend(_submit_chunk(domain, pending[start:start + chunk_size], record_cache, existing_ids))
+    return results
+
+
+def add_records_batch(dns_client, records, chunk_size=MAX_RECORDS_PER_REQUEST, max_workers=8, record_cache=None,
+                      resolver=None):
+    """
+    Creates validated records across every matching domain, with one worker per domain.
+    :param dns_client: A pyrax cloud dns client object with its auth already initialized.
+    :param records: A list of (row number, record dict) as returned by validate_rows
+    :param chunk_size: The most records sent in one add_records call
+    :param max_workers: The most domains processed at once
+    :param record_cache: An optional dns_cache.RecordCache created records are written through to
+    :param resolver: The dns_cache.DomainResolver used to match records to domains. One is created if not given
+    :return: A list of (row number, succeeded, record id or error) sorted by row number
+    """
+    resolver = resolver or dns_cache.DomainResolver(dns_client)
+    groups, unmatched = group_by_domain(records, resolver)
+    results = [(number, False, error) for number, error in unmatched]
+
+    def submit(name):
+        domain, domain_records = groups[name]
+        return submit_domain(domain, domain_records, chunk_size, record_cache)
+
+    names = sorted(groups)
+    for name, (domain_results, error) in zip(names, workers.bounded_map(submit, names, max_workers)):
+        if error is not None:
+            domain_results = [(number, False, str(error)) for number, record in groups[name][1]]
+        results.extend(domain_results)
+    return sorted(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create Cloud DNS records in bulk from a manifest.")
+    parser.add_argument("manifest", help="JSONL or CSV file of records with name, type, data, ttl and priority")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Manifest format. Default from the extension")
+    parser.add_argument("--dry-run", action="store_true", help="Only validate the manifest")
+    parser.add_argument("--skip-invalid", action="store_true", help="Create the valid records even if some are not")
+    parser.add_argument("-o", "--output", default="-", help="File to write per record results to. Default stdout")
+    parser.add_argument("--workers", type=int, default=8, help="Domains processed in parallel")
+    args = parser.parse_args()
+
+    rows = read_manifest(args.manifest, args.format)
+    records, invalid = validate_rows(rows)
+    for number, error in invalid:
+        print >> sys.stderr, "Row %d invalid: %s" % (number, error)
+    print >> sys.stderr, "%d valid and %d invalid records" % (len(records), len(invalid))
+    if args.dry_run:
+        sys.exit(1 if invalid else 0)
+    if invalid and not args.skip_invalid:
+        print >> sys.stderr, "Not creating any records. Fix the manifest or pass --skip-invalid"
+        sys.exit(1)
+
+    #Imported here so validation and --dry-run never load pyrax.
+    import clients
+    results = add_records_batch(clients.cloud_dns(), records, max_workers=args.workers)
+    results.extend((number, False, error) for number, error in invalid)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for number, succeeded, detail in sorted(results):
+            row = rows[number - 1]
+            result = {'row': number, 'name': row.get('name'), 'type': row.get('type'), 'created': succeeded}
+            result['id' if succeeded else 'error'] = detail
+            output.write(json.dumps(result) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    failed = len([1 for number, succeeded, detail in results if not succeeded])
+    print >> sys.stderr, "%d records created, %d failed" % (len(results) - failed, failed)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
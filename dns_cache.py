@@ -0,0 +1,214 @@
+"""
+Indexes of Cloud DNS data so repeated lookups do not re-list whole zones.
+
+DomainResolver maps names to the account's domains. The domain list is loaded once, kept on disk between runs,
+refreshed once it is older than its TTL, and names are resolved locally to the longest matching domain, so a
+delegated subzone wins over its parent.
+
+RecordCache keeps one RecordIndex per domain, keyed by (lowercased name, record type). An index is filled with a
+paginated listing the first time the domain is used, refreshed once it is older than the TTL and updated in place
+whenever a record is added through it.
+"""
+import os
+import threading
+import time
+import cache
+
+__author__ = 'Bruce Stringer'
+
+PAGE_SIZE = 100
+RECORD_TTL = 300
+DOMAIN_TTL = 600
+
+
+def _page(list_call, page_size):
+    #Cloud DNS caps pages at 100 items, a short page marks the end of the listing.
+    offset = 0
+    while True:
+        page = list_call(limit=page_size, offset=offset)
+        for item in page:
+            yield item
+        if len(page) < page_size:
+            break
+        offset += page_size
+
+
+class DomainResolver(object):
+    """
+    The account's domains keyed by lowercased name, refreshed once they are older than ttl seconds.
+    The names and ids from the last listing are kept on disk for ttl seconds, so a short-lived script resolves a name
+    without listing every domain again. A domain known only from disk is fetched by id the first time it is used.
+    """
+
+    def __init__(self, dns_client, ttl=DOMAIN_TTL, page_size=PAGE_SIZE):
+        self.dns_client = dns_client
+        self.ttl = ttl
+        self.page_size = page_size
+        self.ids = {}
+        self.domains = {}
+        self.loaded_at = None
+        self.lock = threading.RLock()
+        account = cache.cache_key(getattr(dns_client, "management_url", ""))
+        self.path = cache.cache_path("dns", account, "domains.json")
+
+    def load(self):
+        """
+        Replaces the map with a fresh paginated listing of the account's domains and writes it through to disk.
+        """
+        domains = {}
+        for domain in _page(self.dns_client.list, self.page_size):
+            domains[domain.name.lower()] = domain
+        self.domains = domains
+        self.ids = dict((name, domain.id) for name, domain in domains.iteritems())
+        self.loaded_at = time.time()
+        cache.store_json(self.path, self.ids)
+
+    def invalidate(self):
+        """
+        Forces a reload on the next lookup. Call after creating or deleting a domain.
+        """
+        with self.lock:
+            self.loaded_at = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def _current(self):
+        #Called with the lock held.
+        if self.loaded_at is None or time.time() - self.loaded_at > self.ttl:
+            ids = cache.load_json(self.path, max_age=self.ttl)
+            try:
+                loaded_at = os.path.getmtime(self.path)
+            except OSError:
+                ids = None
+            if ids is None:
+                self.load()
+            else:
+                self.ids, self.domains, self.loaded_at = ids, {}, loaded_at
+        return self.ids
+
+    def _domain(self, name):
+        #Called with the lock held.
+        domain = self.domains.get(name)
+        if domain is None and name in self.ids:
+            try:
+                domain = self.domains[name] = self.dns_client.get(self.ids[name])
+            except Exception:
+                #The id on disk no longer works, Ex. the domain was deleted, so the listing is redone.
+                self.load()
+                domain = self.domains.get(name)
+        return domain
+
+    def find(self, name):
+        """
+        :return: The domain named exactly name, or None
+        """
+        name = name.lower().rstrip(".")
+        with self.lock:
+            return self._domain(name) if name in self._current() else None
+
+    def resolve(self, name):
+        """
+        Finds the zone a name belongs to by trying each of its suffixes, longest first.
+        :param name: A fully qualified name such as www.dev.example.com
+        :return: The domain with the longest name that is a suffix of name, or None
+        """
+        labels = name.lower().rstrip(".").split(".")
+        with self.lock:
+            for i in range(len(labels)):
+                candidate = ".".join(labels[i:])
+                #A zone gone since the list was cached drops out on the relisting, and its parent is tried next.
+                if candidate in self._current():
+                    domain = self._domain(candidate)
+                    if domain is not None:
+                        return domain
+        return None
+
+
+class RecordIndex(object):
+    """
+    The records of a single domain keyed by (lowercased name, type).
+    """
+
+    def __init__(self, domain, page_size=PAGE_SIZE):
+        self.domain = domain
+        self.page_size = page_size
+        self.records = {}
+        self.loaded_at = None
+
+    def load(self):
+        """
+        Replaces the index with a fresh paginated listing of the domain's records.
+        """
+        records = {}
+        for record in _page(self.domain.list_records, self.page_size):
+            records.setdefault((record.name.lower(), record.type), []).append(record)
+        self.records = records
+        self.loaded_at = time.time()
+
+    def add(self, records):
+        """
+        Adds newly created records to the index.
+        """
+        for record in records:
+            self.records.setdefault((record.name.lower(), record.type), []).append(record)
+
+    def find(self, name, record_type):
+        """
+        :return: The list of records with the given name and type
+        """
+        return self.records.get((name.lower(), str(record_type).upper()), [])
+
+    def exists(self, name, record_types=("A", "CNAME")):
+        """
+        :return: True if a record with the given name exists with any of the given types
+        """
+        name = name.lower()
+        return any((name, record_type) in self.records for record_type in record_types)
+
+
+class RecordCache(object):
+    """
+    RecordIndexes for any number of domains, each refreshed once it is older than ttl seconds.
+    """
+
+    def __init__(self, ttl=RECORD_TTL, page_size=PAGE_SIZE):
+        self.ttl = ttl
+        self.page_size = page_size
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def index(self, domain):
+        """
+        :return: A RecordIndex for the domain no older than the cache TTL
+        """
+        with self.lock:
+            index = self.indexes.get(domain.id)
+            if index is None:
+                index = self.indexes[domain.id] = RecordIndex(domain, self.page_size)
+            if index.loaded_at is None or time.time() - index.loaded_at > self.ttl:
+                index.load()
+            return index
+
+    def exists(self, domain, name, record_types=("A", "CNAME")):
+        """
+        :return: True if the domain has a record with the given name and any of the given types
+        """
+        return self.index(domain).exists(name, record_types)
+
+    def record_added(self, domain, records):
+        """
+        Writes newly created records through to the domain's index, if it has one.
+        """
+        with self.lock:
+            index = self.indexes.get(domain.id)
+            if index is not None:
+                index.add(records)
+
+    def record_removed(self, domain):
+        """
+        Forgets the domain's index after records are deleted, so the next check relists the zone.
+        """
+        with self.lock:
+            self.indexes.pop(domain.id, None)
@@ -0,0 +1,199 @@
+"""
+Provisioning for fleets of hundreds or thousands of servers.
+
+Account limits are read once up front and the fleet is planned into batches that fit the instance and RAM quotas and
+the server create rate limit. Creates run batch by batch on a bounded pool. Every created server is handed straight to
+the shared ResourceWaiter, so servers are reported ready one at a time as their networks come up while later batches
+are still being created.
+"""
+from __future__ import with_statement
+import Queue
+import threading
+import time
+import clients
+import waiters
+import workers
+
+__author__ = 'Bruce Stringer'
+
+DEFAULT_BATCH_SIZE = 50
+RATE_UNITS = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400}
+
+
+def account_limits(cs):
+    """
+    Reads the account's absolute limits and the server create rate limit with one API call.
+    :param cs: A pyrax cloudserver client object with its auth already initialized.
+    :return: A dict of absolute limit name to value, plus createRate as (creates, seconds) or None
+    """
+    limits = cs.limits.get()
+    result = dict((limit.name, limit.value) for limit in limits.absolute)
+    result['createRate'] = None
+    for rate in limits.rate:
+        if rate.verb == "POST" and "servers" in rate.uri and rate.unit in RATE_UNITS:
+            candidate = (rate.value, RATE_UNITS[rate.unit])
+            #Keep the tightest limit, measured in creates per second.
+            if result['createRate'] is None or (float(candidate[0]) / candidate[1] <
+                                                float(result['createRate'][0]) / result['createRate'][1]):
+                result['createRate'] = candidate
+    return result
+
+
+def fleet_capacity(limits, flavor_ram):
+    """
+    :param limits: The dict returned by account_limits
+    :param flavor_ram: The RAM of the flavor being built, in MB
+    :return: How many more servers of the flavor the account's quotas allow, or None if they are unlimited
+    """
+    capacity = None
+    if limits.get('maxTotalInstances', -1) >= 0:
+        capacity = limits['maxTotalInstances'] - limits.get('totalInstancesUsed', 0)
+    if limits.get('maxTotalRAMSize', -1) >= 0 and flavor_ram:
+        by_ram = (limits['maxTotalRAMSize'] - limits.get('totalRAMUsed', 0)) // flavor_ram
+        capacity = by_ram if capacity is None else min(capacity, by_ram)
+    return None if capacity is None else max(capacity, 0)
+
+
+def plan_batches(count, limits, flavor_ram, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Splits a fleet into create batches that fit the account's quotas and create rate.
+    :param count: The number of servers wanted
+    :param limits: The dict returned by account_limits
+    :param flavor_ram: The RAM of the flavor being built, in MB
+    :param batch_size: The most servers created in one batch
+    :return: A list of batch sizes and the seconds to leave between batch starts.
+    :raise: ValueError if the quotas do not leave room for count servers
+    """
+    capacity = fleet_capacity(limits, flavor_ram)
+    if capacity is not None and count > capacity:
+        raise ValueError("The account's limits leave room for %d more servers of %d MB, %d were requested"
+                         % (capacity, flavor_ram, count))
+
+    interval = 0
+    rate = limits.get('createRate')
+    if rate is not None:
+        creates, seconds = rate
+        batch_size = min(batch_size, creates)
+        interval = float(seconds) * batch_size / creates
+
+    batch_size = max(batch_size, 1)
+    batches = [batch_size] * (count // batch_size)
+    if count % batch_size:
+        batches.append(count % batch_size)
+    return batches, interval
+
+
+def server_names(template, count, start=0):
+    """
+    :param template: A str.format template for the names. Ex. "web{index:03d}" gives web000, web001, ...
+    :return: The list of names for count servers numbered from start
+    """
+    return [template.format(index=index) for index in range(start, start + count)]
+
+
+class Fleet(object):
+    """
+    Builds a fleet batch by batch and yields events as servers are created, become ready or fail.
+
+    Iterating yields (event, name, server, error) tuples where event is "created", "create_failed", "ready" or
+    "build_failed". Counts of each are kept in counts for progress displays.
+    """
+
+    def __init__(self, cs, names, image_uuid, flavor_id, batches, interval=0, max_workers=workers.DEFAULT_MAX_WORKERS,
+                 ready=waiters.has_networks, timeout=None, files=None, flavor_overrides=None):
+        """
+        :param cs: A pyrax cloudserver client object with its auth already initialized.
+        :param names: The names of the servers to build
+        :param image_uuid: The uuid of the image to be provisioned from
+        :param flavor_id: The resource flavor of the servers
+        :param batches: The batch sizes from plan_batches
+        :param interval: Seconds between batch starts from plan_batches
+        :param max_workers: The most create calls in flight at once
+        :param ready: A callable taking a refreshed server and returning True once it is ready. Default has_networks
+        :param timeout: Seconds to wait for each server to become ready. Default no timeout
+        :param files: An optional dict of file path to contents injected into every server
+        :param flavor_overrides: An optional dict of server name to the flavor used for that server instead of flavor_id
+        """
+        self.cs = cs
+        self.names = list(names)
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("Server names must be unique")
+        self.image_uuid = image_uuid
+        self.flavor_id = flavor_id
+        self.batches = batches
+        self.interval = interval
+        self.max_workers = max_workers
+        self.ready = ready
+        self.timeout = timeout
+        self.files = files
+        self.flavor_overrides = flavor_overrides or {}
+        self.events = Queue.Queue()
+        self.counts = {'created': 0, 'create_failed': 0, 'ready': 0, 'build_failed': 0}
+        self.passwords = {}
+        #Names whose final event has been sent or is left to the waiter's callback.
+        self.settled = set()
+
+    def _create(self, name):
+        flavor_id = self.flavor_overrides.get(name, self.flavor_id)
+        if self.files is None:
+            return self.cs.servers.create(name, self.image_uuid, flavor_id)
+        return self.cs.servers.create(name, self.image_uuid, flavor_id, files=self.files)
+
+    def _watched(self, name):
+        def done(handle):
+            if handle.succeeded:
+                self.events.put(("ready", name, handle.resource, None))
+            else:
+                self.events.put(("build_failed", name, handle.resource, None))
+        return done
+
+    def _create_batches(self):
+        try:
+            self._run_batches()
+        except Exception as e:
+            #Every name without a final event on its way is failed so iteration still ends.
+            for name in self.names:
+                if name not in self.settled:
+                    self.events.put(("create_failed", name, None, e))
+
+    def _run_batches(self):
+        position = 0
+        for batch in self.batches:
+            started = time.time()
+            names = self.names[position:position + batch]
+            position += batch
+            for name, server, error in workers.bounded_imap(self._create, names, self.max_workers):
+                if error is not None:
+                    self.events.put(("create_failed", name, None, error))
+                    self.settled.add(name)
+                    continue
+                try:
+                    self.passwords[server.id] = server.adminPass
+                    self.events.put(("created", name, server, None))
+                    waiters.default_waiter().wait_for(server, self.cs.servers.list, ready=self.ready,
+                                                      timeout=self.timeout, callback=self._watched(name))
+                except Exception as e:
+                    #The server exists but will never be watched, so it ends here rather than never ending.
+                    self.events.put(("build_failed", name, server, e))
+                self.settled.add(name)
+            if position < len(self.names):
+                #The interval is in API time, which the simulated cloud runs faster than the wall clock.
+                time.sleep(max(0, self.interval * clients.time_scale() - (time.time() - started)))
+
+    def __iter__(self):
+        creator = threading.Thread(target=self._create_batches, name="FleetCreator")
+        creator.daemon = True
+        creator.start()
+
+        #Every server ends with exactly one of create_failed, ready or build_failed.
+        remaining = len(self.names)
+        while remaining:
+            #Waiting in slices keeps the main thread responsive to KeyboardInterrupt.
+            try:
+                event = self.events.get(True, 1)
+            except Queue.Empty:
+                continue
+            self.counts[event[0]] += 1
+            if event[0] != "created":
+                remaining -= 1
+            yield event
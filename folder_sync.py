@@ -0,0 +1,130 @@
+"""
+Incremental folder to container sync.
+
+A local manifest records the size, mtime and MD5 of every file from the last sync along with the ETag the container
+reported for it. A sync stats the tree, rehashes only files whose size or mtime changed, compares the result with a
+single paginated listing of the container and uploads only new or changed files.
+"""
+from __future__ import with_statement
+import hashlib
+import os
+import cache
+import uploads
+import workers
+
+__author__ = 'Bruce Stringer'
+
+
+def manifest_path(container_name, folder):
+    return cache.cache_path("sync", cache.cache_key(container_name, os.path.abspath(folder)) + ".json")
+
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(uploads.CHUNK_SIZE), ""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_folder(folder, manifest):
+    """
+    Stats every file below folder, reusing the manifest's hash for files whose size and mtime are unchanged.
+    :param folder: The local folder to scan
+    :param manifest: The manifest from the previous sync, keyed by object name
+    :return: A dict of object name to {path, size, mtime, md5}
+    """
+    entries = {}
+    for path, obj_name in uploads.walk_files(folder):
+        stat = os.stat(path)
+        previous = manifest.get(obj_name)
+        if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+            md5 = previous['md5']
+        else:
+            md5 = file_md5(path)
+        entries[obj_name] = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'md5': md5}
+    return entries
+
+
+def remote_etags(client, container_name):
+    """
+    Lists every object in a container. swiftclient pages through the listing with markers.
+    :return: A dict of object name to ETag
+    """
+    headers, objects = uploads.swift_connection(client).get_container(container_name, full_listing=True)
+    return dict((item['name'], item['hash']) for item in objects)
+
+
+def needs_upload(entry, previous, remote_etag):
+    """
+    Decides whether a local file differs from what the container holds.
+    :param entry: The scanned local entry
+    :param previous: The manifest entry from the last sync, or None
+    :param remote_etag: The ETag listed by the container, or None if the object is missing
+    """
+    if remote_etag is None:
+        return True
+    #Segmented objects list the manifest's ETag, so they are compared against the ETag recorded at upload time.
+    if previous and previous['md5'] == entry['md5'] and previous.get('etag') == remote_etag:
+        return False
+    return remote_etag != entry['md5']
+
+
+def sync_folder(client, container_name, folder, delete=False, threshold=uploads.SEGMENT_THRESHOLD,
+                max_workers=uploads.MAX_WORKERS):
+    """
+    Uploads new and changed files below folder and optionally deletes objects with no local file.
+    :param client: A pyrax cloudfiles client object with its auth already initialized.
+    :param container_name: The container to sync to
+    :param folder: The local folder to sync
+    :param delete: Delete remote objects that no longer exist locally
+    :param threshold: Files larger than this many bytes are segmented
+    :param max_workers: The most uploads or deletes in flight at once
+    :return: A dict of counts for uploaded, unchanged and deleted objects and a list of (name, exception) failures
+    """
+    if not os.path.isdir(folder):
+        raise ValueError(folder + " is not a valid directory")
+
+    path = manifest_path(container_name, folder)
+    manifest = cache.load_json(path) or {}
+    local = scan_folder(folder, manifest)
+    remote = remote_etags(client, container_name)
+
+    changed = sorted(name for name, entry in local.iteritems()
+                     if needs_upload(entry, manifest.get(name), remote.get(name)))
+
+    def upload(name):
+        etag = uploads.upload_file(client, container_name, local[name]['path'], name, threshold=threshold,
+                                   max_workers=max_workers)
+        return etag.strip('"') if etag else etag
+
+    uploaded = 0
+    failures = []
+    for name, (etag, error) in zip(changed, workers.bounded_map(upload, changed, max_workers)):
+        if error is not None:
+            failures.append((name, error))
+            remote.pop(name, None)
+        else:
+            uploaded += 1
+            remote[name] = etag
+
+    #Files that failed to upload are left out of the manifest so the next sync retries them.
+    new_manifest = {}
+    for name, entry in local.iteritems():
+        if name in remote:
+            new_manifest[name] = {'size': entry['size'], 'mtime': entry['mtime'], 'md5': entry['md5'],
+                                  'etag': remote[name]}
+    cache.store_json(path, new_manifest)
+
+    deleted = 0
+    if delete:
+        stale = sorted(name for name in remote if name not in local)
+        delete_object = lambda name: uploads.swift_connection(client).delete_object(container_name, name)
+        for name, (result, error) in zip(stale, workers.bounded_map(delete_object, stale, max_workers)):
+            if error is not None:
+                failures.append((name, error))
+            else:
+                deleted += 1
+
+    counts = {'uploaded': uploaded, 'unchanged': len(local) - len(changed), 'deleted': deleted}
+    return counts, failures
@@ -0,0 +1,200 @@
+"""
+Hostname validation and splitting, plus a batch mode for running both over large hostname feeds.
+
+Usage: python hostnames.py [-i hostnames.txt] [-o results.jsonl] [--format jsonl|csv] [--processes N]
+
+Reads one hostname per line from the input file (or stdin), validates and splits each one against the public suffix
+list and writes one result per line in input order. Chunks of lines are fanned out to a pool of worker processes,
+each of which maps the same compiled suffix index.
+"""
+from __future__ import with_statement
+from urlparse import urlparse
+from collections import deque
+import argparse
+import csv
+import json
+import multiprocessing
+import multiprocessing.util
+import re
+import sys
+import public_suffix
+
+__author__ = 'Bruce Stringer'
+
+_LABEL = re.compile("(?!-)[A-Z\d-]{1,63}(?<!-)$", re.IGNORECASE)
+_FIELDS = ["hostname", "valid", "subdomains", "domain", "tld", "error"]
+
+
+class DomainParts(object):
+    __slots__ = ('domain', 'subdomains', 'tld')
+
+    def __init__(self, domain_parts, tld):
+        self.domain = None
+        self.subdomains = None
+        self.tld = tld
+        if domain_parts:
+            self.domain = domain_parts[-1]
+            if len(domain_parts) > 1:
+                self.subdomains = domain_parts[:-1]
+
+    def base_domain(self):
+        return self.domain + "." + self.tld
+
+
+def isValidHostname(hostname):
+    if len(hostname) > 255:
+        return False
+    if hostname[-1:] == ".":
+        hostname = hostname[:-1] # strip exactly one dot from the right, if present
+    return all(_LABEL.match(x) for x in hostname.split("."))
+
+
+def split_hostname(hostname, tlds):
+    """
+    Splits a hostname into its subdomains, domain and public suffix.
+    :param hostname: The hostname to split. Ex. www.abcde.co.uk
+    :param tlds: A public suffix index. Ex. public_suffix.load("tlds.txt")
+    :return: A DomainParts object. :raise: ValueError if no public suffix matches the hostname
+    """
+    labels = hostname.split('.')
+    suffix_length = public_suffix.suffix_length(tlds, labels)
+    if suffix_length <= 0:
+        raise ValueError("Domain not in global list of TLDs")
+
+    i = len(labels) - suffix_length
+    return DomainParts(labels[:i], '.'.join(labels[i:]))
+
+
+def get_domain_parts(url, tlds):
+    """
+    Splits the hostname of a url into its subdomains, domain and public suffix.
+    :param url: A url containing the hostname to split. Ex. http://www.abcde.co.uk
+    :param tlds: A public suffix index. Ex. public_suffix.load("tlds.txt")
+    :return: A DomainParts object. :raise: ValueError if no public suffix matches the hostname
+    """
+    return split_hostname(urlparse(url).hostname, tlds)
+
+
+def classify(hostname, tlds):
+    """
+    Validates and splits a single hostname.
+    :param hostname: The hostname to classify
+    :param tlds: A public suffix index
+    :return: A result tuple ordered like _FIELDS
+    """
+    if not isValidHostname(hostname):
+        return hostname, False, None, None, None, "Invalid hostname"
+    try:
+        parts = split_hostname(hostname.rstrip("."), tlds)
+    except ValueError as e:
+        return hostname, False, None, None, None, str(e)
+    subdomains = ".".join(parts.subdomains) if parts.subdomains else None
+    return hostname, True, subdomains, parts.domain, parts.tld, None
+
+
+_worker_tlds = None
+
+
+def _init_worker(tlds_location):
+    global _worker_tlds
+    _worker_tlds = public_suffix.load(tlds_location)
+    #Unmapped when the worker exits after the pool is closed.
+    multiprocessing.util.Finalize(_worker_tlds, _worker_tlds.close, exitpriority=10)
+
+
+def _classify_chunk(hostnames):
+    return [classify(hostname, _worker_tlds) for hostname in hostnames]
+
+
+def _read_chunks(lines, chunk_size):
+    chunk = []
+    for line in lines:
+        hostname = line.strip().lower()
+        if not hostname:
+            continue
+        chunk.append(hostname)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def classify_stream(lines, tlds_location="tlds.txt", processes=None, chunk_size=5000):
+    """
+    Classifies a stream of hostnames across a process pool, yielding results in input order.
+    Only a couple of chunks per worker are in flight at once, so memory stays flat regardless of input size.
+    :param lines: An iterable of hostname lines. Blank lines are skipped.
+    :param tlds_location: The location of the public suffix list
+    :param processes: Number of worker processes. Default is the number of CPUs
+    :param chunk_size: Number of hostnames handed to a worker at a time
+    :return: A generator of result tuples ordered like _FIELDS
+    """
+    processes = processes or multiprocessing.cpu_count()
+
+    #Compiling up front keeps the workers from racing to build the index.
+    public_suffix.load(tlds_location, check_interval=None).close()
+
+    pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(tlds_location,))
+    finished = False
+    try:
+        pending = deque()
+        for chunk in _read_chunks(lines, chunk_size):
+            pending.append(pool.apply_async(_classify_chunk, (chunk,)))
+            if len(pending) >= processes * 2:
+                for result in pending.popleft().get():
+                    yield result
+        while pending:
+            for result in pending.popleft().get():
+                yield result
+        #Closing rather than terminating lets the workers exit cleanly and unmap their indexes.
+        pool.close()
+        finished = True
+    finally:
+        if not finished:
+            pool.terminate()
+        pool.join()
+
+
+def write_jsonl(results, output):
+    for result in results:
+        try:
+            line = json.dumps(dict(zip(_FIELDS, result)))
+        except UnicodeDecodeError:
+            #A line that is not UTF-8 becomes an error row with the bad bytes replaced, rather than ending the run.
+            hostname = result[0].decode("utf-8", "replace")
+            line = json.dumps(dict(zip(_FIELDS, (hostname, False, None, None, None, "Hostname is not valid UTF-8"))))
+        output.write(line + "\n")
+
+
+def write_csv(results, output):
+    writer = csv.writer(output)
+    writer.writerow(_FIELDS)
+    for result in results:
+        writer.writerow(["" if value is None else value for value in result])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and split hostnames in bulk.")
+    parser.add_argument("-i", "--input", default="-", help="File of hostnames, one per line. Default stdin")
+    parser.add_argument("-o", "--output", default="-", help="File to write results to. Default stdout")
+    parser.add_argument("-f", "--format", choices=["jsonl", "csv"], default="jsonl", help="Output format")
+    parser.add_argument("-p", "--processes", type=int, help="Number of worker processes. Default CPU count")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Hostnames per worker task")
+    parser.add_argument("--tlds", default="tlds.txt", help="Location of the public suffix list")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    output = sys.stdout if args.output == "-" else open(args.output, "wb")
+    writer = write_csv if args.format == "csv" else write_jsonl
+    try:
+        writer(classify_stream(source, args.tlds, args.processes, args.chunk_size), output)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
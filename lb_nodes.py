@@ -0,0 +1,249 @@
+"""
+Reconciles a Cloud Load Balancer's nodes against a desired set of address:port entries.
+
+Usage: python lb_nodes.py LB 10.0.0.1:80 10.0.0.2 [...] [--file nodes.txt] [--keep-extra] [--dry-run]
+
+The load balancer's node list is read once and diffed against the desired set. Missing nodes are added in batches of
+up to --batch-size per request and unwanted nodes are removed MAX_DELETE_IDS at a time with the bulk delete call, so
+the whole change takes a bounded number of requests however many nodes there are. A load balancer is immutable while
+it is PENDING_UPDATE, so it is waited on until ACTIVE before each change, and a change refused because the load
+balancer was still busy is retried once it is ACTIVE again. Adds are applied before removes so capacity never drops
+below the smaller of the old and new node sets.
+"""
+from __future__ import with_statement
+import argparse
+import sys
+import threading
+import urllib
+import waiters
+
+__author__ = 'Bruce Stringer'
+
+#The most node ids the bulk delete call accepts.
+MAX_DELETE_IDS = 10
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_PORT = 80
+#Times a change refused with 422 because the load balancer was busy is retried.
+IMMUTABLE_RETRIES = 5
+
+
+def parse_endpoint(value, default_port=DEFAULT_PORT):
+    """
+    :param value: An address with an optional port. Ex. 10.0.0.1:8080, 10.0.0.1 or [2001:db8::1]:8080
+    :return: An (address, port) tuple. :raise: ValueError if the port is not a number
+    """
+    value = value.strip()
+    if value.startswith("["):
+        address, separator, port = value[1:].partition("]")
+        port = port[1:]
+        if not port:
+            return address, default_port
+    elif value.count(":") != 1:
+        #No port, or a bare IPv6 address.
+        return value, default_port
+    else:
+        address, separator, port = value.partition(":")
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError("Invalid port in node: " + value)
+    return address, int(port)
+
+
+def read_endpoints(lines, default_port=DEFAULT_PORT):
+    """
+    :param lines: Lines of address:port entries. Blank lines and # comments are ignored
+    :return: A set of (address, port) tuples
+    """
+    endpoints = set()
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if line:
+            endpoints.add(parse_endpoint(line, default_port))
+    return endpoints
+
+
+def plan(current_nodes, desired, keep_extra=False):
+    """
+    Diffs a load balancer's nodes against the desired endpoints.
+    :param current_nodes: The load balancer's node objects
+    :param desired: A set of (address, port) tuples
+    :param keep_extra: Leave nodes that are not in desired in place
+    :return: The (address, port) tuples to add and the node objects to remove
+    """
+    current = dict(((node.address, int(node.port)), node) for node in current_nodes)
+    to_add = sorted(endpoint for endpoint in desired if endpoint not in current)
+    to_remove = [] if keep_extra else [node for endpoint, node in sorted(current.iteritems())
+                                       if endpoint not in desired]
+    return to_add, to_remove
+
+
+def _chunks(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+class NodeReconciler(object):
+    """
+    Applies a node plan to one load balancer. calls counts the requests made, reads and changes but not the polls
+    made while waiting for the load balancer to go ACTIVE. Changes made through change() from several threads are
+    applied one at a time.
+    """
+
+    def __init__(self, lb_client, lb, batch_size=DEFAULT_BATCH_SIZE, condition="ENABLED", timeout=None):
+        """
+        :param lb_client: A pyrax cloud_loadbalancers client object with its auth already initialized.
+        :param lb: The load balancer, or its id
+        :param batch_size: The most nodes added in one request
+        :param condition: The condition new nodes are added in. ENABLED, DISABLED or DRAINING
+        :param timeout: Seconds to wait for the load balancer to go ACTIVE before each change. Default no timeout
+        """
+        self.lb_client = lb_client
+        self.lb = lb
+        self.batch_size = max(1, batch_size)
+        self.condition = condition
+        self.timeout = timeout
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def read(self):
+        """
+        Reads the load balancer and its nodes in one request.
+        :return: The load balancer's current nodes
+        """
+        self.lb = self.lb_client.get(getattr(self.lb, "id", self.lb))
+        self.calls += 1
+        return list(getattr(self.lb, "nodes", None) or [])
+
+    def wait_active(self):
+        """
+        Blocks until the load balancer is ACTIVE. :raise: RuntimeError if it fails or times out
+        """
+        if getattr(self.lb, "status", None) == "ACTIVE":
+            return
+        if waiters.wait_for(self.lb, timeout=self.timeout) is None:
+            raise RuntimeError("Load balancer %s did not become ACTIVE, it is %s" % (self.lb.id, self.lb.status))
+
+    def change(self, func, *args, **kwargs):
+        """
+        Makes one change to the load balancer once it is ACTIVE, retrying if it was refused as still busy.
+        :param func: The call making the change. Ex. lb.add_health_monitor
+        :return: What func returned
+        """
+        import clients
+        exc = clients.exc()
+        with self._lock:
+            for attempt in range(IMMUTABLE_RETRIES + 1):
+                self.wait_active()
+                self.calls += 1
+                try:
+                    result = func(*args, **kwargs)
+                except exc.ClientException as e:
+                    #422 means the load balancer went PENDING_UPDATE under us. Anything else is a real failure.
+                    if getattr(e, "code", None) != 422 or attempt == IMMUTABLE_RETRIES:
+                        raise
+                    self.lb.status = "PENDING_UPDATE"
+                    continue
+                #Every accepted change puts the load balancer back into PENDING_UPDATE.
+                self.lb.status = "PENDING_UPDATE"
+                return result
+
+    def _add(self, endpoints):
+        nodes = [self.lb_client.Node(address=address, port=port, condition=self.condition)
+                 for address, port in endpoints]
+        return self.lb.add_nodes(nodes)
+
+    def _delete(self, nodes):
+        if len(nodes) == 1:
+            return nodes[0].delete()
+        query = urllib.urlencode([("id", node.id) for node in nodes])
+        return self.lb.manager.api.method_delete("/loadbalancers/%s/nodes?%s" % (self.lb.id, query))
+
+    def apply(self, to_add, to_remove, report=None):
+        """
+        Adds and then removes nodes in as few requests as the batch limits allow.
+        :param to_add: (address, port) tuples to add
+        :param to_remove: Node objects to remove
+        :param report: An optional callable taking a message after each change
+        """
+        for batch in _chunks(list(to_add), self.batch_size):
+            self.change(self._add, batch)
+            if report:
+                report("Added %d nodes" % len(batch))
+        for batch in _chunks(list(to_remove), MAX_DELETE_IDS):
+            self.change(self._delete, batch)
+            if report:
+                report("Removed %d nodes" % len(batch))
+
+    def reconcile(self, desired, keep_extra=False, dry_run=False, report=None):
+        """
+        Brings the load balancer's nodes in line with the desired endpoints.
+        :param desired: A set of (address, port) tuples
+        :param keep_extra: Leave nodes that are not in desired in place
+        :param dry_run: Only work out the plan
+        :param report: An optional callable taking a message after each change
+        :return: The (address, port) tuples added and the nodes removed
+        """
+        to_add, to_remove = plan(self.read(), desired, keep_extra)
+        if not dry_run:
+            self.apply(to_add, to_remove, report)
+            if to_add or to_remove:
+                self.wait_active()
+        return to_add, to_remove
+
+
+def find_load_balancer(lb_client, key):
+    """
+    :param key: A load balancer name or id
+    :return: The matching load balancer. :raise: ValueError if there is not exactly one
+    """
+    matches = [lb for lb in lb_client.list() if key in (str(lb.id), lb.name)]
+    if len(matches) != 1:
+        raise ValueError("%d load balancers match %s" % (len(matches), key))
+    return matches[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Make a load balancer's nodes match a list of address:port entries.")
+    parser.add_argument("load_balancer", help="Name or id of the load balancer")
+    parser.add_argument("nodes", nargs="*", help="address:port of each node wanted. The port defaults to --port")
+    parser.add_argument("-f", "--file", help="File of address:port entries, one per line. - reads stdin")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port for entries without one. Default 80")
+    parser.add_argument("--keep-extra", action="store_true", help="Only add nodes, never remove any")
+    parser.add_argument("--condition", choices=["ENABLED", "DISABLED", "DRAINING"], default="ENABLED",
+                        help="Condition of added nodes. Default ENABLED")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Most nodes added per request. Default %d" % DEFAULT_BATCH_SIZE)
+    parser.add_argument("--timeout", type=int, help="Seconds to wait for the load balancer before each change")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the changes that would be made")
+    args = parser.parse_args()
+
+    try:
+        desired = read_endpoints(args.nodes, args.port)
+        if args.file:
+            source = sys.stdin if args.file == "-" else open(args.file)
+            try:
+                desired |= read_endpoints(source, args.port)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+    except ValueError as e:
+        parser.error(str(e))
+
+    #Imported here so argument errors never load pyrax.
+    import clients
+    lb_client = clients.cloud_loadbalancers()
+    lb = find_load_balancer(lb_client, args.load_balancer)
+
+    def report(message):
+        print >> sys.stderr, message
+
+    reconciler = NodeReconciler(lb_client, lb, args.batch_size, args.condition, args.timeout)
+    to_add, to_remove = reconciler.reconcile(desired, args.keep_extra, args.dry_run, report)
+    for address, port in to_add:
+        print "+ %s:%d" % (address, port)
+    for node in to_remove:
+        print "- %s:%s" % (node.address, node.port)
+    print >> sys.stderr, "%d added, %d removed in %d requests%s" % (len(to_add), len(to_remove), reconciler.calls,
+                                                                    " (dry run)" if args.dry_run else "")
+
+
+if __name__ == "__main__":
+    main()
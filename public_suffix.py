@@ -0,0 +1,385 @@
+"""
+Compiled index of the public suffix list (tlds.txt).
+
+Rules are stored in a trie keyed on reversed domain labels so a hostname is resolved with a single walk from its
+rightmost label inwards. Normal, wildcard and exception rules are all answered during that same walk.
+
+For scripts that start often, the rules can also be compiled into a binary hash table next to tlds.txt
+(python public_suffix.py tlds.txt). load() maps that file read-only instead of parsing tlds.txt, so every process
+on the machine shares the same pages, and rebuilds it whenever the hash of tlds.txt no longer matches.
+"""
+from __future__ import with_statement
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import time
+import zlib
+
+__author__ = 'Bruce Stringer'
+
+#Binary index layout: header, open addressing slot table of entry offsets, then the entries themselves.
+_MAGIC = "PSLIDX1\0"
+_HEADER = struct.Struct("<8s20sQdII")
+#The source size and mtime within the header, rewritten when the source is touched without changing.
+_SIGNATURE = struct.Struct("<Qd")
+_SIGNATURE_OFFSET = struct.calcsize("<8s20s")
+_SLOT = struct.Struct("<I")
+_ENTRY = struct.Struct("<BH")
+
+#Entry flags
+_NODE = 0
+_RULE = 1
+_WILDCARD = 2
+_EXCEPTION = 4
+
+
+def read_rules(path="tlds.txt"):
+    """
+    Reads the rules out of a public suffix list file, skipping comments and blank lines.
+    :param path: The location of the public suffix list
+    :return: A list of rule strings
+    """
+    rules = []
+    with open(path) as tldFile:
+        for line in tldFile:
+            #Only the first whitespace delimited token of a line is part of the rule.
+            fields = line.split()
+            if fields and not fields[0].startswith("//"):
+                rules.append(fields[0])
+    return rules
+
+
+def _hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(65536), ""):
+            digest.update(block)
+    return digest.digest()
+
+
+class _Node(object):
+    __slots__ = ('children', 'rule', 'exceptions')
+
+    def __init__(self):
+        self.children = {}
+        self.rule = False
+        self.exceptions = None
+
+
+def suffix_length(index, labels):
+    """
+    Number of trailing labels forming the public suffix of the hostname labels.
+    :param index: A SuffixTrie or CompiledSuffixIndex
+    :param labels: A list of hostname labels. Ex. ["www", "abcde", "co", "uk"]
+    :return: The suffix length in labels. Ex. 2 for co.uk. 0 if no rule matched.
+    """
+    matched, exception = index.match(labels)
+    if exception:
+        #An exception rule marks its leftmost label as registrable, the rest of it is the suffix.
+        return matched - 1
+    return matched
+
+
+class SuffixTrie(object):
+    """
+    Reversed-label trie of public suffix rules.
+    """
+
+    def __init__(self, rules=()):
+        """
+        :param rules: An iterable of public suffix rules. Ex. ["uk", "co.uk", "*.ck", "!www.ck"]
+        """
+        self.root = _Node()
+        self.size = 0
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, rule):
+        """
+        Adds a single rule to the trie.
+        :param rule: A public suffix rule. Exception rules start with "!" and wildcard labels are "*".
+        """
+        exception = rule.startswith("!")
+        labels = rule.lstrip("!").lower().split(".")
+        if exception:
+            #Exceptions are registered on the node of the suffix they carve out of. Ex. !www.ck lives on "ck"
+            labels, excepted = labels[1:], labels[0]
+
+        node = self.root
+        for label in reversed(labels):
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = _Node()
+            node = child
+
+        if exception:
+            if node.exceptions is None:
+                node.exceptions = set()
+            node.exceptions.add(excepted)
+        else:
+            node.rule = True
+        self.size += 1
+
+    def match(self, labels):
+        """
+        Finds the longest rule matching the end of the given hostname labels.
+        :param labels: A list of hostname labels. Ex. ["www", "abcde", "co", "uk"]
+        :return: A tuple of the number of trailing labels matched and whether the match was an exception rule.
+        A length of 0 means no rule matched.
+        """
+        matched = 0
+        exception = False
+        node = self.root
+        depth = 0
+        for label in reversed(labels):
+            depth += 1
+            child = node.children.get(label)
+            wildcard = node.children.get("*")
+
+            if node.exceptions is not None and label in node.exceptions:
+                matched, exception = depth, True
+            elif (child is not None and child.rule) or (wildcard is not None and wildcard.rule):
+                matched, exception = depth, False
+
+            #A wildcard only stands for the leftmost label of a rule, so the walk never continues below one. This is
+            #what the list scan and the compiled index do too.
+            node = child
+            if node is None:
+                break
+
+        return matched, exception
+
+
+def compile_rules(source="tlds.txt", target=None):
+    """
+    Compiles a public suffix list into the binary index read by CompiledSuffixIndex.
+    Every suffix of every rule is stored as a dotted key with flags, so a lookup costs one probe per label.
+    :param source: The location of the public suffix list
+    :param target: Where to write the index. Defaults to the source path with a .idx extension
+    :return: The location of the written index
+    """
+    if target is None:
+        target = os.path.splitext(source)[0] + ".idx"
+
+    source_stat = os.stat(source)
+    digest = _hash_file(source)
+
+    entries = {"": _NODE}
+    for rule in read_rules(source):
+        exception = rule.startswith("!")
+        labels = rule.lstrip("!").lower().split(".")
+        #Register every ancestor so a lookup can stop as soon as no longer rule can match.
+        for i in range(1, len(labels)):
+            entries.setdefault(".".join(labels[i:]), _NODE)
+
+        if exception:
+            key, flag = ".".join(labels), _EXCEPTION
+        elif labels[0] == "*":
+            key, flag = ".".join(labels[1:]), _WILDCARD
+        else:
+            key, flag = ".".join(labels), _RULE
+        entries[key] = entries.get(key, _NODE) | flag
+
+    slot_count = 1
+    while slot_count < len(entries) * 2:
+        slot_count *= 2
+
+    offset = _HEADER.size + slot_count * _SLOT.size
+    slots = [0] * slot_count
+    body = []
+    for key in sorted(entries):
+        slot = (zlib.crc32(key) & 0xffffffff) & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = offset
+        record = _ENTRY.pack(entries[key], len(key)) + key
+        body.append(record)
+        offset += len(record)
+
+    header = _HEADER.pack(_MAGIC, digest, source_stat.st_size, source_stat.st_mtime, slot_count, len(entries))
+
+    #Written beside the target and renamed over it so processes holding the old map keep valid pages.
+    temp_target = "%s.%d.tmp" % (target, os.getpid())
+    with open(temp_target, "wb") as index_file:
+        index_file.write(header)
+        index_file.write(struct.pack("<%dI" % slot_count, *slots))
+        index_file.write("".join(body))
+    os.rename(temp_target, target)
+    return target
+
+
+def _restamp(target, signature):
+    #Only the size and mtime fields change, in place, so processes mapping the index see the same rules.
+    try:
+        with open(target, "r+b") as index_file:
+            index_file.seek(_SIGNATURE_OFFSET)
+            index_file.write(_SIGNATURE.pack(*signature))
+    except (IOError, OSError):
+        #A read-only index still works, it is just hashed again on the next load.
+        pass
+
+
+class CompiledSuffixIndex(object):
+    """
+    Read-only memory map of a compiled public suffix index.
+    The source list is re-checked every check_interval seconds and the index rebuilt and remapped if it changed.
+    close() releases the map, and the index can be used in a with statement to close it automatically.
+    """
+
+    def __init__(self, source="tlds.txt", target=None, check_interval=5):
+        """
+        :param source: The location of the public suffix list
+        :param target: The location of the compiled index. Defaults to the source path with a .idx extension
+        :param check_interval: Seconds between checks of the source list for changes. None disables reloading.
+        """
+        self.source = source
+        self.target = target or os.path.splitext(source)[0] + ".idx"
+        self.check_interval = check_interval
+        self.map = None
+        self.source_signature = None
+        self.checked_at = 0
+        self.load()
+
+    def _open(self):
+        with open(self.target, "rb") as index_file:
+            index_map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, digest, size, mtime, slot_count, entry_count = _HEADER.unpack_from(index_map, 0)
+        except struct.error:
+            index_map.close()
+            raise
+        if magic != _MAGIC:
+            index_map.close()
+            raise ValueError("Not a compiled public suffix index: " + self.target)
+        return index_map, digest, (size, mtime), slot_count
+
+    def load(self):
+        """
+        Maps the compiled index, compiling it first if it is missing or out of date with the source list.
+        """
+        source_stat = os.stat(self.source)
+        signature = (source_stat.st_size, source_stat.st_mtime)
+        try:
+            index_map, digest, built_from, slot_count = self._open()
+        except (IOError, OSError, ValueError, struct.error):
+            index_map = None
+
+        #A matching size and mtime is trusted, anything else falls back to comparing the content hash.
+        if index_map is not None and built_from != signature:
+            if digest == _hash_file(self.source):
+                #Same rules, new size or mtime (touch, checkout, copy). Restamp so later loads skip the hash.
+                _restamp(self.target, signature)
+            else:
+                index_map.close()
+                index_map = None
+
+        if index_map is None:
+            compile_rules(self.source, self.target)
+            index_map, digest, built_from, slot_count = self._open()
+
+        if self.map is not None:
+            self.map.close()
+        self.map = index_map
+        self.slot_count = slot_count
+        self.source_signature = signature
+        self.checked_at = time.time()
+
+    def close(self):
+        """
+        Unmaps the index. It cannot be used after this.
+        """
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def reload_if_changed(self):
+        """
+        Reloads the index if the source list changed on disk since it was loaded.
+        :return: True if the index was reloaded
+        """
+        self.checked_at = time.time()
+        source_stat = os.stat(self.source)
+        if (source_stat.st_size, source_stat.st_mtime) == self.source_signature:
+            return False
+        self.load()
+        return True
+
+    def _flags(self, key):
+        index_map = self.map
+        mask = self.slot_count - 1
+        slot = (zlib.crc32(key) & 0xffffffff) & mask
+        while True:
+            offset = _SLOT.unpack_from(index_map, _HEADER.size + slot * _SLOT.size)[0]
+            if not offset:
+                return None
+            flags, length = _ENTRY.unpack_from(index_map, offset)
+            start = offset + _ENTRY.size
+            if index_map[start:start + length] == key:
+                return flags
+            slot = (slot + 1) & mask
+
+    def match(self, labels):
+        """
+        Finds the longest rule matching the end of the given hostname labels.
+        :param labels: A list of hostname labels. Ex. ["www", "abcde", "co", "uk"]
+        :return: A tuple of the number of trailing labels matched and whether the match was an exception rule.
+        A length of 0 means no rule matched.
+        """
+        if self.check_interval is not None and time.time() - self.checked_at >= self.check_interval:
+            self.reload_if_changed()
+
+        matched = 0
+        exception = False
+        parent_flags = self._flags("")
+        suffix = None
+        depth = 0
+        for label in reversed(labels):
+            depth += 1
+            suffix = label if suffix is None else label + "." + suffix
+            flags = self._flags(suffix)
+
+            if flags is not None and flags & _EXCEPTION:
+                matched, exception = depth, True
+            elif (flags is not None and flags & _RULE) or parent_flags & _WILDCARD:
+                matched, exception = depth, False
+
+            if flags is None:
+                break
+            parent_flags = flags
+
+        return matched, exception
+
+
+def load(source="tlds.txt", check_interval=5):
+    """
+    Loads the public suffix list through its compiled index, building the index if needed.
+    :param source: The location of the public suffix list
+    :param check_interval: Seconds between checks of the source list for changes. None disables reloading.
+    :return: A CompiledSuffixIndex
+    """
+    return CompiledSuffixIndex(source, check_interval=check_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a public suffix list into a memory mappable index.")
+    parser.add_argument("source", nargs="?", default="tlds.txt", help="Location of the public suffix list")
+    parser.add_argument("-o", "--output", help="Location of the compiled index")
+    args = parser.parse_args()
+
+    target = compile_rules(args.source, args.output)
+    print "Compiled %s to %s" % (args.source, target)
+
+
+if __name__ == "__main__":
+    main()
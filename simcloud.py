@@ -0,0 +1,893 @@
+"""
+In-process simulated cloud implementing the pyrax calls the scripts make, for benchmarking without an account.
+
+Usage: API_CHALLENGE_BACKEND=sim [API_CHALLENGE_SIM_CONFIG=sim.json] python cli.py challenge01
+
+SimCloud stands in for pyrax as a clients backend. It provides cloudservers, cloudfiles (with a swift connection for
+the upload engine), cloud_dns, cloud_loadbalancers and cloud_databases. Each API call sleeps for a latency drawn from a
+configurable distribution, is counted, may be refused by a per-call rate limit and may fail by injection.
+Servers, images, load balancers and database instances move through their build states on a schedule of drawn build
+times, so waiters see the same BUILD, SAVING and PENDING_UPDATE progressions they would against the real API.
+
+Every draw comes from a random generator seeded from the configured seed, the call name and how many times that call
+has been made, so a given seed and workload always see the same latencies, build times and failures. time_scale
+multiplies every latency and build time, Ex. 0.01 turns a three minute build into under two seconds. The waiters read
+it through clients.time_scale and poll on the same shortened clock.
+
+Errors are raised as the exception classes below, which mirror the names in pyrax.exc and novaclient.exceptions, and
+this module is what the backend's exc and server_exc return.
+"""
+from __future__ import with_statement
+import collections
+import datetime
+import hashlib
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+import urlparse
+import uuid
+
+__author__ = 'Bruce Stringer'
+
+#Durations in seconds. Each is a distribution: ["constant", value], ["uniform", low, high],
+#["normal", mean, deviation] or ["lognormal", median, sigma].
+DEFAULT_CONFIG = {
+    'seed': 0,
+    'time_scale': 1.0,
+    #Keyed by call name, Ex. "servers.create", with "default" for every other call.
+    'latency': {'default': ["lognormal", 0.2, 0.4]},
+    'build_times': {
+        'server.private_network': ["lognormal", 40, 0.3],
+        'server.public_ipv4': ["lognormal", 45, 0.3],
+        'server.active': ["lognormal", 180, 0.3],
+        'image.active': ["lognormal", 300, 0.3],
+        'lb.active': ["lognormal", 20, 0.3],
+        'lb.update': ["lognormal", 5, 0.3],
+        'db.active': ["lognormal", 240, 0.3],
+    },
+    #Call name to [calls, seconds]. Calls over the limit raise OverLimit.
+    'rate_limits': {'servers.create': [50, 60]},
+    #Call name, or server.build, image.build, lb.build or db.build, to the probability it fails.
+    'failures': {},
+    'limits': {'maxTotalInstances': 200, 'maxTotalRAMSize': 256000},
+    'domains': ["example.com"],
+    'containers': [],
+    #Names of servers that already exist, ACTIVE, Ex. for challenge02 to clone.
+    'servers': [],
+}
+
+RATE_UNITS = [(86400, "DAY"), (3600, "HOUR"), (60, "MINUTE"), (1, "SECOND")]
+
+#(id, name, ram, vcpus, disk) of the standard flavors.
+FLAVORS = [("2", "512MB Standard Instance", 512, 1, 20), ("3", "1GB Standard Instance", 1024, 1, 40),
+           ("4", "2GB Standard Instance", 2048, 2, 80), ("5", "4GB Standard Instance", 4096, 2, 160),
+           ("6", "8GB Standard Instance", 8192, 4, 320), ("7", "15GB Standard Instance", 15360, 6, 620),
+           ("8", "30GB Standard Instance", 30720, 8, 1200)]
+BASE_IMAGES = [("c195ef3b-9195-4474-b6f7-16e5bd86acd0", "CentOS 6.3"),
+               ("5cebb13a-f783-4f8c-8058-c4182c724ccd", "Ubuntu 12.04 LTS (Precise Pangolin)")]
+DATABASE_FLAVORS = [(1, "512MB Instance", 512), (2, "1GB Instance", 1024), (3, "2GB Instance", 2048),
+                    (4, "4GB Instance", 4096)]
+
+
+class ClientException(Exception):
+    """
+    Base of every simulated API error, with the HTTP status code it stands for.
+    """
+    http_status = 500
+
+    def __init__(self, code=None, message=None):
+        self.code = code or self.http_status
+        self.message = message or self.__class__.__name__
+        Exception.__init__(self, "%s (HTTP %s)" % (self.message, self.code))
+
+
+class BadRequest(ClientException):
+    http_status = 400
+
+
+class NotFound(ClientException):
+    http_status = 404
+
+
+class OverLimit(ClientException):
+    http_status = 413
+
+
+class DomainCreationFailed(ClientException):
+    http_status = 400
+
+
+class DomainRecordAdditionFailed(ClientException):
+    http_status = 400
+
+
+def _timestamp(seconds):
+    return datetime.datetime.utcfromtimestamp(seconds).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _merge(defaults, overrides):
+    merged = dict(defaults)
+    for key, value in (overrides or {}).iteritems():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class SimCloud(object):
+    """
+    A simulated account and its five service clients. calls counts the API calls made by name.
+    """
+
+    def __init__(self, config=None):
+        """
+        :param config: A dict overriding any part of DEFAULT_CONFIG
+        """
+        self.config = _merge(DEFAULT_CONFIG, config)
+        self.seed = self.config['seed']
+        self.time_scale = float(self.config['time_scale'])
+        self.calls = collections.Counter()
+        self.lock = threading.RLock()
+        self._windows = {}
+        self._ids = itertools.count(1)
+        self.cloudservers = ServersClient(self)
+        self.cloudfiles = FilesClient(self)
+        self.cloud_dns = DNSClient(self)
+        self.cloud_loadbalancers = LoadBalancerClient(self)
+        self.cloud_databases = DatabaseClient(self)
+        for name in self.config['servers']:
+            record = self.cloudservers.servers._add(name, BASE_IMAGES[0][0], FLAVORS[0][0], self._random(name, 0))
+            record.created = record.private_at = record.public_at = record.ready_at = 0
+            record.failed = False
+        #Errors are looked up on the backend the same way whichever client raised them.
+        self.exc = self.server_exc = sys.modules[__name__]
+
+    @classmethod
+    def from_file(cls, path=None):
+        """
+        :param path: A JSON file overriding any part of DEFAULT_CONFIG. Default the defaults
+        """
+        if not path:
+            return cls()
+        with open(path) as config_file:
+            return cls(json.load(config_file))
+
+    def client(self, name):
+        return getattr(self, name)
+
+    def swift_connection(self, url, token):
+        if url != self.cloudfiles.connection.url:
+            raise NotFound(message="No account at " + url)
+        return SwiftConnection(self, self.cloudfiles.connection.containers)
+
+    def _random(self, name, count):
+        #A generator per call keeps draws reproducible however threads interleave the calls.
+        return random.Random(int(hashlib.md5("%s:%s:%d" % (self.seed, name, count)).hexdigest(), 16))
+
+    def draw(self, spec, rng):
+        """
+        :return: A duration in seconds drawn from a distribution spec and scaled by time_scale
+        """
+        kind, args = spec[0], spec[1:]
+        if kind == "constant":
+            value = args[0]
+        elif kind == "uniform":
+            value = rng.uniform(args[0], args[1])
+        elif kind == "normal":
+            value = rng.normalvariate(args[0], args[1])
+        elif kind == "lognormal":
+            value = args[0] * rng.lognormvariate(0, args[1])
+        else:
+            raise ValueError("Unknown distribution: " + kind)
+        return max(0.0, value) * self.time_scale
+
+    def build_time(self, name, rng):
+        return self.draw(self.config['build_times'][name], rng)
+
+    def fails(self, name, rng):
+        return rng.random() < self.config['failures'].get(name, 0)
+
+    def call(self, name):
+        """
+        Accounts for one API call: counts it, enforces its rate limit, injects failures and sleeps for its latency.
+        :return: A random generator for any further draws the call makes
+        """
+        with self.lock:
+            self.calls[name] += 1
+            rng = self._random(name, self.calls[name])
+            limit = self.config['rate_limits'].get(name)
+            if limit is not None:
+                window = self._windows.setdefault(name, collections.deque())
+                now = time.time()
+                while window and now - window[0] > limit[1] * self.time_scale:
+                    window.popleft()
+                if len(window) >= limit[0]:
+                    raise OverLimit(message="Rate limit of %d %s calls per %ds exceeded" % (limit[0], name, limit[1]))
+                window.append(now)
+        latency = self.config['latency']
+        time.sleep(self.draw(latency.get(name, latency['default']), rng))
+        if self.fails(name, rng):
+            raise ClientException(500, "Injected failure in " + name)
+        return rng
+
+    def new_id(self):
+        return str(uuid.UUID(int=(self.seed % 2 ** 64) << 64 | next(self._ids)))
+
+    def report(self):
+        """
+        :return: A dict of call name to count, plus total
+        """
+        with self.lock:
+            counts = dict(self.calls)
+        counts['total'] = sum(counts.itervalues())
+        return counts
+
+
+class Resource(object):
+    """
+    A client side view of a simulated resource, a snapshot of its attributes when it was fetched like the pyrax and
+    novaclient objects. get() refreshes it.
+    """
+
+    def __init__(self, manager, info):
+        self.manager = manager
+        self._info = {}
+        self._add_details(info)
+
+    def _add_details(self, info):
+        for key, value in info.iteritems():
+            setattr(self, key, value)
+        self._info.update(info)
+
+    def get(self):
+        self._add_details(self.manager.get(self.id)._info)
+        return self
+
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, getattr(self, "name", self.id))
+
+
+class _Static(object):
+    """
+    Server side state of a resource that never changes, Ex. a flavor.
+    """
+
+    def __init__(self, info):
+        self.info = info
+
+
+class _Record(object):
+    """
+    Server side state of a resource whose status follows a build timeline.
+    """
+
+    def __init__(self, cloud, kind, info, rng):
+        self.info = info
+        self.created = time.time()
+        self.ready_at = self.created + cloud.build_time(kind + ".active", rng)
+        self.failed = cloud.fails(kind + ".build", rng)
+        self.busy_until = None
+
+    def status(self, now, pending="BUILD"):
+        if now < self.ready_at:
+            return pending
+        if self.failed:
+            return "ERROR"
+        if self.busy_until is not None and now < self.busy_until:
+            return "PENDING_UPDATE"
+        return "ACTIVE"
+
+
+#Cloud Servers
+
+
+class Server(Resource):
+
+    def create_image(self, image_name):
+        return self.manager.cloud.cloudservers.images.create(self.id, image_name)
+
+    @property
+    def networks(self):
+        return dict((label, [address['addr'] for address in addresses])
+                    for label, addresses in self.addresses.iteritems())
+
+
+class Image(Resource):
+    pass
+
+
+class Flavor(Resource):
+    pass
+
+
+class Limits(object):
+    def __init__(self, absolute, rate):
+        self.absolute = absolute
+        self.rate = rate
+
+
+class _Manager(object):
+    def __init__(self, cloud, name):
+        self.cloud = cloud
+        self.name = name
+        self.records = collections.OrderedDict()
+
+    def _record(self, resource_id):
+        record = self.records.get(str(resource_id))
+        if record is None:
+            raise NotFound(message="No %s with id %s" % (self.name, resource_id))
+        return record
+
+
+class ServerManager(_Manager):
+
+    def __init__(self, cloud):
+        _Manager.__init__(self, cloud, "server")
+
+    def create(self, name, image, flavor, files=None, **kwargs):
+        rng = self.cloud.call("servers.create")
+        with self.cloud.lock:
+            record = self._add(name, image, flavor, rng)
+            server = self._view(record, time.time())
+        server.adminPass = hashlib.sha1("%s:%s" % (self.cloud.seed, record.info['id'])).hexdigest()[:12]
+        return server
+
+    def _add(self, name, image, flavor, rng):
+        with self.cloud.lock:
+            self.cloud.cloudservers.images._record(image)
+            flavor_info = self.cloud.cloudservers.flavors._record(flavor).info
+            server_id = self.cloud.new_id()
+            record = _Record(self.cloud, "server", {'id': server_id, 'name': name, 'image': {'id': str(image)},
+                                                    'flavor': {'id': str(flavor)}}, rng)
+            record.ram = flavor_info['ram']
+            record.private_at = record.created + min(self.cloud.build_time("server.private_network", rng),
+                                                     record.ready_at - record.created)
+            record.public_at = record.created + min(self.cloud.build_time("server.public_ipv4", rng),
+                                                    record.ready_at - record.created)
+            number = len(self.records) + 1
+            record.private = "10.%d.%d.%d" % (number >> 16 & 255, number >> 8 & 255, number & 255)
+            record.public = "198.%d.%d.%d" % (18 + (number >> 16 & 1), number >> 8 & 255, number & 255)
+            self.records[server_id] = record
+            return record
+
+    def _view(self, record, now):
+        addresses = {}
+        if now >= record.public_at:
+            addresses['public'] = [{'version': 4, 'addr': record.public}]
+        if now >= record.private_at:
+            addresses['private'] = [{'version': 4, 'addr': record.private}]
+        status = record.status(now)
+        progress = 100 if status != "BUILD" else int(100 * (now - record.created) / max(record.ready_at -
+                                                                                         record.created, 1e-9))
+        info = dict(record.info, status=status, progress=progress, addresses=addresses,
+                    accessIPv4=addresses.get('public', [{}])[0].get('addr', ""))
+        return Server(self, info)
+
+    def get(self, server_id):
+        self.cloud.call("servers.get")
+        with self.cloud.lock:
+            return self._view(self._record(server_id), time.time())
+
+    def list(self, detailed=True):
+        self.cloud.call("servers.list")
+        with self.cloud.lock:
+            now = time.time()
+            return [self._view(record, now) for record in self.records.itervalues()]
+
+    def delete(self, server_id):
+        self.cloud.call("servers.delete")
+        with self.cloud.lock:
+            self._record(server_id)
+            del self.records[str(server_id)]
+
+
+class ImageManager(_Manager):
+
+    def __init__(self, cloud):
+        _Manager.__init__(self, cloud, "image")
+        for image_id, name in BASE_IMAGES:
+            record = _Record(cloud, "image", {'id': image_id, 'name': name, 'minRam': 512, 'minDisk': 20,
+                                              'metadata': {}}, random.Random(image_id))
+            record.ready_at = record.created = 0
+            record.failed = False
+            self.records[image_id] = record
+
+    def create(self, server_id, name):
+        rng = self.cloud.call("servers.create_image")
+        with self.cloud.lock:
+            server = self.cloud.cloudservers.servers._record(server_id)
+            image_id = self.cloud.new_id()
+            self.records[image_id] = _Record(self.cloud, "image", {
+                'id': image_id, 'name': name, 'minRam': server.ram, 'minDisk': 20,
+                'server': {'id': server.info['id']}, 'metadata': {'instance_uuid': server.info['id']}}, rng)
+        return image_id
+
+    def _view(self, record, now):
+        status = record.status(now, pending="SAVING")
+        progress = 100 if status != "SAVING" else int(100 * (now - record.created) / max(record.ready_at -
+                                                                                          record.created, 1e-9))
+        return Image(self, dict(record.info, status=status, progress=progress, created=_timestamp(record.created)))
+
+    def get(self, image_id):
+        self.cloud.call("images.get")
+        with self.cloud.lock:
+            return self._view(self._record(image_id), time.time())
+
+    def list(self, detailed=True):
+        self.cloud.call("images.list")
+        with self.cloud.lock:
+            now = time.time()
+            return [self._view(record, now) for record in self.records.itervalues()]
+
+
+class FlavorManager(_Manager):
+
+    def __init__(self, cloud):
+        _Manager.__init__(self, cloud, "flavor")
+        for flavor_id, name, ram, vcpus, disk in FLAVORS:
+            self.records[flavor_id] = _Static({'id': flavor_id, 'name': name, 'ram': ram, 'vcpus': vcpus,
+                                               'disk': disk})
+
+    def list(self):
+        self.cloud.call("flavors.list")
+        return [Flavor(self, record.info) for record in self.records.itervalues()]
+
+    def get(self, flavor_id):
+        self.cloud.call("flavors.get")
+        return Flavor(self, self._record(flavor_id).info)
+
+
+class LimitsManager(object):
+
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def get(self):
+        self.cloud.call("limits.get")
+        with self.cloud.lock:
+            servers = self.cloud.cloudservers.servers.records.values()
+            used = {'totalInstancesUsed': len(servers),
+                    'totalRAMUsed': sum(record.ram for record in servers)}
+        absolute = [Resource(self, {'id': name, 'name': name, 'value': value})
+                    for name, value in dict(self.cloud.config['limits'], **used).iteritems()]
+        rate = []
+        limit = self.cloud.config['rate_limits'].get("servers.create")
+        if limit is not None:
+            seconds, unit = [(seconds, unit) for seconds, unit in RATE_UNITS if limit[1] >= seconds][0]
+            rate.append(Resource(self, {'id': "servers", 'verb': "POST", 'uri': "*/servers", 'unit': unit,
+                                        'value': int(limit[0] * seconds / limit[1])}))
+        return Limits(absolute, rate)
+
+
+class ServersClient(object):
+    """
+    Stands in for pyrax.cloudservers.
+    """
+
+    def __init__(self, cloud):
+        self.servers = ServerManager(cloud)
+        self.images = ImageManager(cloud)
+        self.flavors = FlavorManager(cloud)
+        self.limits = LimitsManager(cloud)
+        self.client = Resource(self, {'id': "client", 'management_url': "sim://servers/%s" % cloud.seed})
+
+
+#Cloud Files
+
+
+class SwiftConnection(object):
+    """
+    Stands in for the swiftclient Connection the upload engine uses. Every connection of a cloud sees the same
+    containers, as separate connections to one account do.
+    """
+
+    def __init__(self, cloud, containers=None):
+        self.cloud = cloud
+        self.url = "sim://files/%s" % cloud.seed
+        self.token = "sim"
+        self.containers = collections.OrderedDict() if containers is None else containers
+
+    def _container(self, name):
+        container = self.containers.get(name)
+        if container is None:
+            raise NotFound(message="No container " + name)
+        return container
+
+    def put_container(self, name, headers=None):
+        self.cloud.call("files.put_container")
+        with self.cloud.lock:
+            self.containers.setdefault(name, {'objects': collections.OrderedDict(), 'cdn_ttl': None})
+
+    def put_object(self, container, name, contents, content_length=None, etag=None, chunk_size=None,
+                   content_type=None, headers=None, query_string=None):
+        self.cloud.call("files.put_object")
+        if hasattr(contents, "read"):
+            data = "".join(iter(lambda: contents.read(chunk_size or 65536), ""))
+        else:
+            data = contents or ""
+        digest = hashlib.md5(data).hexdigest()
+        if etag is not None and etag != digest:
+            raise ClientException(422, "ETag mismatch for " + name)
+        with self.cloud.lock:
+            self._container(container)['objects'][name] = {
+                'name': name, 'bytes': len(data), 'hash': digest, 'content_type': content_type or "text/plain",
+                'last_modified': _timestamp(time.time()), 'data': data}
+        return '"%s"' % digest
+
+    def get_container(self, container, marker=None, limit=None, prefix=None, full_listing=False):
+        self.cloud.call("files.get_container")
+        with self.cloud.lock:
+            objects = [dict(item) for name, item in sorted(self._container(container)['objects'].iteritems())
+                       if (not prefix or name.startswith(prefix)) and (not marker or name > marker)]
+        for item in objects:
+            del item['data']
+        if not full_listing:
+            objects = objects[:limit or 10000]
+        return {'x-container-object-count': str(len(objects))}, objects
+
+    def delete_object(self, container, name):
+        self.cloud.call("files.delete_object")
+        with self.cloud.lock:
+            if self._container(container)['objects'].pop(name, None) is None:
+                raise NotFound(message="No object " + name)
+
+    def get_account(self, marker=None, limit=None, prefix=None, full_listing=False):
+        self.cloud.call("files.get_account")
+        with self.cloud.lock:
+            page = [{'name': name, 'count': len(container['objects']),
+                     'bytes': sum(item['bytes'] for item in container['objects'].itervalues())}
+                    for name, container in sorted(self.containers.iteritems())
+                    if (not prefix or name.startswith(prefix)) and (not marker or name > marker)]
+        return {}, page if full_listing else page[:limit or 10000]
+
+
+class Container(Resource):
+
+    def make_public(self, ttl=900):
+        self.client.cloud.call("files.make_public")
+        with self.client.cloud.lock:
+            self.client.connection._container(self.name)['cdn_ttl'] = ttl
+        self.cdn_uri = self.client._cdn_uri(self.name)
+
+    def set_web_index_page(self, page):
+        self.client.cloud.call("files.set_web_index_page")
+        with self.client.cloud.lock:
+            self.client.connection._container(self.name)['index'] = page
+
+
+class FilesClient(object):
+    """
+    Stands in for pyrax.cloudfiles.
+    """
+
+    def __init__(self, cloud):
+        self.cloud = cloud
+        self.connection = SwiftConnection(cloud)
+        for name in cloud.config['containers']:
+            self.connection.containers[name] = {'objects': collections.OrderedDict(), 'cdn_ttl': None}
+
+    def _cdn_uri(self, name):
+        return "http://%s.r%d.cf1.rackcdn.com" % (hashlib.sha1(name).hexdigest()[:20], len(name))
+
+    def _view(self, name):
+        container = self.connection._container(name)
+        return Container(self, {'id': name, 'name': name, 'client': self,
+                                'cdn_uri': self._cdn_uri(name) if container['cdn_ttl'] else None})
+
+    def create_container(self, name):
+        self.connection.put_container(name)
+        with self.cloud.lock:
+            return self._view(name)
+
+    def get_container(self, name):
+        self.cloud.call("files.head_container")
+        with self.cloud.lock:
+            return self._view(name)
+
+    def store_object(self, container, obj_name, data, content_type=None, etag=None):
+        self.connection.put_object(getattr(container, "name", container), obj_name, data, content_type=content_type,
+                                   etag=etag)
+        return Resource(self, {'id': obj_name, 'name': obj_name, 'container': container})
+
+
+#Cloud DNS
+
+
+class DNSRecord(Resource):
+
+    def delete(self):
+        self.manager.delete_record(self.domain_id, self.id)
+
+
+class Domain(Resource):
+
+    def add_records(self, records):
+        return self.manager.add_records(self.id, records)
+
+    def list_records(self, limit=None, offset=None):
+        return self.manager.list_records(self.id, limit, offset)
+
+
+class DNSClient(_Manager):
+    """
+    Stands in for pyrax.cloud_dns.
+    """
+
+    def __init__(self, cloud):
+        _Manager.__init__(self, cloud, "domain")
+        for name in cloud.config['domains']:
+            self._add_domain(name, "hostmaster@" + name)
+
+    def _add_domain(self, name, email):
+        domain_id = str(len(self.records) + 1000000)
+        self.records[domain_id] = {'id': domain_id, 'name': name, 'emailAddress': email,
+                                   'records': collections.OrderedDict()}
+        return Domain(self, dict((key, value) for key, value in self.records[domain_id].iteritems()
+                                 if key != "records"))
+
+    def create(self, name, emailAddress, **kwargs):
+        self.cloud.call("dns.create")
+        with self.cloud.lock:
+            if any(domain['name'] == name.lower() for domain in self.records.itervalues()):
+                raise DomainCreationFailed(message="Domain already exists: " + name)
+            return self._add_domain(name.lower(), emailAddress)
+
+    def list(self, limit=None, offset=None):
+        self.cloud.call("dns.list")
+        with self.cloud.lock:
+            domains = [Domain(self, {'id': domain['id'], 'name': domain['name'],
+                                     'emailAddress': domain['emailAddress']})
+                       for domain in self.records.itervalues()]
+        offset = offset or 0
+        return domains[offset:offset + (limit or 100)]
+
+    def get(self, domain_id):
+        self.cloud.call("dns.get")
+        with self.cloud.lock:
+            domain = self._record(domain_id)
+            return Domain(self, {'id': domain['id'], 'name': domain['name'], 'emailAddress': domain['emailAddress']})
+
+    def add_records(self, domain_id, records):
+        self.cloud.call("dns.add_records")
+        if isinstance(records, dict):
+            records = [records]
+        if len(records) > 100:
+            raise BadRequest(message="At most 100 records may be added per request")
+        with self.cloud.lock:
+            domain = self._record(domain_id)
+            #A refused request adds none of its records, as with the real API.
+            for record in records:
+                name = record['name'].lower()
+                if name != domain['name'] and not name.endswith("." + domain['name']):
+                    raise DomainRecordAdditionFailed(message="%s is not in %s" % (name, domain['name']))
+            created = []
+            for record in records:
+                name = record['name'].lower()
+                record_id = "%s-%d" % (record['type'], len(domain['records']) + 1)
+                domain['records'][record_id] = dict(record, id=record_id, name=name, domain_id=domain_id)
+                created.append(DNSRecord(self, domain['records'][record_id]))
+            return created
+
+    def list_records(self, domain_id, limit=None, offset=None):
+        self.cloud.call("dns.list_records")
+        with self.cloud.lock:
+            records = [DNSRecord(self, record) for record in self._record(domain_id)['records'].itervalues()]
+        offset = offset or 0
+        return records[offset:offset + (limit or 100)]
+
+    def delete_record(self, domain_id, record_id):
+        self.cloud.call("dns.delete_record")
+        with self.cloud.lock:
+            if self._record(domain_id)['records'].pop(record_id, None) is None:
+                raise NotFound(message="No record " + record_id)
+
+
+#Cloud Load Balancers
+
+
+class Node(Resource):
+    """
+    A load balancer node. Built by the script to pass to create or add_nodes, or listed on a load balancer.
+    """
+
+    def __init__(self, address=None, port=80, condition="ENABLED", manager=None, info=None, **kwargs):
+        Resource.__init__(self, manager, info or {'id': None, 'address': address, 'port': int(port),
+                                                  'condition': condition})
+
+    def delete(self):
+        self.manager.delete_nodes(self.lb_id, [self.id])
+
+
+class VirtualIP(Resource):
+
+    def __init__(self, type="PUBLIC", manager=None, info=None, **kwargs):
+        Resource.__init__(self, manager, info or {'id': None, 'type': type})
+
+
+class LoadBalancer(Resource):
+
+    def add_nodes(self, nodes):
+        return self.manager.add_nodes(self.id, nodes)
+
+    def add_health_monitor(self, **monitor):
+        self.manager.update(self.id, "lb.add_health_monitor", 'health_monitor', monitor)
+
+    def set_error_page(self, html):
+        self.manager.update(self.id, "lb.set_error_page", 'error_page', html)
+
+
+class _LoadBalancerApi(object):
+    """
+    The raw request interface pyrax managers expose as manager.api, for the calls pyrax does not wrap.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def method_delete(self, uri):
+        parsed = urlparse.urlparse(uri)
+        parts = parsed.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "loadbalancers" or parts[2] != "nodes":
+            raise NotFound(message="Unsupported request: DELETE " + uri)
+        ids = [int(node_id) for node_id in urlparse.parse_qs(parsed.query).get("id", [])]
+        if len(ids) > 10:
+            raise BadRequest(message="At most 10 nodes may be deleted per request")
+        self.manager.delete_nodes(parts[1], ids)
+        return None, None
+
+
+class LoadBalancerClient(_Manager):
+    """
+    Stands in for pyrax.cloud_loadbalancers.
+    """
+
+    def __init__(self, cloud):
+        _Manager.__init__(self, cloud, "load balancer")
+        self.api = _LoadBalancerApi(self)
+        self._node_ids = itertools.count(1)
+
+    def Node(self, **kwargs):
+        return Node(**kwargs)
+
+    def VirtualIP(self, **kwargs):
+        return VirtualIP(**kwargs)
+
+    def _nodes(self, nodes):
+        return [{'id': next(self._node_ids), 'address': node.address, 'port': int(node.port),
+                 'condition': getattr(node, "condition", "ENABLED")} for node in nodes]
+
+    def create(self, name, port=80, protocol="HTTP", nodes=None, virtual_ips=None, **kwargs):
+        rng = self.cloud.call("lb.create")
+        with self.cloud.lock:
+            lb_id = str(len(self.records) + 1)
+            vips = [{'id': index + 1, 'type': getattr(vip, "type", "PUBLIC"), 'ipVersion': "IPV4",
+                     'address': "162.209.%d.%d" % (int(lb_id) >> 8 & 255, int(lb_id) & 255)}
+                    for index, vip in enumerate(virtual_ips or [])]
+            record = _Record(self.cloud, "lb", {'id': lb_id, 'name': name, 'port': port, 'protocol': protocol,
+                                                'virtual_ips': vips}, rng)
+            record.nodes = collections.OrderedDict((node['id'], node) for node in self._nodes(nodes or []))
+            self.records[lb_id] = record
+            return self._view(record, time.time())
+
+    def _view(self, record, now):
+        #Nodes and VIPs are part of the details so refreshing a load balancer refreshes them too.
+        return LoadBalancer(self, dict(record.info, status=record.status(now),
+                                       nodes=[Node(manager=self, info=dict(node, lb_id=record.info['id']))
+                                              for node in record.nodes.itervalues()],
+                                       virtual_ips=[VirtualIP(manager=self, info=vip)
+                                                    for vip in record.info['virtual_ips']]))
+
+    def get(self, lb_id):
+        self.cloud.call("lb.get")
+        with self.cloud.lock:
+            return self._view(self._record(lb_id), time.time())
+
+    def list(self):
+        self.cloud.call("lb.list")
+        with self.cloud.lock:
+            now = time.time()
+            return [self._view(record, now) for record in self.records.itervalues()]
+
+    def _mutate(self, lb_id, rng):
+        #Called with the lock held. Load balancers refuse changes unless they are ACTIVE.
+        record = self._record(lb_id)
+        status = record.status(time.time())
+        if status != "ACTIVE":
+            raise ClientException(422, "Load Balancer '%s' has a status of '%s' and is considered immutable."
+                                  % (lb_id, status))
+        record.busy_until = time.time() + self.cloud.build_time("lb.update", rng)
+        return record
+
+    def update(self, lb_id, name, key, value):
+        rng = self.cloud.call(name)
+        with self.cloud.lock:
+            self._mutate(lb_id, rng).info[key] = value
+
+    def add_nodes(self, lb_id, nodes):
+        rng = self.cloud.call("lb.add_nodes")
+        with self.cloud.lock:
+            record = self._mutate(lb_id, rng)
+            added = self._nodes(nodes)
+            record.nodes.update((node['id'], node) for node in added)
+            return [Node(manager=self, info=dict(node, lb_id=lb_id)) for node in added]
+
+    def delete_nodes(self, lb_id, node_ids):
+        rng = self.cloud.call("lb.delete_nodes")
+        with self.cloud.lock:
+            record = self._mutate(lb_id, rng)
+            for node_id in node_ids:
+                record.nodes.pop(int(node_id), None)
+
+
+#Cloud Databases
+
+
+class DatabaseInstance(Resource):
+
+    def create_database(self, name):
+        return self.manager.create_database(self.id, name)
+
+    def create_user(self, name, password, database_names):
+        return self.manager.create_user(self.id, name, password, database_names)
+
+
+class DatabaseClient(_Manager):
+    """
+    Stands in for pyrax.cloud_databases.
+    """
+
+    def __init__(self, cloud):
+        _Manager.__init__(self, cloud, "database instance")
+
+    def list_flavors(self):
+        self.cloud.call("db.list_flavors")
+        return [Resource(self, {'id': flavor_id, 'name': name, 'ram': ram})
+                for flavor_id, name, ram in DATABASE_FLAVORS]
+
+    def create(self, name, flavor=None, volume=1, **kwargs):
+        rng = self.cloud.call("db.create")
+        with self.cloud.lock:
+            instance_id = self.cloud.new_id()
+            record = _Record(self.cloud, "db", {'id': instance_id, 'name': name, 'volume': {'size': volume},
+                                                'flavor': {'id': getattr(flavor, "id", flavor)}}, rng)
+            record.databases = []
+            record.users = []
+            self.records[instance_id] = record
+            return self._view(record, time.time())
+
+    def _view(self, record, now):
+        return DatabaseInstance(self, dict(record.info, status=record.status(now)))
+
+    def get(self, instance_id):
+        self.cloud.call("db.get")
+        with self.cloud.lock:
+            return self._view(self._record(instance_id), time.time())
+
+    def list(self):
+        self.cloud.call("db.list")
+        with self.cloud.lock:
+            now = time.time()
+            return [self._view(record, now) for record in self.records.itervalues()]
+
+    def _active(self, instance_id):
+        record = self._record(instance_id)
+        if record.status(time.time()) != "ACTIVE":
+            raise ClientException(422, "Instance %s is not ACTIVE" % instance_id)
+        return record
+
+    def create_database(self, instance_id, name):
+        self.cloud.call("db.create_database")
+        with self.cloud.lock:
+            self._active(instance_id).databases.append(name)
+        return Resource(self, {'id': name, 'name': name})
+
+    def create_user(self, instance_id, name, password, database_names):
+        self.cloud.call("db.create_user")
+        databases = [{'name': getattr(database, "name", database)} for database in database_names]
+        with self.cloud.lock:
+            self._active(instance_id).users.append(name)
+        return Resource(self, {'id': name, 'name': name, 'databases': databases})
@@ -0,0 +1,119 @@
+"""
+Index of server snapshots, so cloning a server again reuses a recent image of it instead of making another.
+
+Each snapshot is recorded with the server it was taken from, when it was created and its status. Status always comes
+from a fresh image listing, one API call, while the source server is taken from the image itself where the API
+reports it and otherwise from the images this module created, which are kept on disk per account. A recent enough
+ACTIVE snapshot is reused as is and one still SAVING is joined rather than started again.
+"""
+from __future__ import with_statement
+import threading
+import time
+import cache
+
+__author__ = 'Bruce Stringer'
+
+#Snapshots older than this are not reused unless a longer age is asked for.
+MAX_AGE = 3600
+IN_FLIGHT = ("SAVING", "QUEUED")
+
+
+def _source_server(image):
+    server = getattr(image, "server", None)
+    if isinstance(server, dict) and server.get("id"):
+        return str(server["id"])
+    metadata = getattr(image, "metadata", None) or {}
+    return metadata.get("instance_uuid")
+
+
+def _created(image):
+    try:
+        return cache.parse_timestamp(getattr(image, "created", "") or "")
+    except ValueError:
+        return None
+
+
+class SnapshotIndex(object):
+    """
+    The snapshots of one account keyed by source server. Entries are dicts with id, name, server, status, progress and
+    created, the creation time in seconds since the epoch.
+    """
+
+    def __init__(self, cs):
+        """
+        :param cs: A pyrax cloudserver client object with its auth already initialized.
+        """
+        self.cs = cs
+        account = cache.cache_key(getattr(getattr(cs, "client", None), "management_url", ""))
+        self.path = cache.cache_path("snapshots", account, "index.json")
+        self.by_server = None
+        self._lock = threading.Lock()
+
+    def _recorded(self):
+        return cache.load_json(self.path) or {}
+
+    def load(self):
+        """
+        Lists the account's images and rebuilds the index from them. Recorded snapshots whose image is gone are
+        forgotten.
+        """
+        recorded = self._recorded()
+        by_server = {}
+        kept = {}
+        for image in self.cs.images.list(detailed=True):
+            image_id = str(image.id)
+            server_id = _source_server(image)
+            if server_id is None and image_id in recorded:
+                server_id = recorded[image_id]['server']
+            if server_id is None:
+                continue
+            created = _created(image)
+            if created is None and image_id in recorded:
+                created = recorded[image_id]['created']
+            if image_id in recorded:
+                kept[image_id] = recorded[image_id]
+            by_server.setdefault(server_id, []).append({
+                'id': image_id, 'name': image.name, 'server': server_id, 'status': getattr(image, "status", None),
+                'progress': getattr(image, "progress", None), 'created': created})
+
+        #Newest first, with snapshots of unknown age last.
+        for entries in by_server.itervalues():
+            entries.sort(key=lambda entry: entry['created'] or 0, reverse=True)
+        with self._lock:
+            self.by_server = by_server
+            if kept != recorded:
+                cache.store_json(self.path, kept)
+
+    def record(self, image_id, server_id, name):
+        """
+        Remembers a snapshot this run started, for APIs that do not report an image's source server.
+        """
+        with self._lock:
+            recorded = self._recorded()
+            recorded[str(image_id)] = {'server': str(server_id), 'name': name, 'created': time.time()}
+            cache.store_json(self.path, recorded)
+
+    def snapshots(self, server_id):
+        """
+        :return: The snapshots of a server, newest first
+        """
+        if self.by_server is None:
+            self.load()
+        return list(self.by_server.get(str(server_id), []))
+
+    def find_reusable(self, server_id, max_age=MAX_AGE):
+        """
+        :param server_id: The id of the server being imaged
+        :param max_age: The oldest snapshot, in seconds, that may be reused
+        :return: The newest ACTIVE snapshot of the server within max_age, else the newest one still being saved within
+        max_age, else None
+        """
+        now = time.time()
+        recent = [entry for entry in self.snapshots(server_id)
+                  if entry['created'] is not None and now - entry['created'] <= max_age]
+        for status in [("ACTIVE",), IN_FLIGHT]:
+            for entry in recent:
+                if entry['status'] in status:
+                    return entry
+        return None
+
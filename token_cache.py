@@ -0,0 +1,143 @@
+"""
+Reuses pyrax auth tokens across runs.
+
+The token, its tenant and its expiry are cached on disk per credential file and region. A later run whose cached
+token is not close to expiring restores pyrax from it with pyrax.auth_with_token, which fetches the service catalog
+with the token instead of logging in with the credentials again. Only public pyrax calls are used. The cache is
+locked with flock while it is checked and refreshed, so concurrent scripts wait for one authentication instead of
+each making their own. Processes that run longer than the token re-authenticate shortly before it expires.
+"""
+from __future__ import with_statement
+import calendar
+import os
+import threading
+import time
+import pyrax
+import cache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'Bruce Stringer'
+
+#Tokens this close to expiring are treated as expired and refreshed.
+REFRESH_MARGIN = 300
+
+_refresh_timer = None
+
+
+class _FileLock(object):
+    """
+    Exclusive flock on a lock file, or nothing where fcntl is unavailable.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.lock_file = os.fdopen(os.open(self.path, os.O_WRONLY | os.O_CREAT, 0600), "w")
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def token_path(credential_file, region=None):
+    """
+    :return: The cache file for a credential file and region. Editing the credential file starts a new cache entry
+    """
+    credential_file = os.path.abspath(credential_file)
+    return cache.cache_path("tokens", cache.cache_key(credential_file, os.path.getmtime(credential_file),
+                                                      region) + ".json")
+
+
+def _expiry(expires):
+    #pyrax reports the expiry as a datetime in UTC, or as the API's timestamp string in some versions.
+    if isinstance(expires, basestring):
+        return cache.parse_timestamp(expires)
+    return calendar.timegm(expires.utctimetuple())
+
+
+def _fresh_login(credential_file, region, in_place=False):
+    if in_place:
+        #Authenticating the existing identity again keeps clients already handed out working.
+        pyrax.identity.authenticate()
+    else:
+        pyrax.set_credential_file(credential_file, region=region)
+    identity = pyrax.identity
+    return {'token': identity.token, 'tenant_id': identity.tenant_id, 'expires': _expiry(identity.expires)}
+
+
+def _restore(credential_file, region, entry):
+    pyrax.set_credential_file(credential_file, region=region, authenticate=False)
+    pyrax.auth_with_token(entry['token'], tenant_id=entry['tenant_id'], region=region)
+
+
+def authenticate(credential_file, region=None, refresh_margin=REFRESH_MARGIN):
+    """
+    Authenticates pyrax from the cached token when it is still valid, otherwise logs in and caches the new token.
+    :param credential_file: The location of the credential ini
+    :param region: The region to connect services to. Default the credential file's or pyrax's default
+    :param refresh_margin: Seconds before expiry at which a token is refreshed rather than reused
+    :return: The number of seconds the token remains valid for
+    """
+    path = token_path(credential_file, region)
+    with _FileLock(path + ".lock"):
+        entry = cache.load_json(path)
+        if entry is not None and entry.get('expires', 0) - refresh_margin > time.time():
+            try:
+                _restore(credential_file, region, entry)
+            except Exception:
+                entry = None
+        else:
+            entry = None
+        if entry is None:
+            entry = _fresh_login(credential_file, region)
+            cache.store_json(path, entry)
+
+    _schedule_refresh(credential_file, region, entry['expires'] - refresh_margin - time.time(), refresh_margin)
+    return entry['expires'] - time.time()
+
+
+def _schedule_refresh(credential_file, region, delay, refresh_margin):
+    #Only the latest login is kept fresh. The timer is a daemon so it never holds a finished script open.
+    global _refresh_timer
+    if _refresh_timer is not None:
+        _refresh_timer.cancel()
+    _refresh_timer = threading.Timer(max(delay, 0), refresh, [credential_file, region, refresh_margin])
+    _refresh_timer.daemon = True
+    _refresh_timer.start()
+
+
+def refresh(credential_file, region=None, refresh_margin=REFRESH_MARGIN):
+    """
+    Logs in again and replaces the cached token, unless another process already refreshed it. The token is updated
+    on the existing identity, so clients already handed out keep working.
+    """
+    path = token_path(credential_file, region)
+    with _FileLock(path + ".lock"):
+        entry = cache.load_json(path)
+        if entry is not None and 'token' in entry and entry.get('expires', 0) - refresh_margin > time.time():
+            pyrax.identity.auth_with_token(entry['token'], tenant_id=entry['tenant_id'])
+        else:
+            entry = _fresh_login(credential_file, region, in_place=True)
+            cache.store_json(path, entry)
+    _schedule_refresh(credential_file, region, entry['expires'] - refresh_margin - time.time(), refresh_margin)
+
+
+def clear(credential_file, region=None):
+    """
+    Drops the cached token, forcing the next authenticate to log in. Call after the token is rejected.
+    """
+    try:
+        os.remove(token_path(credential_file, region))
+    except OSError:
+        pass
@@ -0,0 +1,207 @@
+"""
+Cloud Files upload engine.
+
+Small files are uploaded as single objects from a pool of threads. Files above a threshold are split into segments
+that are uploaded in parallel straight out of a read-only memory map of the file, then stitched together with a
+dynamic (X-Object-Manifest) or static (multipart-manifest) large object manifest.
+
+Segment names include the file's size and mtime, so rerunning an interrupted upload of an unchanged file skips every
+segment already stored with a matching size and ETag and resumes from the first missing one.
+"""
+from __future__ import with_statement
+import hashlib
+import json
+import mmap
+import os
+import threading
+import workers
+
+__author__ = 'Bruce Stringer'
+
+SEGMENT_SIZE = 100 * 1024 * 1024
+SEGMENT_THRESHOLD = 200 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+MAX_WORKERS = 8
+
+_local = threading.local()
+
+
+def swift_connection(client):
+    """
+    Returns a swift connection for the calling thread that reuses the pyrax client's endpoint and token.
+    Swift connections hold a single http connection, so they cannot be shared between threads.
+    :param client: A pyrax cloudfiles client object with its auth already initialized.
+    :return: A swiftclient Connection
+    """
+    import clients
+
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    url, token = client.connection.url, client.connection.token
+    connection = connections.get(url)
+    if connection is None or connection.token != token:
+        connection = connections[url] = clients.swift_connection(url, token)
+    return connection
+
+
+class _SliceReader(object):
+    """
+    File-like view of a slice of a memory map. Reads are served straight from the mapped pages.
+    """
+
+    def __init__(self, file_map, offset, length):
+        self.file_map = file_map
+        self.position = offset
+        self.end = offset + length
+
+    def __len__(self):
+        return self.end - self.position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.end - self.position
+        start = self.position
+        self.position = min(self.end, start + size)
+        return self.file_map[start:self.position]
+
+
+def _slice_md5(file_map, offset, length):
+    digest = hashlib.md5()
+    for start in xrange(offset, offset + length, CHUNK_SIZE):
+        digest.update(buffer(file_map, start, min(CHUNK_SIZE, offset + length - start)))
+    return digest.hexdigest()
+
+
+def segment_prefix(obj_name, size, mtime, segment_size=SEGMENT_SIZE):
+    """
+    :return: The name prefix shared by every segment of a file. Changes whenever the file or segment size change.
+    """
+    return "%s/%d/%d/%d/" % (obj_name, int(mtime), size, segment_size)
+
+
+def upload_small_file(client, container_name, path, obj_name):
+    """
+    Uploads a file as a single object.
+    :return: The ETag of the stored object
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as source:
+        return swift_connection(client).put_object(container_name, obj_name, source, content_length=size,
+                                                   chunk_size=CHUNK_SIZE)
+
+
+def upload_large_file(client, container_name, path, obj_name, segment_size=SEGMENT_SIZE, manifest="dynamic",
+                      segment_container=None, max_workers=MAX_WORKERS):
+    """
+    Uploads a file as parallel segments plus a large object manifest, skipping segments already uploaded.
+    :param client: A pyrax cloudfiles client object with its auth already initialized.
+    :param container_name: The container the object is stored in
+    :param path: The local file to upload
+    :param obj_name: The name of the object
+    :param segment_size: The size of each segment in bytes
+    :param manifest: "dynamic" for an X-Object-Manifest object or "static" for a multipart-manifest
+    :param segment_container: The container segments are stored in. Default <container_name>_segments
+    :param max_workers: The most segments uploaded at once
+    :return: The ETag of the manifest object. :raise: IOError if any segment failed to upload
+    """
+    if manifest not in ("dynamic", "static"):
+        raise ValueError("Invalid manifest type. Should be dynamic or static")
+
+    segment_container = segment_container or container_name + "_segments"
+    stat = os.stat(path)
+    prefix = segment_prefix(obj_name, stat.st_size, stat.st_mtime, segment_size)
+
+    connection = swift_connection(client)
+    connection.put_container(segment_container)
+    existing = dict((item['name'], item) for item in
+                    connection.get_container(segment_container, prefix=prefix, full_listing=True)[1])
+
+    segments = [(index, offset, min(segment_size, stat.st_size - offset))
+                for index, offset in enumerate(xrange(0, stat.st_size, segment_size))]
+
+    with open(path, "rb") as source:
+        file_map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        def put_segment(segment):
+            index, offset, length = segment
+            name = "%s%08d" % (prefix, index)
+            etag = _slice_md5(file_map, offset, length)
+            stored = existing.get(name)
+            if stored is None or stored['bytes'] != length or stored['hash'] != etag:
+                swift_connection(client).put_object(segment_container, name, _SliceReader(file_map, offset, length),
+                                                    content_length=length, etag=etag, chunk_size=CHUNK_SIZE)
+            return name, etag, length
+
+        results = workers.bounded_map(put_segment, segments, max_workers)
+    finally:
+        file_map.close()
+
+    failed = [error for result, error in results if error is not None]
+    if failed:
+        raise IOError("%d of %d segments of %s failed to upload, rerun to resume: %s" %
+                      (len(failed), len(segments), path, failed[0]))
+
+    if manifest == "dynamic":
+        return connection.put_object(container_name, obj_name, "", content_length=0,
+                                     headers={'X-Object-Manifest': segment_container + "/" + prefix})
+
+    body = json.dumps([{'path': "/%s/%s" % (segment_container, name), 'etag': etag, 'size_bytes': length}
+                       for (name, etag, length), error in results])
+    return connection.put_object(container_name, obj_name, body, content_length=len(body),
+                                 query_string="multipart-manifest=put")
+
+
+def upload_file(client, container_name, path, obj_name, threshold=SEGMENT_THRESHOLD, **kwargs):
+    """
+    Uploads a file, segmenting it if it is larger than threshold bytes.
+    Extra keyword arguments are passed to upload_large_file.
+    :return: The ETag of the stored object or manifest
+    """
+    if os.path.getsize(path) > threshold:
+        return upload_large_file(client, container_name, path, obj_name, **kwargs)
+    return upload_small_file(client, container_name, path, obj_name)
+
+
+def walk_files(folder):
+    """
+    :return: A generator of (local path, object name) pairs for every file below folder
+    """
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, folder).replace(os.sep, "/")
+
+
+def upload_tree(client, container_name, folder, threshold=SEGMENT_THRESHOLD, max_workers=MAX_WORKERS, **kwargs):
+    """
+    Uploads every file below a folder, keeping their relative paths as object names.
+    Files are uploaded from a pool of threads and large files are segmented.
+    :param client: A pyrax cloudfiles client object with its auth already initialized.
+    :param container_name: The container to upload to
+    :param folder: The local folder to upload
+    :param threshold: Files larger than this many bytes are segmented
+    :param max_workers: The most files, and the most segments of each large file, uploaded at once
+    :return: The number of files uploaded, their total size and a list of (path, exception) for failed files.
+    """
+    if not os.path.isdir(folder):
+        raise ValueError(folder + " is not a valid directory")
+
+    def upload(item):
+        path, obj_name = item
+        return upload_file(client, container_name, path, obj_name, threshold=threshold, max_workers=max_workers,
+                           **kwargs)
+
+    files = list(walk_files(folder))
+    results = workers.bounded_map(upload, files, max_workers)
+
+    uploaded = 0
+    size = 0
+    failures = []
+    for (path, obj_name), (etag, error) in zip(files, results):
+        if error is not None:
+            failures.append((path, error))
+        else:
+            uploaded += 1
+            size += os.path.getsize(path)
+    return uploaded, size, failures
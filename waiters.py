@@ -0,0 +1,521 @@
+"""
+Helpers for waiting on cloud resources to become ready without hammering the API.
+
+ResourceWaiter multiplexes any number of pending servers, images, database instances, load balancers, etc. onto a
+single scheduler thread. Resources are grouped by the list call used to refresh them, so each tick costs one list
+call per resource type rather than one call per resource.
+"""
+import random
+import threading
+import time
+import clients
+
+__author__ = 'Bruce Stringer'
+
+#Seconds a ServerWatcher watches for by default, well past how long a server normally takes to build.
+WATCH_TIMEOUT = 1800
+
+
+def _scaled(seconds):
+    #Polls keep pace with the backend's clock, which can run faster than the wall clock. Ex. the simulated cloud
+    return seconds * clients.time_scale()
+
+
+def is_not_found(error):
+    """
+    :param error: An exception raised by a client call
+    :return: True if the error is a 404, meaning the resource is gone
+    """
+    return 404 in (getattr(error, "http_status", None), getattr(error, "code", None))
+
+
+def has_networks(server):
+    """
+    :param server: A server object
+    :return: True once any network has been configured on the server
+    """
+    return len(server.networks) > 0
+
+
+def has_private_network(server):
+    """
+    :param server: A server object
+    :return: True once the server's private network has been configured
+    """
+    return 'private' in server.networks
+
+
+def public_ipv4(server):
+    """
+    :param server: A server object
+    :return: The server's first public IPv4 address, or None until one is assigned
+    """
+    for address in (getattr(server, "addresses", None) or {}).get('public') or []:
+        if address.get('version') == 4:
+            return address['addr']
+    return None
+
+
+def has_public_ipv4(server):
+    """
+    :param server: A server object
+    :return: True once the server has a public IPv4 address, which is usually well before it is ACTIVE
+    """
+    return public_ipv4(server) is not None
+
+
+def is_active(resource):
+    """
+    :param resource: A server, image or other resource with a status
+    :return: True once the resource is ACTIVE
+    """
+    return getattr(resource, "status", None) == "ACTIVE"
+
+
+class ServerWatcher(object):
+    """
+    Watches a set of servers until each one is ready, yielding each server the moment it becomes ready.
+
+    Every tick costs a single detailed servers.list call no matter how many servers are pending. Ticks back off
+    while nothing changes and snap back to the base interval as soon as a server finishes.
+    Servers that go into ERROR, or are deleted, are dropped from the watch and collected in failed. Servers still
+    pending when the timeout runs out are left in pending.
+    """
+
+    def __init__(self, cs, servers, ready=has_networks, interval=3, max_interval=30, backoff=1.5,
+                 timeout=WATCH_TIMEOUT):
+        """
+        :param cs: A pyrax cloudserver client object with its auth already initialized.
+        :param servers: The server objects to watch
+        :param ready: A callable taking a refreshed server and returning True once it is ready. Default has_networks
+        :param interval: The time in seconds between polls while servers are finishing
+        :param max_interval: The longest time in seconds to wait between polls
+        :param backoff: The factor the interval grows by after a poll where no server finished
+        :param timeout: Seconds to watch for before giving up on the remaining servers. Default WATCH_TIMEOUT, None
+        watches forever
+        """
+        self.cs = cs
+        self.pending = dict((server.id, server) for server in servers)
+        self.ready = ready
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.failed = []
+        self.polls = 0
+
+    def _check(self, server, ready):
+        if server.status in ("ERROR", "DELETED"):
+            del self.pending[server.id]
+            self.failed.append(server)
+        elif self.ready(server):
+            del self.pending[server.id]
+            ready.append(server)
+
+    def poll(self):
+        """
+        Refreshes every pending server with one list call. Pending servers missing from the listing, because they
+        were deleted or fell outside its first page, are looked up on their own.
+        :return: A list of the servers that became ready during this poll
+        """
+        self.polls += 1
+        ready = []
+        listed = set()
+        for server in self.cs.servers.list(detailed=True):
+            if server.id in self.pending:
+                listed.add(server.id)
+                self._check(server, ready)
+
+        for server_id in [server_id for server_id in self.pending if server_id not in listed]:
+            try:
+                server = self.cs.servers.get(server_id)
+            except Exception as e:
+                if not is_not_found(e):
+                    #Left pending and looked up again on the next poll.
+                    print "Status poll of server %s failed: %s" % (server_id, e)
+                    continue
+                server = self.pending[server_id]
+                server.status = "DELETED"
+            self._check(server, ready)
+        return ready
+
+    def __iter__(self):
+        started = time.time()
+        interval = self.interval
+        while self.pending:
+            failed = len(self.failed)
+            ready = self.poll()
+            for server in ready:
+                yield server
+
+            if not self.pending:
+                break
+            if self.timeout is not None and time.time() - started >= self.timeout:
+                break
+
+            if ready or len(self.failed) > failed:
+                interval = self.interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            time.sleep(_scaled(interval))
+
+
+def _refresh(resource, fresh):
+    #Copy the refreshed details onto the caller's object, the same way resource.get() does.
+    if hasattr(resource, "_add_details") and hasattr(fresh, "_info"):
+        resource._add_details(fresh._info)
+        return resource
+    return fresh
+
+
+class WaitHandle(object):
+    """
+    Future-like handle on a single resource being waited on. If the wait failed because the resource was deleted or
+    checking it raised, error holds the exception.
+    """
+
+    def __init__(self, resource, ready, failed, deadline):
+        self.resource = resource
+        self.ready = ready
+        self.failed = failed
+        self.deadline = deadline
+        self.succeeded = None
+        self.error = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the resource is ready, failed or timed out.
+        :param timeout: Seconds to block for. Default forever
+        :return: True if the wait finished
+        """
+        #Waiting in slices keeps the main thread responsive to KeyboardInterrupt.
+        end = None if timeout is None else time.time() + timeout
+        while not self._event.is_set():
+            remaining = 1 if end is None else min(1, end - time.time())
+            if remaining <= 0:
+                break
+            self._event.wait(remaining)
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """
+        :param timeout: Seconds to block for. Default forever
+        :return: The refreshed resource once it is ready, None if it failed or timed out.
+        """
+        self.wait(timeout)
+        return self.resource if self.succeeded else None
+
+    def add_done_callback(self, callback):
+        """
+        Registers a callable to be run with this handle when the wait finishes.
+        Callbacks run on the scheduler thread, or immediately if the wait already finished.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, succeeded, error=None):
+        with self._lock:
+            self.succeeded = succeeded
+            self.error = error
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print "Wait callback failed: %s" % e
+
+
+class _Group(object):
+    def __init__(self, lister, interval):
+        self.lister = lister
+        self.handles = {}
+        self.interval = interval
+        self.next_due = time.time()
+
+
+class ResourceWaiter(object):
+    """
+    Waits on many resources at once from a single scheduler thread.
+
+    Each group of resources sharing a list call is polled on its own schedule. A group's interval grows by backoff
+    after every poll where nothing finished, up to max_interval, and resets once something does. Every delay is
+    jittered so many waiters started together do not poll in lockstep.
+    A resource that is deleted, which shows as a 404, fails its waits. A resource missing from its group's listing is
+    looked up on its own to find out whether it was deleted.
+    """
+
+    def __init__(self, interval=5, max_interval=60, backoff=2, jitter=0.5):
+        """
+        :param interval: The starting time in seconds between polls of a group
+        :param max_interval: The longest time in seconds between polls of a group
+        :param backoff: The factor a group's interval grows by after a poll where nothing finished
+        :param jitter: The fraction of each delay that is randomised. 0 disables jitter
+        """
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.groups = {}
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def wait_for(self, resource, lister=None, attribute="status", desired=("ACTIVE",), failed_states=("ERROR",),
+                 ready=None, timeout=None, callback=None):
+        """
+        Starts waiting on a resource.
+        :param resource: The resource to wait on. It must have an id.
+        :param lister: A callable returning the current list of resources of this type, Ex. cs.servers.list.
+        Resources sharing a lister are refreshed together. Default refreshes the resource alone with resource.get()
+        :param attribute: The attribute compared against desired and failed_states. Default status
+        :param desired: The attribute values that mean the resource is ready. Default ACTIVE
+        :param failed_states: The attribute values that mean the resource will never be ready. Default ERROR
+        :param ready: A callable taking the refreshed resource, overriding the desired check. Ex. has_networks
+        :param timeout: Seconds to wait before giving up. Default no timeout
+        :param callback: A callable run with the handle once the wait finishes
+        :return: A WaitHandle
+        """
+        if isinstance(desired, basestring):
+            desired = (desired,)
+        if ready is None:
+            ready = lambda item: getattr(item, attribute, None) in desired
+        failed = lambda item: getattr(item, attribute, None) in failed_states
+
+        deadline = None if timeout is None else time.time() + timeout
+        handle = WaitHandle(resource, ready, failed, deadline)
+        if callback is not None:
+            handle.add_done_callback(callback)
+
+        key = lister if lister is not None else ("get", id(resource))
+        with self.condition:
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = _Group(lister, self.interval)
+            else:
+                #A new arrival gets checked at the base interval even if the group had backed off.
+                group.interval = self.interval
+                group.next_due = min(group.next_due, time.time() + _scaled(self.interval))
+            group.handles.setdefault(resource.id, []).append(handle)
+            self._start()
+            self.condition.notify()
+        return handle
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="ResourceWaiter")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _delay(self, interval):
+        return _scaled(interval * (1 - self.jitter * random.random()))
+
+    def _deadlines(self):
+        return [handle.deadline for group in self.groups.itervalues() for waiting in group.handles.itervalues()
+                for handle in waiting if handle.deadline is not None]
+
+    def _expire(self, now):
+        #Called with the condition held. Removes and returns the handles whose deadline has passed.
+        expired = []
+        for key, group in self.groups.items():
+            for resource_id, waiting in group.handles.items():
+                for handle in list(waiting):
+                    if handle.deadline is not None and now >= handle.deadline:
+                        waiting.remove(handle)
+                        expired.append(handle)
+                if not waiting:
+                    del group.handles[resource_id]
+            if not group.handles:
+                del self.groups[key]
+        return expired
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.groups:
+                    self.condition.wait()
+                #Deadlines are checked every tick, so a timeout is not held up by a group that has backed off.
+                now = time.time()
+                expired = self._expire(now)
+                if not expired:
+                    if not self.groups:
+                        continue
+                    key, group = min(self.groups.iteritems(), key=lambda item: item[1].next_due)
+                    if group.next_due > now:
+                        self.condition.wait(max(0, min([group.next_due] + self._deadlines()) - now))
+                        continue
+                    handles = dict((resource_id, list(waiting)) for resource_id, waiting in group.handles.iteritems())
+
+            if expired:
+                for handle in expired:
+                    handle._finish(False)
+                continue
+
+            finished = self._poll(group, handles)
+
+            with self.condition:
+                for resource_id, handle, succeeded, error in finished:
+                    waiting = group.handles.get(resource_id, [])
+                    if handle in waiting:
+                        waiting.remove(handle)
+                    if not waiting:
+                        group.handles.pop(resource_id, None)
+                if finished:
+                    group.interval = self.interval
+                else:
+                    group.interval = min(group.interval * self.backoff, self.max_interval)
+                group.next_due = time.time() + self._delay(group.interval)
+                if not group.handles:
+                    del self.groups[key]
+
+            for resource_id, handle, succeeded, error in finished:
+                handle._finish(succeeded, error)
+
+    def _poll(self, group, handles):
+        """
+        Refreshes a group's resources and checks every handle waiting on them. Errors are contained to the handle or
+        resource they came from so the scheduler thread never dies.
+        :return: A list of (resource id, handle, succeeded, error) for the waits that finished
+        """
+        resources = []
+        if group.lister is not None:
+            try:
+                resources = list(group.lister())
+            except Exception as e:
+                #Throttling and transient errors are treated like an unchanged poll and backed off.
+                print "Status poll failed, backing off: %s" % e
+                return []
+
+        finished = []
+        listed = set(fresh.id for fresh in resources)
+        #Resources without a lister are refreshed alone, as are any missing from their group's listing, which are
+        #either deleted or beyond the listing's first page.
+        for resource_id, waiting in handles.iteritems():
+            if resource_id in listed:
+                continue
+            resource = waiting[0].resource
+            try:
+                resource.get()
+            except Exception as e:
+                if is_not_found(e):
+                    #The resource is gone, so it can never become ready.
+                    finished.extend((resource_id, handle, False, e) for handle in waiting)
+                else:
+                    print "Status poll of %s failed, backing off: %s" % (resource_id, e)
+                continue
+            resources.append(resource)
+
+        for fresh in resources:
+            #Several callers may be waiting on the same resource, each with its own conditions.
+            for handle in handles.pop(fresh.id, []):
+                try:
+                    if handle.failed(fresh):
+                        succeeded = False
+                    elif handle.ready(fresh):
+                        succeeded = True
+                    else:
+                        continue
+                    handle.resource = _refresh(handle.resource, fresh)
+                except Exception as e:
+                    finished.append((fresh.id, handle, False, e))
+                    continue
+                finished.append((fresh.id, handle, succeeded, None))
+        return finished
+
+
+def wait_for_progress(resource, interval=5, max_interval=60, backoff=1.5, timeout=None, desired=("ACTIVE",),
+                      failed_states=("ERROR", "DELETED"), report=None):
+    """
+    Waits on a single resource that reports a percentage progress, such as an image being saved.
+    The rate of progress between polls is used to estimate the time left, and the next poll is scheduled for half of
+    that, so a long save is polled rarely and a nearly finished one promptly.
+    :param resource: The resource to wait on. It is refreshed in place with resource.get()
+    :param interval: The shortest time in seconds between polls
+    :param max_interval: The longest time in seconds between polls
+    :param backoff: The factor the interval grows by after a poll where progress did not move
+    :param timeout: Seconds to wait before giving up. Default no timeout
+    :param desired: The status values that mean the resource is ready. Default ACTIVE
+    :param failed_states: The status values that mean the resource will never be ready. Default ERROR and DELETED
+    :param report: An optional callable taking the progress percentage after each poll
+    :return: The refreshed resource, or None if it failed or timed out
+    """
+    #Everything below is in wall clock seconds. Only the poll bounds follow the backend's clock, the progress rate is
+    #measured on the wall clock and the timeout is wall clock time as it is for ResourceWaiter.
+    interval = _scaled(interval)
+    max_interval = _scaled(max_interval)
+    started = time.time()
+    delay = interval
+    last = None
+    while True:
+        resource.get()
+        status = getattr(resource, "status", None)
+        if status in desired:
+            return resource
+        if status in failed_states:
+            return None
+
+        now = time.time()
+        progress = getattr(resource, "progress", None) or 0
+        if report is not None:
+            report(progress)
+        if last is not None and progress > last[1]:
+            rate = (progress - last[1]) / (now - last[0])
+            delay = (100 - progress) / rate / 2
+        else:
+            delay *= backoff
+        delay = max(interval, min(delay, max_interval))
+        if last is None or progress > last[1]:
+            last = (now, progress)
+
+        if timeout is not None:
+            if now - started >= timeout:
+                return None
+            delay = min(delay, started + timeout - now)
+        time.sleep(delay)
+
+
+_default_waiter = None
+_default_waiter_lock = threading.Lock()
+
+
+def default_waiter():
+    """
+    :return: The process wide ResourceWaiter shared by the scripts
+    """
+    global _default_waiter
+    with _default_waiter_lock:
+        if _default_waiter is None:
+            _default_waiter = ResourceWaiter()
+    return _default_waiter
+
+
+def wait_for(resource, lister=None, **kwargs):
+    """
+    Blocks until a resource is ready using the shared waiter. Takes the same arguments as ResourceWaiter.wait_for.
+    :return: The refreshed resource, or None if it failed or timed out
+    """
+    return default_waiter().wait_for(resource, lister, **kwargs).result()
+
+
+def wait_for_all(resources, lister=None, **kwargs):
+    """
+    Blocks until every resource is ready, failed or timed out using the shared waiter.
+    :return: A list of the refreshed resources that became ready and a list of those that did not
+    """
+    handles = [default_waiter().wait_for(resource, lister, **kwargs) for resource in resources]
+    ready = []
+    not_ready = []
+    for handle in handles:
+        if handle.result() is not None:
+            ready.append(handle.resource)
+        else:
+            not_ready.append(handle.resource)
+    return ready, not_ready
@@ -0,0 +1,64 @@
+"""
+Small helpers for fanning API calls out over a bounded pool of threads.
+"""
+from multiprocessing.pool import ThreadPool
+
+__author__ = 'Bruce Stringer'
+
+DEFAULT_MAX_WORKERS = 50
+
+
+def _capture(func):
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+    return call
+
+
+def bounded_map(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Calls func once per item from at most max_workers threads.
+    A failing call never aborts the others, its exception is returned in place of its result.
+    :param func: A callable taking a single item
+    :param items: An iterable of items to call func with
+    :param max_workers: The most calls in flight at once. 1 runs the calls serially in the calling thread.
+    :return: A list of (result, exception) tuples in the same order as items. One of each pair is always None.
+    """
+    items = list(items)
+    call = _capture(func)
+    if max_workers <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        return pool.map(call, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def bounded_imap(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Like bounded_map, but yields (item, result, exception) tuples as each call completes.
+    :param func: A callable taking a single item
+    :param items: An iterable of items to call func with
+    :param max_workers: The most calls in flight at once
+    :return: A generator of (item, result, exception) tuples in completion order
+    """
+    items = list(items)
+    call = _capture(func)
+    if max_workers <= 1 or len(items) <= 1:
+        for item in items:
+            result, error = call(item)
+            yield item, result, error
+        return
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        for item, (result, error) in pool.imap_unordered(lambda item: (item, call(item)), items, chunksize=1):
+            yield item, result, error
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,174 @@
+"""
+Runs a set of dependent steps as a graph, starting every step as soon as the steps it requires have finished.
+
+Independent branches run concurrently on a thread pool, so a workflow takes as long as its longest dependency chain
+rather than the sum of its steps. Each step's start and finish are recorded and report() prints the timings along with
+the critical path, the chain of steps that decided the total time.
+"""
+import Queue
+import time
+from multiprocessing.pool import ThreadPool
+
+__author__ = 'Bruce Stringer'
+
+
+class Step(object):
+    """
+    A named call and the names of the steps whose results it takes as arguments.
+    """
+
+    def __init__(self, name, func, requires=()):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+class Workflow(object):
+    """
+    A dependency graph of steps. Steps that fail are collected in failed and every step that depends on them, directly
+    or not, is skipped rather than run.
+    """
+
+    def __init__(self, max_workers=8):
+        """
+        :param max_workers: The most steps running at once
+        """
+        self.max_workers = max_workers
+        self.steps = {}
+        self.order = []
+        self.failed = {}
+        self.skipped = []
+        self.started = None
+        self.finished = None
+
+    def add(self, name, func, requires=()):
+        """
+        Adds a step. The step is called with the results of the steps it requires, in the order they are listed.
+        :param name: A unique name for the step
+        :param func: The callable run for the step
+        :param requires: The names of steps that must finish first. They must already have been added
+        """
+        if name in self.steps:
+            raise ValueError("Duplicate step: " + name)
+        for required in requires:
+            if required not in self.steps:
+                raise ValueError("Step %s requires unknown step %s" % (name, required))
+        self.steps[name] = Step(name, func, requires)
+        self.order.append(name)
+
+    def _call(self, step):
+        step.started = time.time()
+        try:
+            step.result = step.func(*[self.steps[required].result for required in step.requires])
+        except (Exception, SystemExit) as e:
+            #SystemExit would otherwise end the pool thread without the step ever reporting back.
+            step.error = e
+        step.finished = time.time()
+        return step
+
+    def run(self):
+        """
+        Runs every step, each as soon as its requirements have finished.
+        :return: A dict of step name to result for the steps that succeeded
+        """
+        waiting = dict((name, set(self.steps[name].requires)) for name in self.order)
+        done = Queue.Queue()
+        pool = ThreadPool(max(1, min(self.max_workers, len(self.steps))))
+        running = {}
+        self.started = time.time()
+        try:
+            while waiting or running:
+                for name in [name for name in self.order if name in waiting and not waiting[name]]:
+                    del waiting[name]
+                    running[name] = pool.apply_async(self._call, (self.steps[name],), callback=done.put)
+                if not running:
+                    break
+
+                step = self._next(done, running)
+                del running[step.name]
+                if step.error is not None:
+                    self.failed[step.name] = step.error
+                    self._skip_dependents(step.name, waiting)
+                    continue
+                for requirements in waiting.itervalues():
+                    requirements.discard(step.name)
+        finally:
+            pool.close()
+            #Steps still running after Ctrl-C are left to their daemon threads rather than waited on.
+            if not running:
+                pool.join()
+            self.finished = time.time()
+
+        return dict((name, step.result) for name, step in self.steps.iteritems()
+                    if step.finished is not None and step.error is None)
+
+    def _next(self, done, running):
+        """
+        Waits for the next step to finish, in slices so Ctrl-C still interrupts the wait.
+        :param running: A dict of step name to the AsyncResult of each running step
+        :return: The step. A step whose call died without reporting back is returned with the error it died of
+        """
+        while True:
+            try:
+                return done.get(True, 1)
+            except Queue.Empty:
+                pass
+            for name, result in running.iteritems():
+                if result.ready() and not result.successful():
+                    step = self.steps[name]
+                    try:
+                        result.get()
+                    except Exception as e:
+                        step.error = e
+                    step.finished = time.time()
+                    return step
+
+    def _skip_dependents(self, name, waiting):
+        for dependent in [dependent for dependent, requirements in waiting.items() if name in requirements]:
+            if dependent in waiting:
+                del waiting[dependent]
+                self.skipped.append(dependent)
+                self._skip_dependents(dependent, waiting)
+
+    def critical_path(self):
+        """
+        Walks back from the last step to finish through whichever requirement finished last.
+        :return: The list of steps on the critical path, first to last
+        """
+        finished = [step for step in self.steps.itervalues() if step.finished is not None]
+        if not finished:
+            return []
+        step = max(finished, key=lambda step: step.finished)
+        path = [step]
+        while step.requires:
+            step = max((self.steps[name] for name in step.requires), key=lambda step: step.finished)
+            path.append(step)
+        path.reverse()
+        return path
+
+    def report(self):
+        """
+        Prints each step's start offset and duration, the critical path and the time saved over running serially.
+        """
+        print "%-20s %10s %10s" % ("Step", "Start (s)", "Took (s)")
+        for name in self.order:
+            step = self.steps[name]
+            if step.started is None:
+                print "%-20s %21s" % (name, "skipped")
+            else:
+                status = " FAILED" if step.error is not None else ""
+                print "%-20s %10.1f %10.1f%s" % (name, step.started - self.started, step.duration(), status)
+
+        path = self.critical_path()
+        serial = sum(step.duration() for step in self.steps.itervalues() if step.started is not None)
+        print "Critical path: " + " -> ".join("%s (%.1fs)" % (step.name, step.duration()) for step in path)
+        print "Total %.1fs, %.1fs if run one step at a time" % (self.finished - self.started, serial)